@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from vistrans import config
+from vistrans.screen.input.image2d import Bar
+from vistrans.screen.transform.imagetransform import ImageTransform
+
+interpolate = pytest.importorskip('scipy.interpolate')
+
+
+def baseline_interpolate(ogrid, ngrid, image):
+    """ the RectBivariateSpline interpolation ImageTransform replaces """
+    ogridx, ogridy = ogrid
+    ngridx, ngridy = np.broadcast_arrays(*ngrid)
+    f = interpolate.RectBivariateSpline(ogridy, ogridx, image, kx=1, ky=1)
+    return f.ev(ngridy.flatten(), ngridx.flatten()).reshape(ngridx.shape)
+
+
+@pytest.mark.parametrize('shape', [(128, 128), (64, 96), (96, 64)])
+def test_matches_baseline_spline(shape):
+    rng = np.random.RandomState(0)
+    image2d = Bar(config.InputBarConfigure(shape = shape), 1e-4)
+    ogrid = image2d.get_grid(-1., 2., 0., 3.)
+    ngrid = [rng.uniform(-1., 2., (30, 1)), rng.uniform(0., 3., (1, 40))]
+    # not symmetric, a transposed mapping would not match
+    images = rng.rand(3, *shape) + np.arange(shape[1])
+
+    transform = ImageTransform(ogrid, ngrid)
+    output = transform.interpolate(images)
+
+    for image, new_image in zip(images, output):
+        np.testing.assert_allclose(
+            new_image, baseline_interpolate(ogrid, ngrid, image),
+            rtol = 1e-12, atol = 1e-12)
+
+
+def test_rejects_images_of_other_shape():
+    image2d = Bar(config.InputBarConfigure(shape = (64, 96)), 1e-4)
+    transform = ImageTransform(image2d.get_grid(0., 1., 0., 1.),
+                               [np.zeros((2, 1)), np.zeros((1, 3))])
+    with pytest.raises(AssertionError):
+        transform.interpolate(np.zeros((1, 96, 64)))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from .RetinaInputMultiple import RetinaInputMultiple
+
+
+class RetinaInputEnsemble(RetinaInputMultiple):
+    """
+    Photon inputs of an ensemble of retinas viewing the same stimulus,
+    e.g. fly eyes with jittered eulerangles, acceptance_factor and rings.
+
+    The filters of all retinas form one block filter matrix (Stacked_RF)
+    and the inputs of chunk_size steps are computed at once, with a
+    single matrix-matrix product of the rendered frames and the filter
+    matrix, so the filter matrix is read once per chunk instead of once
+    per step. The inputs of the following steps are served from the
+    chunk.
+    """
+
+    def __init__(self, input_config, retinas, dt, chunk_size = 100,
+                 input_file = None, input_interval = 1,
+                 filtermethod = 'cpu', closed_form = True,
+                 cache_frames = True, lowrank_file = None,
+                 prefetch = 0):
+        """
+        retinas: list of (photoreceptors, radius) of each retina,
+                 see RetinaInputMultiple
+
+        chunk_size: number of steps whose inputs are computed at once,
+                    also the size of the prefetched chunks
+
+        filtermethod: 'cpu' or 'lowrank'
+
+        see RetinaInputIndividual for the other parameters
+        """
+        if filtermethod not in ('cpu', 'lowrank'):
+            raise ValueError('filtermethod {} cannot filter chunks of frames'
+                             .format(filtermethod))
+        self.chunk_size = chunk_size
+        super(RetinaInputEnsemble, self).__init__(
+            input_config, retinas, dt,
+            input_file = input_file, input_interval = input_interval,
+            filtermethod = filtermethod, closed_form = closed_form,
+            cache_frames = cache_frames, lowrank_file = lowrank_file,
+            prefetch = prefetch, prefetch_steps = chunk_size)
+
+    def pre_run(self):
+        super(RetinaInputEnsemble, self).pre_run()
+        self.chunk = None
+        self.chunk_step = 0
+
+    def filter_screens(self, screens):
+        """ photon inputs of screen intensities
+            of shape (num_steps,) + screen shape, with one product
+        """
+        if self.filtermethod == 'lowrank':
+            return self.lowrank_filters.filter(screens)
+        return self.rfs.filter(screens)
+
+    def next_chunk(self):
+        """ computes or takes the inputs of the next chunk_size steps """
+        if self.prefetcher is not None:
+            self.chunk = self.prefetcher.get()
+        else:
+            self.chunk = self.compute_inputs(self.chunk_size)
+        self.chunk_step = 0
+
+    def update_input(self):
+        if self.chunk is None or self.chunk_step == self.chunk.shape[0]:
+            self.next_chunk()
+        self.variables['photon']['input'][:] = self.chunk[self.chunk_step]
+        self.chunk_step += 1
+
+    def chunk_inputs(self):
+        """ views of the inputs of the current chunk of each retina,
+            arrays of shape (chunk_size, number of photoreceptors)
+        """
+        return self.retina_inputs(self.chunk)
@@ -1,20 +1,32 @@
 #!/usr/bin/env python
 
+import os
 from collections import OrderedDict
+from dataclasses import replace
 
 import numpy as np
 from neurokernel.LPU.InputProcessors.BaseInputProcessor import BaseInputProcessor
 
 from . import classmapper as cls_map
+from .vrf import vrf_no_gpu as vrfn
+from .vrf import vrf_lowrank as vrfl
+from .prefetch import Prefetcher
+from .resolution import auto_screen_config
+from .stimulusresponse import GratingsResponse, PeriodicResponseCache
 from ..config import Input
 
 
+FILTERMETHODS = ('gpu', 'cpu', 'incremental', 'fft', 'lowrank',
+                 'pitcharray')
 
 
 class RetinaInputIndividual(BaseInputProcessor):
 
     def __init__(self, input_config, photoreceptors, dt, radius,
-                 input_file = None, input_interval = 1):
+                 input_file = None, input_interval = 1,
+                 filtermethod = 'gpu', closed_form = True,
+                 cache_frames = True, lowrank_file = None,
+                 prefetch = 0, prefetch_steps = 10):
         """
         config: see retina configuration template
 
@@ -23,7 +35,41 @@ class RetinaInputIndividual(BaseInputProcessor):
                             i.e., the key is the rid
                             and the value is a dictionary containing parameters
                             of the photoreceptor
+
+        filtermethod: implementation of the RF filters, one of
+                      'gpu': filters on the GPU,
+                      'cpu': dense filter matrix on the CPU,
+                      'incremental': cpu filters that only filter the
+                          pixels that changed since the previous step,
+                      'fft': FFTs along the screen azimuth (or theta),
+                      'lowrank': low-rank factors of the cpu filter
+                          matrix,
+                      'pitcharray': the gpu implementation on
+                          numpy-backed PitchArrays
+
+        closed_form: if True, stimuli with a closed form response
+                     (sinusoidal gratings) are not rendered at every step
+
+        cache_frames: if True, inputs of stimuli with a finite set of
+                      frames (Bar, FlickerStep) are computed once per
+                      distinct frame
+
+        lowrank_file: file of the factors of the 'lowrank' filtermethod,
+                      they are loaded if the file exists, otherwise
+                      they are computed and saved to it
+
+        prefetch: number of chunks of prefetch_steps steps of inputs
+                  computed ahead in a background thread, 0 computes the
+                  inputs in the simulation step. Not available with the
+                  'gpu' filtermethod, whose CUDA context belongs to the
+                  simulation thread
         """
+        if filtermethod not in FILTERMETHODS:
+            raise ValueError('filtermethod {!r} is not one of {}'
+                             .format(filtermethod, FILTERMETHODS))
+        if prefetch and filtermethod == 'gpu':
+            raise ValueError('prefetch is not available with gpu filters')
+
         if isinstance(input_config, Input):
             self.config = input_config
         elif isinstance(input_config, dict):
@@ -31,10 +77,32 @@ class RetinaInputIndividual(BaseInputProcessor):
         else:
             raise TypeError('input_config is either a Input dataclass or a dict generated by Input.to)_dict()')
 
+        if self.config.screenconfig.auto_resolution:
+            acceptance_angle = float(list(photoreceptors.values())[0]
+                                     ['params']['acceptance_angle'])
+            self.config = replace(
+                self.config, screenconfig = auto_screen_config(
+                    self.config.screenconfig, acceptance_angle))
+
         self.screen_type = self.config.screentype
-        self.filtermethod = 'gpu'
+        screen_name = self.screen_type.name
+        if screen_name not in cls_map.vrf_screen_types(filtermethod):
+            raise ValueError(
+                'filtermethod {!r} is not available for {}, use one of {}'
+                .format(filtermethod, screen_name,
+                        [method for method in FILTERMETHODS
+                         if screen_name in cls_map.vrf_screen_types(method)]))
+        self.filtermethod = filtermethod
+        self.closed_form = closed_form
+        self.cache_frames = cache_frames
+        self.lowrank_file = lowrank_file
+        self.prefetch = prefetch
+        self.prefetch_steps = prefetch_steps
+        self.prefetcher = None
+        self.dtype = np.dtype(self.config.dtype)
         screen_cls = cls_map.get_screen_cls(self.screen_type.name)#getattr(scr, self.screen_type.name)
         self.screen = screen_cls(self.config, dt)
+        self.dt = dt
         self.pr_list = OrderedDict(photoreceptors)
         self.retina_radius = radius
         self.num_photoreceptors = len(photoreceptors)
@@ -47,15 +115,65 @@ class RetinaInputIndividual(BaseInputProcessor):
 
     def pre_run(self):
         self.generate_receptive_fields()
+        self.response = None
+        image2d = self.screen.image2d
+        if self.closed_form and GratingsResponse.applies_to(image2d):
+            self.response = GratingsResponse(image2d, self.screen,
+                                             self.filter_screens)
+        elif self.cache_frames and PeriodicResponseCache.applies_to(image2d):
+            self.response = PeriodicResponseCache(image2d, self.screen,
+                                                  self.filter_screens)
+        if self.prefetch:
+            self.prefetcher = Prefetcher(
+                lambda: self.compute_inputs(self.prefetch_steps),
+                max_chunks = self.prefetch)
+
+    def post_run(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        super(RetinaInputIndividual, self).post_run()
 
     def generate_receptive_fields(self):
-        pr_list = self.pr_list
-        screen = self.screen
+        filtermethod = self.filtermethod
+        # the dense filters of 'lowrank' are only computed to be
+        # compressed, and freed afterwards
+        rfs = self.receptive_fields(
+            compute_filters = filtermethod != 'lowrank')
+
+        if filtermethod in ('gpu', 'pitcharray'):
+            rfs.generate_filters()
+        elif filtermethod == 'incremental':
+            self.incremental_filter = vrfn.IncrementalFilter(rfs)
+        elif filtermethod == 'lowrank':
+            self.lowrank_filters = self.get_lowrank_filters(rfs)
+        self.rfs = rfs
+
+    def receptive_fields(self, compute_filters = True):
+        """ RF object of the photoreceptors for the filtermethod,
+            with filters unless compute_filters is False
+        """
         screen_type = self.screen_type
         filtermethod = self.filtermethod
 
-        mapdr_cls = cls_map.get_mapdr_cls(screen_type.name)
-        projection_map = mapdr_cls(self.retina_radius, screen.radius)
+        if filtermethod in ('gpu', 'pitcharray'):
+            vrf_cls = cls_map.get_vrf_cls(screen_type.name)
+        elif filtermethod == 'fft':
+            vrf_cls = cls_map.get_vrf_fft_cls(screen_type.name)
+        else:
+            vrf_cls = cls_map.get_vrf_no_gpu_cls(screen_type.name)
+        return self.load_receptive_fields(vrf_cls, self.pr_list,
+                                          self.retina_radius,
+                                          compute_filters = compute_filters)
+
+    def load_receptive_fields(self, vrf_cls, pr_list, retina_radius,
+                              compute_filters = True):
+        """ RF object of class vrf_cls of the photoreceptors in pr_list
+            of a retina with radius retina_radius
+        """
+        screen = self.screen
+
+        mapdr_cls = cls_map.get_mapdr_cls(self.screen_type.name)
+        projection_map = mapdr_cls(retina_radius, screen.radius)
 
         pos_elev = np.array([float(a['params']['elev_3d']) for a in pr_list.values()])
         pos_azim = np.array([float(a['params']['azim_3d']) for a in pr_list.values()])
@@ -66,21 +184,67 @@ class RetinaInputIndividual(BaseInputProcessor):
         if np.isnan(np.sum(rf_params)):
             print('Warning, Nan entry in array of receptive field centers')
 
-        if filtermethod == 'gpu':
-            vrf_cls = cls_map.get_vrf_cls(screen_type.name)
+        if self.filtermethod == 'pitcharray':
+            rfs = vrf_cls(screen.grid, gpu = False)
         else:
-            vrf_cls = cls_map.get_vrf_no_gpu_cls(screen_type.name)
-        rfs = vrf_cls(screen.grid)
+            rfs = vrf_cls(screen.grid)
         rfs.load_parameters(refa=rf_params[0], refb=rf_params[1],
                             acceptance_angle = float(list(pr_list.values())[0]['params']['acceptance_angle']),
-                            radius=screen.radius)
-
-        rfs.generate_filters()
-        self.rfs = rfs
+                            radius=screen.radius, dtype = self.dtype,
+                            filter_dtype = self.config.filter_dtype,
+                            compute_filters = compute_filters)
+        return rfs
+
+    def get_lowrank_filters(self, rfs):
+        """ factors of the filters of rfs, loaded from lowrank_file if
+            it holds the factors of these filters, otherwise computed
+            from the dense filters, which are freed afterwards
+        """
+        lowrank_file = self.lowrank_file
+        if lowrank_file is not None and os.path.exists(lowrank_file):
+            lowrank_filters = vrfl.LowRankFilterBank.load(lowrank_file)
+            if lowrank_filters.matches(rfs):
+                return lowrank_filters
+            print('Warning, low-rank filters in {} do not match the '
+                  'receptive fields, recomputing them'.format(lowrank_file))
+        rfs.compute_filters()
+        lowrank_filters = vrfl.LowRankFilterBank.compress(rfs)
+        rfs.release_filters()
+        if lowrank_file is not None:
+            lowrank_filters.save(lowrank_file)
+        return lowrank_filters
+
+    def filter_screens(self, screens):
+        """ photon inputs of screen intensities
+            of shape (num_steps,) + screen shape
+        """
+        inputs = np.empty((screens.shape[0], self.num_photoreceptors),
+                          self.dtype)
+        for i, screen in enumerate(screens):
+            # filter functions resize their input in place
+            im = screen.reshape((1, -1)).copy()
+            if self.filtermethod in ('gpu', 'pitcharray'):
+                inputs[i] = self.rfs.filter_image_use(im).get().reshape(-1)
+            elif self.filtermethod == 'incremental':
+                inputs[i] = self.incremental_filter.filter_image(im)
+            elif self.filtermethod == 'lowrank':
+                inputs[i] = self.lowrank_filters.filter_image(im)
+            else:
+                inputs[i] = self.rfs.filter_image(im).reshape(-1)
+        return inputs
+
+    def compute_inputs(self, num_steps):
+        """ photon inputs of the next num_steps steps """
+        if self.response is not None:
+            return self.response.get_steps(num_steps)
+        im = self.screen.get_screen_intensity_steps(num_steps)
+        return self.filter_screens(im)
 
     def update_input(self):
-        im = self.screen.get_screen_intensity_steps(1)
-        inputs = self.rfs.filter_image_use(im).get().reshape((1, -1))
+        if self.prefetcher is not None:
+            inputs = self.prefetcher.get_step()
+        else:
+            inputs = self.compute_inputs(1)
         self.variables['photon']['input'][:] = inputs
 
     def is_input_available(self):
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+
+from . import classmapper as cls_map
+from .vrf import vrf_no_gpu as vrfn
+from .RetinaInputIndividual import RetinaInputIndividual
+
+
+class RetinaInputMultiple(RetinaInputIndividual):
+    """
+    Photon inputs of several retinas viewing the same stimulus, e.g. the
+    left and the right eye with different eulerangles.
+
+    The screen renders and interpolates each frame once and the filters
+    of all retinas are stacked into one filter matrix (Stacked_RF), so a
+    single product gives the inputs of all photoreceptors. The photon
+    variable lists the photoreceptors of the retinas in order.
+    """
+
+    def __init__(self, input_config, retinas, dt,
+                 input_file = None, input_interval = 1,
+                 filtermethod = 'cpu', closed_form = True,
+                 cache_frames = True, lowrank_file = None,
+                 prefetch = 0, prefetch_steps = 10):
+        """
+        config: see retina configuration template
+
+        retinas: list of (photoreceptors, radius) of each retina,
+                 photoreceptors is a dictionary as in
+                 RetinaInputIndividual and radius the radius of the
+                 retina, the uids of all retinas must be distinct
+
+        filtermethod: 'cpu', 'incremental' or 'lowrank', applied to the
+                      stacked filters
+
+        see RetinaInputIndividual for the other parameters
+        """
+        if filtermethod not in ('cpu', 'incremental', 'lowrank'):
+            raise ValueError('filtermethod {} cannot stack filters'
+                             .format(filtermethod))
+
+        self.retinas = [(OrderedDict(photoreceptors), radius)
+                        for photoreceptors, radius in retinas]
+        photoreceptors = OrderedDict()
+        for retina_photoreceptors, _ in self.retinas:
+            photoreceptors.update(retina_photoreceptors)
+        if len(photoreceptors) != sum(len(p) for p, _ in self.retinas):
+            raise ValueError('photoreceptor uids of the retinas '
+                             'are not distinct')
+
+        super(RetinaInputMultiple, self).__init__(
+            input_config, photoreceptors, dt, None,
+            input_file = input_file, input_interval = input_interval,
+            filtermethod = filtermethod, closed_form = closed_form,
+            cache_frames = cache_frames, lowrank_file = lowrank_file,
+            prefetch = prefetch, prefetch_steps = prefetch_steps)
+
+    def receptive_fields(self, compute_filters = True):
+        vrf_cls = cls_map.get_vrf_no_gpu_cls(self.screen_type.name)
+        rfs = vrfn.Stacked_RF(self.screen.grid)
+        rfs.load_parameters(rfs = [
+            self.load_receptive_fields(vrf_cls, photoreceptors, radius,
+                                       compute_filters = compute_filters)
+            for photoreceptors, radius in self.retinas],
+            compute_filters = compute_filters)
+        return rfs
+
+    def retina_inputs(self, inputs = None):
+        """ views of the photon inputs of each retina
+
+            inputs: array with the photoreceptors in the last axis,
+                    the current photon inputs by default
+        """
+        if inputs is None:
+            inputs = self.variables['photon']['input']
+        return self.rfs.split(inputs)
@@ -1,62 +1,72 @@
-from ..screen import screen as scr
-from ..screen.map import mapimpldr as mapdr
-from .vrf import vrf
-from .vrf import vrf_no_gpu as vrfn
+from ..utils.imports import LazyRegistry
 
 CYLINDER = 'CylinderScreen'
 SPHERE = 'SphereScreen'
+EQUAL_AREA_SPHERE = 'EqualAreaSphereScreen'
 
+# the modules of the classes are imported on first use, so that e.g.
+# the GPU receptive fields only need pycuda when they are requested
 
-_scr_class_dict = {
-    CYLINDER: scr.CylinderScreen,
-    SPHERE: scr.SphereScreen
-}
+_scr_class_dict = LazyRegistry('screen', {
+    CYLINDER: ('..screen.screen', 'CylinderScreen'),
+    SPHERE: ('..screen.screen', 'SphereScreen'),
+    EQUAL_AREA_SPHERE: ('..screen.screen', 'EqualAreaSphereScreen')
+}, __package__)
 
 
 def get_screen_cls(screen):
-    try:
-        return _scr_class_dict[screen]
-    except KeyError:
-        raise ValueError('Value {} not in screen types: {}'
-                         .format(screen, list(_scr_class_dict.keys())))
+    return _scr_class_dict[screen]
 
 
-_vrf_class_dict = {
-    CYLINDER: vrf.Cylinder_Gaussian_RF,
-    SPHERE: vrf.Sphere_Gaussian_RF
-}
+_vrf_class_dict = LazyRegistry('vrf', {
+    CYLINDER: ('.vrf.vrf', 'Cylinder_Gaussian_RF'),
+    SPHERE: ('.vrf.vrf', 'Sphere_Gaussian_RF')
+}, __package__)
 
 
 def get_vrf_cls(vrf_type):
-    try:
-        return _vrf_class_dict[vrf_type]
-    except KeyError:
-        raise ValueError('Value {} not in vrf types: {}'
-                         .format(vrf_type, list(_vrf_class_dict.keys())))
+    return _vrf_class_dict[vrf_type]
 
-_vrfn_class_dict = {
-    CYLINDER: vrfn.Cylinder_Gaussian_RF,
-    SPHERE: vrfn.Sphere_Gaussian_RF
-}
+
+_vrfn_class_dict = LazyRegistry('vrf_no_gpu', {
+    CYLINDER: ('.vrf.vrf_no_gpu', 'Cylinder_Gaussian_RF'),
+    SPHERE: ('.vrf.vrf_no_gpu', 'Sphere_Gaussian_RF'),
+    EQUAL_AREA_SPHERE: ('.vrf.vrf_no_gpu', 'EqualArea_Sphere_Gaussian_RF')
+}, __package__)
 
 
 def get_vrf_no_gpu_cls(vrfn_type):
-    try:
-        return _vrfn_class_dict[vrfn_type]
-    except KeyError:
-        raise ValueError('Value {} not in vrf_no_gpu types: {}'
-                         .format(vrfn_type, list(_vrfn_class_dict.keys())))
+    return _vrfn_class_dict[vrfn_type]
+
+
+_vrf_fft_class_dict = LazyRegistry('vrf_fft', {
+    CYLINDER: ('.vrf.vrf_fft', 'Cylinder_FFT_RF'),
+    SPHERE: ('.vrf.vrf_fft', 'Sphere_FFT_RF')
+}, __package__)
+
+
+def get_vrf_fft_cls(vrf_type):
+    return _vrf_fft_class_dict[vrf_type]
+
+
+_mapdr_class_dict = LazyRegistry('map', {
+    CYLINDER: ('..screen.map.mapimpldr', 'SphereToCylinderMap'),
+    SPHERE: ('..screen.map.mapimpldr', 'SphereToSphereMap'),
+    EQUAL_AREA_SPHERE: ('..screen.map.mapimpldr', 'SphereToSphereMap')
+}, __package__)
 
 
-_mapdr_class_dict = {
-    CYLINDER: mapdr.SphereToCylinderMap,
-    SPHERE: mapdr.SphereToSphereMap
-}
+def vrf_screen_types(filtermethod):
+    """ screen types that have RF classes for the filtermethod
+        of RetinaInputIndividual
+    """
+    if filtermethod in ('gpu', 'pitcharray'):
+        return list(_vrf_class_dict.keys())
+    elif filtermethod == 'fft':
+        return list(_vrf_fft_class_dict.keys())
+    else:
+        return list(_vrfn_class_dict.keys())
 
 
 def get_mapdr_cls(map_type):
-    try:
-        return _mapdr_class_dict[map_type]
-    except KeyError:
-        raise ValueError('Value {} not in map types: {}'
-                         .format(map_type, list(_mapdr_class_dict.keys())))
+    return _mapdr_class_dict[map_type]
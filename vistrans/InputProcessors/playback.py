@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+from neurokernel.LPU.InputProcessors.BaseInputProcessor import BaseInputProcessor
+
+from ..utils.imports import optional_import
+
+
+def _is_hdf5(filename):
+    return os.path.splitext(filename)[1] in ('.h5', '.hdf5')
+
+
+def _metadata_file(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+
+def input_hash(processor):
+    """
+    Hash of everything that determines the photon inputs of a
+    RetinaInputIndividual: the input configuration, the photoreceptors,
+    the retina radius, the time step and the filter settings (filter
+    method, precisions and, for 'lowrank', the file of the factors).
+    For processors of several retinas (RetinaInputMultiple), the uids
+    and radius of each retina.
+    """
+    key = {'input': processor.config.to_dict(),
+           'photoreceptors': processor.pr_list,
+           'radius': processor.retina_radius,
+           'dt': processor.dt,
+           'filtermethod': processor.filtermethod,
+           'dtype': processor.config.dtype,
+           'filter_dtype': processor.config.filter_dtype}
+    if processor.filtermethod == 'lowrank':
+        key['lowrank_file'] = processor.lowrank_file
+    if hasattr(processor, 'retinas'):
+        key['retinas'] = [([str(uid) for uid in photoreceptors], radius)
+                          for photoreceptors, radius in processor.retinas]
+    return hashlib.sha256(json.dumps(key, sort_keys = True, default = str)
+                          .encode()).hexdigest()
+
+
+def precompute_inputs(processor, num_steps, filename, chunk_steps = 1000,
+                      compression = 'gzip'):
+    """
+    Computes the photon inputs of num_steps steps of a
+    RetinaInputIndividual and writes them to filename, an HDF5 file if
+    the extension is .h5 or .hdf5 and a .npy file, which is memory-mapped
+    by RetinaInputPlayback, otherwise. The inputs are written by chunks
+    of chunk_steps steps, in the HDF5 file as a dataset 'photon' chunked
+    along the steps.
+
+    The metadata (hash, dt, num_steps, uids) are attributes of the
+    dataset or, for .npy files, in a .json file next to it.
+
+    Returns
+    -------
+    metadata: dict
+    """
+    if processor.prefetch:
+        raise ValueError('precompute_inputs computes the inputs itself, '
+                         'the processor must not prefetch them')
+    processor.pre_run()
+    metadata = {'hash': input_hash(processor),
+                'dt': processor.dt,
+                'num_steps': num_steps,
+                'uids': [str(uid) for uid in processor.pr_list],
+                'dtype': processor.dtype.name}
+    shape = (num_steps, processor.num_photoreceptors)
+
+    if _is_hdf5(filename):
+        h5py = optional_import('h5py', 'HDF5 photon inputs')
+        h5file = h5py.File(filename, 'w')
+        output = h5file.create_dataset(
+            'photon', shape, dtype = processor.dtype,
+            chunks = (min(chunk_steps, num_steps), shape[1]),
+            compression = compression)
+        for key, value in metadata.items():
+            output.attrs[key] = value
+    else:
+        output = np.lib.format.open_memmap(filename, mode = 'w+',
+                                           dtype = processor.dtype,
+                                           shape = shape)
+        with open(_metadata_file(filename), 'w') as f:
+            json.dump(metadata, f)
+
+    try:
+        for start in range(0, num_steps, chunk_steps):
+            stop = min(start + chunk_steps, num_steps)
+            output[start:stop] = processor.compute_inputs(stop - start)
+    finally:
+        if _is_hdf5(filename):
+            h5file.close()
+        else:
+            output.flush()
+            del output
+        processor.post_run()
+    return metadata
+
+
+def load_metadata(filename):
+    """ metadata written by precompute_inputs """
+    if _is_hdf5(filename):
+        h5py = optional_import('h5py', 'HDF5 photon inputs')
+        with h5py.File(filename, 'r') as h5file:
+            attrs = h5file['photon'].attrs
+            metadata = {key: attrs[key] for key in attrs}
+        metadata['uids'] = [str(uid) for uid in metadata['uids']]
+        return metadata
+    with open(_metadata_file(filename)) as f:
+        return json.load(f)
+
+
+class RetinaInputPlayback(BaseInputProcessor):
+    """
+    Replays photon inputs written by precompute_inputs, so repeated
+    simulations of a stimulus do not render and filter it again.
+
+    A .npy file is memory-mapped and the input of each step is a slice
+    of the map, an HDF5 file is read by chunks of chunk_steps steps.
+    """
+
+    def __init__(self, filename, photoreceptors = None, config_hash = None,
+                 dt = None, loop = False, chunk_steps = 1000):
+        """
+        filename: file written by precompute_inputs
+
+        photoreceptors: uids of the photoreceptors, or a dictionary
+                        keyed by them, to play in that order. All the
+                        recorded photoreceptors by default
+
+        config_hash: if given, must be the hash of the recording,
+                     see input_hash
+
+        dt: if given, must be the time step of the recording
+
+        loop: if True the recording is repeated, otherwise no input is
+              available after its last step
+        """
+        self.filename = filename
+        self.metadata = load_metadata(filename)
+        if config_hash is not None and config_hash != self.metadata['hash']:
+            raise ValueError('{} was not recorded with this configuration'
+                             .format(filename))
+        if dt is not None and not np.isclose(dt, self.metadata['dt']):
+            raise ValueError('{} was recorded with dt = {}'
+                             .format(filename, self.metadata['dt']))
+        self.num_steps = int(self.metadata['num_steps'])
+        self.loop = loop
+        self.chunk_steps = chunk_steps
+
+        recorded = self.metadata['uids']
+        if photoreceptors is None:
+            uids = recorded
+            self.index = None
+        else:
+            uids = [str(uid) for uid in OrderedDict.fromkeys(photoreceptors)]
+            position = {uid: i for i, uid in enumerate(recorded)}
+            try:
+                index = np.array([position[uid] for uid in uids], np.intp)
+            except KeyError as e:
+                raise ValueError('photoreceptor {} is not in {}'
+                                 .format(e.args[0], filename))
+            self.index = None if np.array_equal(
+                index, np.arange(len(recorded))) else index
+
+        super(RetinaInputPlayback, self).__init__(
+            [('photon', uids)], mode = 0)
+
+    def pre_run(self):
+        if _is_hdf5(self.filename):
+            h5py = optional_import('h5py', 'HDF5 photon inputs')
+            self.h5file = h5py.File(self.filename, 'r')
+            self.inputs = self.h5file['photon']
+        else:
+            self.h5file = None
+            self.inputs = np.load(self.filename, mmap_mode = 'r')
+        self.step = 0
+        self.chunk = None
+        self.chunk_start = 0
+
+    def post_run(self):
+        if self.h5file is not None:
+            self.h5file.close()
+        super(RetinaInputPlayback, self).post_run()
+
+    def _row(self, step):
+        if self.h5file is None:
+            # slice of the memory map
+            return self.inputs[step]
+        if self.chunk is None or not \
+                self.chunk_start <= step < self.chunk_start + len(self.chunk):
+            self.chunk_start = step - step % self.chunk_steps
+            self.chunk = self.inputs[self.chunk_start:
+                                     self.chunk_start + self.chunk_steps]
+        return self.chunk[step - self.chunk_start]
+
+    def update_input(self):
+        row = self._row(self.step % self.num_steps)
+        if self.index is not None:
+            row = row[self.index]
+        self.variables['photon']['input'][:] = row
+        self.step += 1
+
+    def is_input_available(self):
+        return self.loop or self.step < self.num_steps
+
+
+def main():
+    """
+    python -m vistrans.InputProcessors.playback spec.json output
+
+    spec.json has the keys 'input' (Input.to_dict()), 'photoreceptors',
+    'radius', 'dt', 'num_steps' and optionally 'filtermethod'
+    """
+    import sys
+
+    from .RetinaInputIndividual import RetinaInputIndividual
+
+    with open(sys.argv[1]) as f:
+        spec = json.load(f)
+    processor = RetinaInputIndividual(
+        spec['input'], spec['photoreceptors'], spec['dt'], spec['radius'],
+        filtermethod = spec.get('filtermethod', 'cpu'))
+    metadata = precompute_inputs(processor, spec['num_steps'], sys.argv[2])
+    print('{} steps of {} photoreceptors, hash {}'.format(
+        metadata['num_steps'], len(metadata['uids']), metadata['hash']))
+
+
+if __name__ == "__main__":
+    main()
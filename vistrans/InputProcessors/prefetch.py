@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+
+
+class _Failure(object):
+    """ exception raised in the producer thread """
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class Prefetcher(object):
+    """
+    Calls produce() in a background thread and keeps up to max_chunks
+    of its results in a bounded queue, e.g. photon inputs of the next
+    steps of a stimulus while the model computes the current step.
+    NumPy releases the GIL in the products and the interpolation, so
+    rendering and filtering overlap with the simulation.
+
+    An exception raised by produce() is raised again by the get call
+    that reaches it. close() stops the thread; the prefetcher is also
+    a context manager.
+
+    Parameters
+    ----------
+    produce: callable
+        returns the next chunk, an array of shape (num_steps, ...).
+    max_chunks: int
+        maximum number of chunks in the queue.
+    starvation_hook: callable or None
+        called with the time in seconds that get waited for a chunk,
+        whenever the queue was empty.
+    """
+    def __init__(self, produce, max_chunks = 4, starvation_hook = None):
+        self.produce = produce
+        self.starvation_hook = starvation_hook
+
+        self.num_chunks = 0
+        self.num_starved = 0
+        self.wait_time = 0.
+
+        self._queue = queue.Queue(maxsize = max_chunks)
+        self._stop = threading.Event()
+        self._chunk = None
+        self._step = 0
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _put(self, item):
+        """ blocks until the item is queued or the prefetcher is closed """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if not self._put(self.produce()):
+                    break
+        except BaseException as e:
+            self._put(_Failure(e))
+
+    def get(self):
+        """ the next chunk """
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            if self._stop.is_set():
+                raise RuntimeError('Prefetcher is closed')
+            start = time.perf_counter()
+            item = self._wait_item()
+            wait = time.perf_counter() - start
+            self.num_starved += 1
+            self.wait_time += wait
+            if self.starvation_hook is not None:
+                self.starvation_hook(wait)
+        if isinstance(item, _Failure):
+            self.close()
+            raise item.exception
+        self.num_chunks += 1
+        return item
+
+    def _wait_item(self):
+        """ blocks until the producer queues an item, raises if the
+            prefetcher is closed or the producer thread is gone
+        """
+        while True:
+            try:
+                return self._queue.get(timeout = 0.1)
+            except queue.Empty:
+                pass
+            if self._stop.is_set():
+                raise RuntimeError('Prefetcher is closed')
+            if not self._thread.is_alive():
+                # the last item may have been queued before it exited
+                try:
+                    return self._queue.get_nowait()
+                except queue.Empty:
+                    raise RuntimeError('Prefetcher producer thread exited '
+                                       'without producing a chunk')
+
+    def get_step(self):
+        """ the next step of the chunks """
+        if self._chunk is None or self._step == self._chunk.shape[0]:
+            self._chunk = self.get()
+            self._step = 0
+        step = self._chunk[self._step]
+        self._step += 1
+        return step
+
+    def stats(self):
+        """ number of chunks, number of times and total seconds get
+            waited for an empty queue, and chunks in the queue
+        """
+        return {'chunks': self.num_chunks,
+                'starved': self.num_starved,
+                'wait_time': self.wait_time,
+                'queued': self._queue.qsize()}
+
+    def close(self, timeout = None):
+        """ stops the producer thread and discards the queued chunks,
+            a chunk that is being produced is completed first
+        """
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,193 @@
+from dataclasses import replace
+
+import numpy as np
+
+from ..config import CylinderScreen, EqualAreaSphereScreen, SphereScreen
+from ..screen import screen as scr
+from .vrf import vrf_no_gpu as vrfn
+
+
+def quadrature_error(rf_cls, grid, refa, refb, acceptance_angle, radius):
+    """
+    Maximum deviation from 1 of the sum of the weights of filters
+    centered at (refa, refb), the filters integrate to 1 so this is the
+    error of the quadrature of a uniform screen.
+    """
+    rfs = rf_cls(grid)
+    rfs.load_parameters(refa = np.asarray(refa, np.double),
+                        refb = np.asarray(refb, np.double),
+                        acceptance_angle = acceptance_angle,
+                        radius = radius)
+    return np.abs(rfs.filters.sum(axis = 0, dtype = np.double) - 1).max()
+
+
+def _search(acceptance_angle, quadrature_tolerance, error_at, shrink = 0.85,
+            max_steps = 40):
+    """
+    Decrease the grid spacing h, in radians, from the acceptance angle
+    until error_at(h) is below quadrature_tolerance.
+    """
+    h = acceptance_angle * np.pi / 180
+    for _ in range(max_steps):
+        error = error_at(h)
+        if error <= quadrature_tolerance:
+            return h, error
+        h *= shrink
+    raise ValueError('No screen resolution reaches a quadrature error of {}'
+                     .format(quadrature_tolerance))
+
+
+def _test_offsets(h, num_tests, seed):
+    """ random offsets within a grid cell """
+    return np.random.default_rng(seed).uniform(0, h, (2, num_tests))
+
+
+def sphere_resolution(acceptance_angle, quadrature_tolerance = 1e-3,
+                      half = True, num_tests = 16, seed = 0):
+    """
+    Coarsest SphereScreen resolution at which filters with the given
+    acceptance angle (degrees) are integrated with an error below
+    quadrature_tolerance.
+
+    Returns
+    -------
+    parallels, meridians: ints
+    error: float
+        the quadrature error at that resolution
+    """
+    def size(h):
+        parallels = int(np.ceil(np.pi / h)) + 1
+        meridians = int(np.ceil(np.pi / h)) + 1 if half else \
+            int(np.ceil(2 * np.pi / h)) + 2
+        return parallels, meridians
+
+    def error_at(h):
+        grid = scr.SphereScreen.make_grid(*size(h), half = half)
+        offsets = _test_offsets(h, num_tests, seed)
+        # centers away from the poles and the borders of a half screen
+        refelev = np.linspace(-np.pi / 3, np.pi / 3, num_tests) + offsets[0]
+        refazim = np.pi / 2 + offsets[1]
+        return quadrature_error(vrfn.Sphere_Gaussian_RF, grid, refelev,
+                                refazim, acceptance_angle, 1.)
+
+    h, error = _search(acceptance_angle, quadrature_tolerance, error_at)
+    return size(h) + (error,)
+
+
+def equal_area_resolution(acceptance_angle, quadrature_tolerance = 1e-3,
+                          half = True, num_tests = 16, seed = 0):
+    """
+    Smallest number of points of an EqualAreaSphereScreen at which
+    filters with the given acceptance angle (degrees) are integrated
+    with an error below quadrature_tolerance.
+
+    Returns
+    -------
+    num_points: int
+    error: float
+        the quadrature error at that resolution
+    """
+    area = 2 * np.pi if half else 4 * np.pi
+
+    def size(h):
+        return int(np.ceil(area / (h * h)))
+
+    def error_at(h):
+        grid = scr.EqualAreaSphereScreen.make_grid(size(h), half = half)
+        offsets = _test_offsets(h, num_tests, seed)
+        refelev = np.linspace(-np.pi / 3, np.pi / 3, num_tests) + offsets[0]
+        refazim = np.pi / 2 + offsets[1]
+        return quadrature_error(vrfn.EqualArea_Sphere_Gaussian_RF, grid,
+                                refelev, refazim, acceptance_angle, 1.)
+
+    h, error = _search(acceptance_angle, quadrature_tolerance, error_at)
+    return size(h), error
+
+
+def cylinder_resolution(acceptance_angle, radius, length,
+                        quadrature_tolerance = 1e-3, num_tests = 16,
+                        seed = 0):
+    """
+    Coarsest CylinderScreen resolution at which filters with the given
+    acceptance angle (degrees) are integrated with an error below
+    quadrature_tolerance.
+
+    Returns
+    -------
+    columns, parallels: ints
+    error: float
+        the quadrature error at that resolution
+    """
+    def size(h):
+        # an angle h at the center spans at least radius * h along z
+        return (int(np.ceil(np.pi / h)) + 1,
+                int(np.ceil(length / (radius * h))) + 1)
+
+    def error_at(h):
+        columns, parallels = size(h)
+        grid = scr.CylinderScreen.make_grid(columns, parallels, length)
+        offsets = _test_offsets(h, num_tests, seed)
+        refz = np.linspace(-length / 4, length / 4, num_tests) \
+            + offsets[0] * radius
+        reftheta = np.pi / 2 + offsets[1]
+        return quadrature_error(vrfn.Cylinder_Gaussian_RF, grid, refz,
+                                reftheta, acceptance_angle, radius)
+
+    h, error = _search(acceptance_angle, quadrature_tolerance, error_at)
+    return size(h) + (error,)
+
+
+def auto_screen_config(screen_config, acceptance_angle):
+    """
+    Copy of a screen configuration with auto_resolution set, with the
+    resolution replaced by the one computed for the acceptance angle
+    (degrees).
+    """
+    if not screen_config.auto_resolution:
+        return screen_config
+    if isinstance(screen_config, EqualAreaSphereScreen):
+        num_points, _ = equal_area_resolution(
+            acceptance_angle, screen_config.quadrature_error,
+            half = screen_config.half)
+        return replace(screen_config, num_points = num_points,
+                       auto_resolution = False)
+    elif isinstance(screen_config, SphereScreen):
+        parallels, meridians, _ = sphere_resolution(
+            acceptance_angle, screen_config.quadrature_error,
+            half = screen_config.half)
+        return replace(screen_config, parallels = parallels,
+                       meridians = meridians, auto_resolution = False)
+    elif isinstance(screen_config, CylinderScreen):
+        columns, parallels, _ = cylinder_resolution(
+            acceptance_angle, screen_config.radius, screen_config.height,
+            screen_config.quadrature_error)
+        return replace(screen_config, columns = columns,
+                       parallels = parallels, auto_resolution = False)
+    raise TypeError('Unknown screen configuration {}'
+                    .format(type(screen_config).__name__))
+
+
+def main():
+    print('{:>10} {:>10} {:>22} {:>12} {:>22}'.format(
+        'acceptance', 'tolerance', 'sphere (par x mer)', 'equal area',
+        'cylinder (col x par)'))
+    default_sphere = SphereScreen()
+    default_cylinder = CylinderScreen()
+    for acceptance_angle in [2., 5., 10.]:
+        for tolerance in [1e-2, 1e-3, 1e-4]:
+            sphere = sphere_resolution(acceptance_angle, tolerance)
+            equal_area = equal_area_resolution(acceptance_angle, tolerance)
+            cylinder = cylinder_resolution(
+                acceptance_angle, default_cylinder.radius,
+                default_cylinder.height, tolerance)
+            print('{:>10.1f} {:>10.0e} {:>22} {:>12} {:>22}'.format(
+                acceptance_angle, tolerance,
+                '{} x {}'.format(*sphere[:2]), equal_area[0],
+                '{} x {}'.format(*cylinder[:2])))
+    print('defaults: sphere {} x {}, cylinder {} x {}'.format(
+        default_sphere.parallels, default_sphere.meridians,
+        default_cylinder.columns, default_cylinder.parallels))
+
+
+if __name__ == "__main__":
+    main()
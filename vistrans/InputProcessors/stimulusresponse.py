@@ -0,0 +1,128 @@
+import numpy as np
+
+from ..screen.input.image2d import Gratings
+
+
+class GratingsResponse(object):
+    """
+    Photon inputs of a drifting sinusoidal grating in closed form.
+
+    Screen interpolation and RF filtering are linear, so the input of
+    each photoreceptor is a sinusoid in time. Its offset, amplitude and
+    phase are obtained once by passing a uniform image and two quadrature
+    gratings through the screen and the filters, after which every step
+    is a vectorized cosine.
+
+    Parameters
+    ----------
+    gratings: vistrans.screen.input.image2d.Gratings
+        a sinusoidal grating.
+    screen: vistrans.screen.screen.Screen
+        screen that maps the images to screen intensities.
+    filter_screens: callable
+        maps screen intensities of shape (num_steps,) + screen shape to
+        photon inputs of shape (num_steps, num_photoreceptors).
+    """
+    def __init__(self, gratings, screen, filter_screens):
+        offset, amplitude, sin_image, cos_image, omega = \
+            gratings.quadrature_components()
+        images = np.stack([np.ones_like(sin_image), sin_image, cos_image])
+        responses = filter_screens(screen.images_to_screens(images))
+
+        dtype = responses.dtype
+        self.base = (offset * responses[0]).astype(dtype, copy = False)
+        self.amplitude = (amplitude * np.hypot(responses[1], responses[2])
+                          ).astype(dtype, copy = False)
+        self.phase = np.arctan2(responses[2], responses[1])
+        self.omega = omega
+        self.dt = gratings.dt
+        self.reset()
+
+    @classmethod
+    def applies_to(cls, image2d):
+        return isinstance(image2d, Gratings) and image2d.sinusoidal
+
+    def reset(self):
+        self.step = 0
+
+    def get_steps(self, num_steps):
+        """
+        Returns
+        -------
+        photons: array of shape (num_steps, num_photoreceptors)
+        """
+        t = (self.step + np.arange(num_steps)) * self.dt
+        self.step += num_steps
+        # the phase is computed in double precision, long runs would
+        # lose the phase in single precision
+        return (self.base + self.amplitude * np.cos(
+            self.omega * t[:, None] + self.phase)).astype(
+                self.base.dtype, copy = False)
+
+
+class PeriodicResponseCache(object):
+    """
+    Photon inputs of stimuli with a finite set of distinct frames,
+    e.g. the periodic positions of a Bar or the levels of a FlickerStep.
+
+    Each distinct frame is rendered and filtered once, the inputs of
+    later occurrences are served from a table keyed by the frame key of
+    the stimulus. A uniform frame is not rendered at all, its input is
+    the level times the sum of each filter over the screen.
+
+    Parameters
+    ----------
+    image2d: vistrans.screen.input.image2d.Image2D
+        stimulus with has_frame_keys set, see KeyedFrames.
+    screen: vistrans.screen.screen.Screen
+        screen that maps the images to screen intensities.
+    filter_screens: callable
+        maps screen intensities of shape (num_steps,) + screen shape to
+        photon inputs of shape (num_steps, num_photoreceptors).
+    """
+    def __init__(self, image2d, screen, filter_screens):
+        self.image2d = image2d
+        self.screen = screen
+        self.filter_screens = filter_screens
+        self.table = {}
+        self._filter_sums = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def applies_to(cls, image2d):
+        return image2d.has_frame_keys
+
+    @property
+    def filter_sums(self):
+        if self._filter_sums is None:
+            ones = np.ones((1,) + self.screen.grid[0].shape)
+            self._filter_sums = self.filter_screens(ones)[0]
+        return self._filter_sums
+
+    def _compute(self, key):
+        level = self.image2d.uniform_level(key)
+        if level is not None:
+            return (level * self.filter_sums).astype(
+                self.filter_sums.dtype, copy = False)
+        image = self.image2d.render_frame(key)
+        return self.filter_screens(
+            self.screen.images_to_screens(image[None]))[0]
+
+    def get_steps(self, num_steps):
+        """
+        Returns
+        -------
+        photons: array of shape (num_steps, num_photoreceptors)
+        """
+        keys = self.image2d.generate_frame_keys(num_steps)
+        inputs = []
+        for key in keys:
+            try:
+                inputs.append(self.table[key])
+                self.hits += 1
+            except KeyError:
+                self.table[key] = self._compute(key)
+                inputs.append(self.table[key])
+                self.misses += 1
+        return np.stack(inputs)
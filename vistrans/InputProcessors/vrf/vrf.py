@@ -4,32 +4,43 @@ from future.utils import with_metaclass
 import numpy as np
 PI = np.pi
 
-import pycuda.driver as cuda
-from pycuda.tools import dtype_to_ctype, context_dependent_memoize
-from pycuda.compiler import SourceModule
-
-from ...utils import parray as parray
-from ...utils import linalg as la
+from ...utils.imports import optional_import
 
 
 class RF(with_metaclass(ABCMeta, object)):
 
     # __metaclass__ = ABCMeta
 
-    def __init__(self, grid):
+    def __init__(self, grid, gpu = True):
         """
             grid: a meshgrid list with arrays for 2 coordinates
+
+            gpu: if False, the arrays are the numpy-backed PitchArrays
+                 of parray_no_gpu, the filters are computed with numpy
+                 and multiplied by linalg_no_gpu, so the same code
+                 runs without CUDA
         """
 
         if grid[0].ndim == 1:
-            grid = np.meshgrid(grid[0], grid[1])
-        else:
-            grid = grid
+            # broadcast views with the layout of np.meshgrid
+            grid = list(np.broadcast_arrays(grid[0][None, :],
+                                            grid[1][:, None]))
 
         self.dtype = np.dtype(np.double)
         self.grid = grid
         self.size = grid[0].size
 
+        self.gpu = gpu
+        if gpu:
+            self.parray = optional_import('...utils.parray',
+                                          'gpu receptive fields', __package__)
+            self.la = optional_import('...utils.linalg',
+                                      'gpu receptive fields', __package__)
+        else:
+            from ...utils import parray_no_gpu, linalg_no_gpu
+            self.parray = parray_no_gpu
+            self.la = linalg_no_gpu
+
         # flags
         self.kernel_set = False
         self.parameter_set = False
@@ -48,7 +59,8 @@ class RF(with_metaclass(ABCMeta, object)):
             print('Using default filter parameters')
             self.set_parameters()
         self.to_gpu()
-        self.load_kernel()
+        if self.gpu:
+            self.load_kernel()
         self.gpu_loaded = True
 
     @abstractmethod
@@ -67,6 +79,40 @@ class RF(with_metaclass(ABCMeta, object)):
     def _call_filter_func(self, N_filters, startbias):
         pass
 
+    @abstractmethod
+    def _weight(self, refa, refb, a, b):
+        """ numpy version of the filter kernel, weight of screen
+            points (a, b) in the filters centered at (refa, refb),
+            arguments are broadcast
+        """
+        pass
+
+    def _generate_filters_no_gpu(self, N_filters, startbias, block = 256):
+        """ the filters of the kernel, computed by blocks of filters """
+        grid = [g.reshape((1, -1)) for g in self.grid]
+        # subnormal weights in the tails make the products many times
+        # slower on the host
+        tiny = np.finfo(self.dtype).tiny
+        for start in range(0, N_filters, block):
+            stop = min(start + block, N_filters)
+            refs = slice(startbias + start, startbias + stop)
+            weights = self._weight(
+                self.refa[refs, None], self.refb[refs, None], *grid)
+            weights[np.abs(weights) < tiny] = 0
+            self.filters.gpudata[start:stop] = weights
+
+    def _filters_per_product(self):
+        """ number of filters generated and multiplied at once,
+            limited by the free memory of the device
+        """
+        if not self.gpu:
+            return self.num_neurons
+        import pycuda.driver as cuda
+        free, total = cuda.mem_get_info()
+        num_filters = (free // self.dtype.itemsize) * 3 // 4 // self.size
+        num_filters -= num_filters % 2
+        return min(num_filters, self.num_neurons)
+
     def generate_filters(self, N_filters=None, startbias=0):
         """
         Generate a batch of filters from parameters set in self
@@ -81,13 +127,16 @@ class RF(with_metaclass(ABCMeta, object)):
         if hasattr(self, 'filters'):
             if N_filters != self.filters.shape[0]:
                 delattr(self, 'filters')
-                self.filters = parray.empty(
+                self.filters = self.parray.empty(
                     (N_filters, self.size), self.dtype)
         else:
-            self.filters = parray.empty(
+            self.filters = self.parray.empty(
                 (N_filters, self.size), self.dtype)
 
-        self._call_filter_func(N_filters, startbias)
+        if self.gpu:
+            self._call_filter_func(N_filters, startbias)
+        else:
+            self._generate_filters_no_gpu(N_filters, startbias)
 
     def filter(self, video_input):
         """
@@ -104,22 +153,18 @@ class RF(with_metaclass(ABCMeta, object)):
         # rasterizing inputs
         video_input.resize((video_input.shape[0], self.size))
 
-        d_video = parray.to_gpu(video_input)
-        d_output = parray.empty((self.num_neurons, video_input.shape[0]),
-                                self.dtype)
-        free, total = cuda.mem_get_info()
-        self.ONE_TIME_FILTERS = ((free // self.dtype.itemsize)
-                                 * 3 // 4 // self.size)
-        self.ONE_TIME_FILTERS -= self.ONE_TIME_FILTERS % 2
-        self.ONE_TIME_FILTERS = min(self.ONE_TIME_FILTERS, self.num_neurons)
-        handle = la.cublashandle()
+        d_video = self.parray.to_gpu(video_input)
+        d_output = self.parray.empty(
+            (self.num_neurons, video_input.shape[0]), self.dtype)
+        self.ONE_TIME_FILTERS = self._filters_per_product()
+        handle = self.la.cublashandle()
 
         for i in np.arange(0, self.num_neurons, self.ONE_TIME_FILTERS):
             Nfilters = min(self.ONE_TIME_FILTERS, self.num_neurons - i)
             self.generate_filters(startbias=i, N_filters=Nfilters)
-            la.dot(self.filters, d_video, opb='t',
-                   C=d_output[i: i + Nfilters],
-                   handle=handle)
+            self.la.dot(self.filters, d_video, opb='t',
+                        C=d_output[i: i + Nfilters],
+                        handle=handle)
         del self.filters
         return d_output.T()
 
@@ -141,22 +186,18 @@ class RF(with_metaclass(ABCMeta, object)):
         # rasterizing inputs
         image_input.resize((1, self.size))
 
-        d_image = parray.to_gpu(image_input)
-        d_output = parray.empty((self.num_neurons, image_input.shape[0]),
-                                self.dtype)
-        free, total = cuda.mem_get_info()
-        self.ONE_TIME_FILTERS = ((free // self.dtype.itemsize)
-                                 * 3 // 4 // self.size)
-        self.ONE_TIME_FILTERS -= self.ONE_TIME_FILTERS % 2
-        self.ONE_TIME_FILTERS = min(self.ONE_TIME_FILTERS, self.num_neurons)
-        handle = la.cublashandle()
+        d_image = self.parray.to_gpu(image_input)
+        d_output = self.parray.empty(
+            (self.num_neurons, image_input.shape[0]), self.dtype)
+        self.ONE_TIME_FILTERS = self._filters_per_product()
+        handle = self.la.cublashandle()
 
         for i in np.arange(0, self.num_neurons, self.ONE_TIME_FILTERS):
             Nfilters = min(self.ONE_TIME_FILTERS, self.num_neurons - i)
             self.generate_filters(startbias=i, N_filters=Nfilters)
-            la.dot(self.filters, d_image, opb='t',
-                   C=d_output[i: i + Nfilters],
-                   handle=handle)
+            self.la.dot(self.filters, d_image, opb='t',
+                        C=d_output[i: i + Nfilters],
+                        handle=handle)
         del self.filters
         return d_output.T()
 
@@ -178,16 +219,17 @@ class RF(with_metaclass(ABCMeta, object)):
         # rasterizing inputs
         image_input.resize((1, self.size))
 
-        d_image = parray.to_gpu(image_input)
-        handle = la.cublashandle()
+        d_image = self.parray.to_gpu(image_input)
+        handle = self.la.cublashandle()
 
-        return la.dot(self.filters, d_image, opb='t', handle=handle).T()
+        return self.la.dot(self.filters, d_image, opb='t',
+                           handle=handle).T()
 
 
 class Sphere_Gaussian_RF(RF):
 
-    def __init__(self, grid):
-        super(Sphere_Gaussian_RF, self).__init__(grid)
+    def __init__(self, grid, gpu = True):
+        super(Sphere_Gaussian_RF, self).__init__(grid, gpu = gpu)
 
     def load_kernel(self):
         self.filter_func = _get_von_mises_fisher_rf(self.dtype)
@@ -197,12 +239,13 @@ class Sphere_Gaussian_RF(RF):
         self.kernel_set = True
 
     def to_gpu(self):
-        self.d_refelev = parray.to_gpu(self.refelev)
-        self.d_refazim = parray.to_gpu(self.refazim)
-        self.d_grid = [parray.to_gpu(self.grid[i].reshape(-1))
+        self.d_refelev = self.parray.to_gpu(self.refelev)
+        self.d_refazim = self.parray.to_gpu(self.refazim)
+        self.d_grid = [self.parray.to_gpu(self.grid[i].reshape(-1))
                        for i in range(len(self.grid))]
 
     def load_parameters(self, **kwargs):
+        self.dtype = np.dtype(kwargs.get('dtype', self.dtype))
         self.refelev = kwargs.get('refa').astype(self.dtype)
         self.refazim = kwargs.get('refb').astype(self.dtype)
         self.acceptance_angle = kwargs.get('acceptance_angle')
@@ -260,11 +303,18 @@ class Sphere_Gaussian_RF(RF):
             self.size, N_filters,
             self.dxy, self.kappa)
 
+    def _weight(self, refelev, refazim, elevs, azims):
+        s1, c1 = np.sin(elevs), np.cos(elevs)
+        inner_minus_1 = c1 * np.cos(refelev) * np.cos(refazim - azims) \
+            + s1 * np.sin(refelev) - 1
+        return self.kappa / (2 * PI) / (1 - np.exp(-2 * self.kappa)) \
+            * np.exp(self.kappa * inner_minus_1) * self.dxy * c1
+
 
 class Cylinder_Gaussian_RF(RF):
 
-    def __init__(self, grid):
-        super(Cylinder_Gaussian_RF, self).__init__(grid)
+    def __init__(self, grid, gpu = True):
+        super(Cylinder_Gaussian_RF, self).__init__(grid, gpu = gpu)
 
     def load_kernel(self):
         self.filter_func = _get_gaussian_cylinder(self.dtype)
@@ -274,15 +324,16 @@ class Cylinder_Gaussian_RF(RF):
         self.kernel_set = True
 
     def to_gpu(self):
-        self.d_refz = parray.to_gpu(self.refz)
-        self.d_reftheta = parray.to_gpu(self.reftheta)
-        self.d_grid = [parray.to_gpu(self.grid[i].reshape(-1))
+        self.d_refz = self.parray.to_gpu(self.refz)
+        self.d_reftheta = self.parray.to_gpu(self.reftheta)
+        self.d_grid = [self.parray.to_gpu(self.grid[i].reshape(-1))
                        for i in range(len(self.grid))]
 
     def load_gpu(self):
         super(Cylinder_Gaussian_RF, self).load_gpu()
 
     def load_parameters(self, **kwargs):
+        self.dtype = np.dtype(kwargs.get('dtype', self.dtype))
         self.refz = kwargs.get('refa').astype(self.dtype)
         self.reftheta = kwargs.get('refb').astype(self.dtype)
         self.acceptance_angle = kwargs.get('acceptance_angle')  # degrees
@@ -346,11 +397,23 @@ class Cylinder_Gaussian_RF(RF):
             self.size, N_filters,
             self.dxy, self.radius, self.kappa, self.sigma)
 
-
-context_dependent_memoize
+    def _weight(self, refz, reftheta, zs, thetas):
+        # gaussian_cylinder2
+        radius = self.radius
+        inv_len = 1 / np.sqrt(radius * radius + zs * zs)
+        inv_ref_len = 1 / np.sqrt(radius * radius + refz * refz)
+        inp = (radius * radius * np.cos(thetas - reftheta) + zs * refz) \
+            * inv_len * inv_ref_len
+        return self.kappa / (2 * PI) / (1 - np.exp(-2 * self.kappa)) \
+            * np.exp(self.kappa * (inp - 1)) * radius \
+            * (inv_len * inv_len * inv_len) * self.dxy
 
 
 def _get_von_mises_fisher_rf(dtype):
+    import pycuda.driver as cuda
+    from pycuda.compiler import SourceModule
+    from pycuda.tools import dtype_to_ctype
+
     template = """
 
 #define ONE_OVER_TWO_PI 0.159154943091895
@@ -415,6 +478,10 @@ von_mises_fisher(%(type)s* rfs, int rfs_ld,
 
 
 def _get_gaussian_cylinder(dtype):
+    import pycuda.driver as cuda
+    from pycuda.compiler import SourceModule
+    from pycuda.tools import dtype_to_ctype
+
     template = """
 
 #include <stdio.h>
@@ -540,6 +607,8 @@ if __name__ == "__main__":
     import pycuda.autoinit
     import numpy.random as random
 
+    from ...utils import parray
+
     random.seed(481988)
 
     dtype = np.double
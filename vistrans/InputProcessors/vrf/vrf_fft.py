@@ -0,0 +1,253 @@
+from abc import ABCMeta, abstractmethod
+from future.utils import with_metaclass
+import numpy as np
+
+from . import vrf_no_gpu as vrfn
+
+
+def _cubic_weights(x, n):
+    """
+    Indices and weights of 4 point Lagrange interpolation at fractional
+    indices x of an array of length n, indices are clamped at the ends.
+
+    Returns
+    -------
+    indices, weights: arrays of shape (4,) + x.shape
+    """
+    i1 = np.clip(np.floor(x).astype(np.intp), 0, max(n - 2, 0))
+    t = x - i1
+    indices = np.clip(i1 + np.arange(-1, 3).reshape((4,) + (1,) * x.ndim),
+                      0, n - 1)
+    weights = np.stack([-t * (t - 1) * (t - 2) / 6,
+                        (t + 1) * (t - 1) * (t - 2) / 2,
+                        -(t + 1) * t * (t - 2) / 2,
+                        (t + 1) * t * (t - 1) / 6])
+    return indices, weights
+
+
+class FFT_RF(with_metaclass(ABCMeta, object)):
+    """
+    Mixin that applies the filters of an RF class with FFTs along the
+    second screen coordinate (grid[1], the rows of the screen grid).
+
+    The filters must depend on that coordinate only through its
+    difference from the reference point of the filter, e.g. on azimuth
+    through cos(refazim - azimuth) on a sphere. The responses of filters
+    with a common first reference coordinate (refa) are then a
+    convolution of each column of the screen with a fixed kernel along
+    the rows. Responses are computed for a bank of refa values at all
+    grid rows and are interpolated cubically to the reference point of
+    each photoreceptor. The cost per frame is
+    O(bank_size * P log P) per column instead of O(num_neurons * P)
+    for the dense product with P rows.
+
+    The RF class must provide _weight(refa, refb, grid0, grid1) with
+    broadcasting.
+
+    Extra parameters of load_parameters
+    -----------------------------------
+    bank_size: int
+        size of the bank of refa values, by default the bank has a
+        spacing of a sixth of the acceptance angle.
+    frequency_tolerance: float
+        frequencies at which all kernel coefficients are below this
+        fraction of the largest coefficient are dropped.
+    """
+    def __init__(self, grid):
+        super(FFT_RF, self).__init__(grid)
+        self.columns = self.grid[0][0, :]
+        self.rows = self.grid[1][:, 0]
+        self.drow = self.rows[1] - self.rows[0]
+        if not np.allclose(np.diff(self.rows), self.drow):
+            raise ValueError('FFT filtering requires a uniform grid')
+
+    def load_parameters(self, **kwargs):
+        self.bank_size = kwargs.get('bank_size', None)
+        self.frequency_tolerance = kwargs.get('frequency_tolerance', 1e-7)
+        super(FFT_RF, self).load_parameters(**kwargs)
+
+    @abstractmethod
+    def _bank_step(self):
+        """ default spacing of the bank of refa values """
+        pass
+
+    def compute_filters(self):
+        """ computes the FFTs of the kernels of the bank """
+        num_rows = self.rows.size
+        refa = self.refa
+        refb = self.refb
+
+        if self.bank_size is None:
+            self.bank_size = int(np.ceil(
+                (refa.max() - refa.min()) / self._bank_step())) + 4
+        self.bank = np.linspace(refa.min(), refa.max(), self.bank_size)
+
+        # range of output rows, in grid steps from the first row,
+        # that covers the interpolation points of the reference points
+        pos = (refb - self.rows[0]) / self.drow
+        self.out_start = int(np.floor(pos.min())) - 1
+        self.out_stop = int(np.floor(pos.max())) + 3
+        # kernel lags (output index - input index)
+        lag_start = self.out_start - (num_rows - 1)
+        num_lags = self.out_stop - 1 - lag_start + 1
+        self.fft_size = _next_fast_len(num_rows + num_lags - 1)
+
+        lags = (lag_start + np.arange(num_lags)) * self.drow
+        kernels = self._weight(self.bank[:, None, None],
+                               lags[None, :, None],
+                               self.columns[None, None, :], 0)
+        kernel_fft = np.fft.rfft(kernels, self.fft_size, axis = 1)
+        # kernels are smooth along the rows, frequencies above the last
+        # one with a non-negligible coefficient are dropped
+        magnitude = np.abs(kernel_fft).max(axis = (0, 2))
+        significant = np.nonzero(
+            magnitude > self.frequency_tolerance * magnitude.max())[0]
+        self.num_frequencies = significant[-1] + 1
+        # stored as (frequency, bank, screen column)
+        # for a batched matrix-vector product per frequency
+        self.kernel_fft = np.ascontiguousarray(
+            kernel_fft[:, :self.num_frequencies].transpose(1, 0, 2),
+            np.complex64)
+
+        # interpolation from the bank to the photoreceptors,
+        # flat indices in the bank responses and weights of
+        # 4 x 4 points around each reference point
+        bank_pos = (refa - self.bank[0]) / \
+            max(self.bank[-1] - self.bank[0], 1e-300) * (self.bank_size - 1)
+        bank_index, bank_weights = _cubic_weights(bank_pos, self.bank_size)
+        # columns of the valid convolution output
+        row_index, row_weights = _cubic_weights(
+            pos - self.out_start, self.out_stop - self.out_start)
+        row_index += num_rows - 1
+        self.interp_index = bank_index[:, None] * self.fft_size \
+            + row_index[None, :]
+        self.interp_weights = bank_weights[:, None] * row_weights[None, :]
+
+    def bank_responses(self, image):
+        """
+        image: array of the screen grid shape
+
+        Returns
+        -------
+        responses: array of shape (bank_size, fft_size), where entry
+                   [r, num_rows - 1 + m] is the response of a filter
+                   with refa = bank[r] and refb = rows[0] +
+                   (out_start + m) * drow
+        """
+        image_fft = np.fft.rfft(image, self.fft_size, axis = 0)
+        image_fft = image_fft[:self.num_frequencies].astype(np.complex64)
+        products = np.matmul(self.kernel_fft, image_fft[:, :, None])
+        return np.ascontiguousarray(np.fft.irfft(
+            products[:, :, 0], self.fft_size, axis = 0).T)
+
+    def filter_image(self, image_input):
+        """
+        Performs RF filtering on input video
+        for all the rfs
+        """
+        image = np.asarray(image_input).reshape(self.grid[0].shape)
+        responses = self.bank_responses(image)
+
+        output = np.sum(responses.ravel()[self.interp_index]
+                        * self.interp_weights, axis = (0, 1))
+        return output.reshape((1, -1))
+
+    def filter(self, video_input):
+        """
+        Performs RF filtering on input video
+        for all the rfs
+        """
+        video_input = np.asarray(video_input).reshape(
+            (-1,) + self.grid[0].shape)
+        output = np.empty((video_input.shape[0], self.num_neurons),
+                          self.dtype)
+        for i, image in enumerate(video_input):
+            output[i] = self.filter_image(image)
+        return output
+
+
+class Sphere_FFT_RF(FFT_RF, vrfn.Sphere_Gaussian_RF):
+    """
+    Sphere_Gaussian_RF filters applied with FFTs along azimuth,
+    the bank is over reference elevations.
+    """
+    def _bank_step(self):
+        return self.acceptance_angle * np.pi / 180 / 6
+
+
+class Cylinder_FFT_RF(FFT_RF, vrfn.Cylinder_Gaussian_RF):
+    """
+    Cylinder_Gaussian_RF filters applied with FFTs along theta,
+    the bank is over reference heights z.
+    """
+    def _bank_step(self):
+        # an angle at the center of the cylinder spans at least
+        # radius * angle along z
+        return self.radius * self.acceptance_angle * np.pi / 180 / 6
+
+
+def _next_fast_len(n):
+    try:
+        from scipy.fft import next_fast_len
+    except ImportError:
+        return 1 << int(np.ceil(np.log2(n)))
+    return next_fast_len(n, real = True)
+
+
+def compare(direct_cls, fft_cls, grid, refa, refb, acceptance_angle,
+            radius, frames = 20, seed = 0):
+    """ time and accuracy of fft_cls against the dense direct_cls """
+    import time
+
+    image = np.random.default_rng(seed).uniform(3e3, 3e5, grid[0].shape)
+
+    rfs = {}
+    for name, cls in [('direct', direct_cls), ('fft', fft_cls)]:
+        start = time.perf_counter()
+        rfs[name] = cls(grid)
+        rfs[name].load_parameters(refa = refa, refb = refb,
+                                  acceptance_angle = acceptance_angle,
+                                  radius = radius)
+        print('{}: setup {:.3f} s'.format(name, time.perf_counter() - start))
+
+    outputs = {}
+    for name, rf in rfs.items():
+        start = time.perf_counter()
+        for _ in range(frames):
+            outputs[name] = rf.filter_image(image.reshape((1, -1)).copy())
+        print('{}: {:.4f} s/frame'.format(
+            name, (time.perf_counter() - start) / frames))
+
+    print('filter memory: direct {:.1f} MB, fft {:.1f} MB'.format(
+        rfs['direct'].filters.nbytes / 1e6, rfs['fft'].kernel_fft.nbytes / 1e6))
+    error = np.abs(outputs['fft'] - outputs['direct']) / \
+        np.abs(outputs['direct'])
+    print('relative error: max {:.2e}, mean {:.2e}'.format(
+        error.max(), error.mean()))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    num_neurons = 2000
+    acceptance_angle = 5.
+
+    print('SphereScreen 100 parallels x 800 meridians')
+    grid = np.meshgrid(np.linspace(-np.pi / 2, np.pi / 2, 100),
+                       np.linspace(0, np.pi, 800))
+    compare(vrfn.Sphere_Gaussian_RF, Sphere_FFT_RF, grid,
+            rng.uniform(-1.2, 1.2, num_neurons),
+            rng.uniform(0.2, np.pi - 0.2, num_neurons),
+            acceptance_angle, 1.)
+
+    print('CylinderScreen 200 parallels x 800 columns')
+    radius = 10.
+    grid = np.meshgrid(np.linspace(-10, 10, 200),
+                       np.linspace(0, np.pi, 800))
+    compare(vrfn.Cylinder_Gaussian_RF, Cylinder_FFT_RF, grid,
+            rng.uniform(-8, 8, num_neurons),
+            rng.uniform(0.2, np.pi - 0.2, num_neurons),
+            acceptance_angle, radius)
+
+
+if __name__ == "__main__":
+    main()
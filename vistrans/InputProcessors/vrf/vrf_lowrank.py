@@ -0,0 +1,216 @@
+import hashlib
+
+import numpy as np
+
+from . import vrf_no_gpu as vrfn
+
+
+def filter_key(rfs):
+    """
+    Hash of the parameters that determine the filters of an RF object
+    (the screen grid, the centers, acceptance angle, radius and storage
+    precision of the filters), of each RF of a Stacked_RF.
+    """
+    h = hashlib.sha256()
+    for rf in getattr(rfs, 'rfs', [rfs]):
+        h.update(type(rf).__name__.encode())
+        for array in list(rf.grid) + [rf.refa, rf.refb]:
+            array = np.ascontiguousarray(array, np.double)
+            h.update(repr(array.shape).encode())
+            h.update(array.tobytes())
+        h.update(repr((float(rf.acceptance_angle), float(rf.radius),
+                       np.dtype(rf.filter_dtype).str)).encode())
+    return h.hexdigest()
+
+
+def randomized_range(A, size, power_iterations = 2, seed = 0):
+    """
+    Orthonormal basis of an approximation of the range of A
+    with `size` columns.
+    """
+    rng = np.random.default_rng(seed)
+    Q = np.dot(A, rng.standard_normal((A.shape[1], size)).astype(A.dtype))
+    Q, _ = np.linalg.qr(Q)
+    for _ in range(power_iterations):
+        Q, _ = np.linalg.qr(np.dot(A.T, Q))
+        Q, _ = np.linalg.qr(np.dot(A, Q))
+    return Q
+
+
+class LowRankFilterBank(object):
+    """
+    Filter matrix of shape (screen size, num_neurons) approximated by
+    the product U V of factors of shape (screen size, rank) and
+    (rank, num_neurons), a frame is filtered as (frame U) V.
+
+    Parameters
+    ----------
+    U, V: arrays
+        factors of the filter matrix.
+    relative_error: float
+        relative Frobenius norm error of the approximation, if known.
+    key: str or None
+        filter_key of the RF object whose filters were factorized.
+    """
+    def __init__(self, U, V, relative_error = np.nan, key = None):
+        self.U = np.ascontiguousarray(U)
+        self.V = np.ascontiguousarray(V)
+        self.relative_error = float(relative_error)
+        self.key = key
+        self.size, self.rank = self.U.shape
+        self.num_neurons = self.V.shape[1]
+
+    @classmethod
+    def compress(cls, filters, rank = None, tolerance = 1e-3,
+                 oversample = 10, power_iterations = 2, seed = 0):
+        """
+        Factorize a filter matrix with a randomized SVD.
+
+        Parameters
+        ----------
+        filters: array of shape (screen size, num_neurons) or an RF with
+                 computed filters
+        rank: int or None
+            rank of the factors, if None the smallest rank with relative
+            Frobenius error below tolerance is used.
+        tolerance: float
+            target error when rank is None.
+        oversample, power_iterations, seed:
+            parameters of the randomized range finder.
+        """
+        key = None
+        if isinstance(filters, vrfn.RF):
+            key = filter_key(filters)
+            filters = filters.filters
+        # the factorization is not available in half precision
+        filters = filters.astype(np.promote_types(filters.dtype, np.float32),
+                                 copy = False)
+        max_rank = min(filters.shape)
+        norm2 = np.sum(np.square(filters, dtype = np.double))
+
+        sketch = max_rank if rank is None and max_rank <= 64 else \
+            min(max_rank, (rank or 64) + oversample)
+        while True:
+            Q = randomized_range(filters, sketch,
+                                 power_iterations = power_iterations,
+                                 seed = seed)
+            Ub, s, Vt = np.linalg.svd(np.dot(Q.T, filters),
+                                      full_matrices = False)
+            # error of the rank k approximation is
+            # ||A||^2 - sum of the first k squared singular values
+            residual = np.maximum(
+                norm2 - np.cumsum(np.square(s.astype(np.double))), 0)
+            errors = np.sqrt(residual / norm2)
+            if rank is not None:
+                k = min(rank, s.size)
+                break
+            below = np.nonzero(errors <= tolerance)[0]
+            if below.size and (below[0] + 1 + oversample <= sketch
+                               or sketch == max_rank):
+                k = below[0] + 1
+                break
+            if sketch == max_rank:
+                k = s.size
+                break
+            sketch = min(max_rank, 2 * sketch)
+
+        U = np.dot(Q, Ub[:, :k]).astype(filters.dtype)
+        V = (s[:k, None] * Vt[:k]).astype(filters.dtype)
+        return cls(U, V, relative_error = errors[k - 1], key = key)
+
+    def save(self, filename):
+        np.savez(filename, U = self.U, V = self.V,
+                 relative_error = self.relative_error,
+                 size = self.size, num_neurons = self.num_neurons,
+                 key = '' if self.key is None else self.key)
+
+    @classmethod
+    def load(cls, filename, rfs = None):
+        """
+        Factors saved in filename, if rfs is given they must be the
+        factors of its filters, otherwise a ValueError is raised.
+        """
+        with np.load(filename) as data:
+            key = str(data['key']) if 'key' in data.files else ''
+            bank = cls(data['U'], data['V'],
+                       relative_error = data['relative_error'],
+                       key = key or None)
+        if rfs is not None and not bank.matches(rfs):
+            raise ValueError('low-rank filters in {} do not match the '
+                             'receptive fields'.format(filename))
+        return bank
+
+    def matches(self, rfs):
+        """ True if these are the factors of the filters of rfs """
+        return (self.size == rfs.size and
+                self.num_neurons == rfs.num_neurons and
+                self.key is not None and self.key == filter_key(rfs))
+
+    @property
+    def nbytes(self):
+        return self.U.nbytes + self.V.nbytes
+
+    def filter_image(self, image_input):
+        """
+        Performs RF filtering on input image
+
+        Returns
+        -------
+        output: array of shape (1, num_neurons)
+        """
+        image = np.asarray(image_input, self.U.dtype).reshape((1, -1))
+        assert image.shape[1] == self.size
+        return np.dot(np.dot(image, self.U), self.V)
+
+    def filter(self, video_input):
+        """
+        Performs RF filtering on input video
+
+        Returns
+        -------
+        output: array of shape (num_frames, num_neurons)
+        """
+        video = np.asarray(video_input, self.U.dtype).reshape(
+            (-1, self.size))
+        return np.dot(np.dot(video, self.U), self.V)
+
+
+def main():
+    import time
+
+    rng = np.random.default_rng(0)
+    grid = np.meshgrid(np.linspace(-np.pi / 2, np.pi / 2, 100),
+                       np.linspace(0, np.pi, 400))
+    frames = np.ascontiguousarray(
+        rng.uniform(3e3, 3e5, (50, grid[0].size)), np.float32)
+
+    print('{:>8} {:>10} {:>10} {:>6} {:>10} {:>10} {:>10} {:>10}'.format(
+        'neurons', 'acceptance', 'tolerance', 'rank', 'error', 'MB',
+        'dense ms', 'lowrank ms'))
+    for num_neurons, acceptance_angle in [(1000, 5.), (4000, 5.),
+                                          (4000, 10.)]:
+        # photoreceptors on a patch of the screen
+        rfs = vrfn.Sphere_Gaussian_RF(grid)
+        rfs.load_parameters(refa = rng.uniform(-0.5, 0.5, num_neurons),
+                            refb = rng.uniform(1., 2., num_neurons),
+                            acceptance_angle = acceptance_angle,
+                            radius = 1.)
+        start = time.perf_counter()
+        np.dot(frames, rfs.filters)
+        dense = (time.perf_counter() - start) / frames.shape[0]
+
+        for tolerance in [1e-2, 1e-3]:
+            bank = LowRankFilterBank.compress(rfs, tolerance = tolerance)
+            start = time.perf_counter()
+            bank.filter(frames)
+            lowrank = (time.perf_counter() - start) / frames.shape[0]
+            print('{:>8d} {:>10.1f} {:>10.0e} {:>6d} {:>10.2e} '
+                  '{:>10.1f} {:>10.3f} {:>10.3f}'.format(
+                      num_neurons, acceptance_angle, tolerance, bank.rank,
+                      bank.relative_error, bank.nbytes / 1e6,
+                      dense * 1e3, lowrank * 1e3))
+        print('dense filters: {:.1f} MB'.format(rfs.filters.nbytes / 1e6))
+
+
+if __name__ == "__main__":
+    main()
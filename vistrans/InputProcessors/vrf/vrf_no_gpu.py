@@ -1,6 +1,5 @@
 from abc import ABCMeta, abstractmethod, abstractproperty
 from future.utils import with_metaclass
-import math
 
 import numpy as np
 
@@ -15,9 +14,9 @@ class RF(with_metaclass(ABCMeta, object)):
         """
 
         if grid[0].ndim == 1:
-            grid = np.meshgrid(grid[0], grid[1])
-        else:
-            grid = grid
+            # broadcast views with the layout of np.meshgrid
+            grid = list(np.broadcast_arrays(grid[0][None, :],
+                                            grid[1][:, None]))
 
         self.grid = grid
         self.grid0 = self.grid[0].reshape(-1)
@@ -33,7 +32,8 @@ class RF(with_metaclass(ABCMeta, object)):
     def load_parameters(self, **kwargs):
         '''
             should set num_neurons and
-            parameters_loaded flag
+            parameters_loaded flag, and compute the filters
+            unless compute_filters is False
         '''
         pass
 
@@ -48,9 +48,15 @@ class RF(with_metaclass(ABCMeta, object)):
     def compute_filters(self):
         # there is an exception when this object is too large
         # so lower precision was used
-        filters = np.empty((self.size, self.num_neurons), dtype=np.float32)
+        filters = np.empty((self.size, self.num_neurons),
+                           dtype=self.filter_dtype)
+        # weights in the tails of the filters that are subnormal
+        # in the storage precision make the products many times slower
+        tiny = np.finfo(filters.dtype).tiny
         for i in range(self.num_neurons):
-            filters[:, i] = self._generate_filter(i)
+            weights = self._generate_filter(i)
+            weights[np.abs(weights) < tiny] = 0
+            filters[:, i] = weights
         self.filters = filters
 
     def filter(self, video_input):
@@ -96,8 +102,113 @@ class RF(with_metaclass(ABCMeta, object)):
         # rasterizing inputs
         image_input.resize((1, self.size))
 
+        image_input = image_input.astype(self.dtype, copy = False)
+        if self.filters.dtype == np.float16:
+            return self._dot_half(image_input)
         return np.dot(image_input, self.filters)
 
+    def _dot_half(self, inputs, block = 4096):
+        """ product with float16 filters, which are converted
+            to float32 by blocks of screen points
+        """
+        inputs = inputs.astype(np.float32, copy = False)
+        output = np.zeros((inputs.shape[0], self.num_neurons), np.float32)
+        for start in range(0, self.size, block):
+            output += np.dot(inputs[:, start:start + block],
+                             self.filters[start:start + block]
+                             .astype(np.float32))
+        return output
+
+    def release_filters(self):
+        """ frees the filter matrix, e.g. once it is compressed """
+        if hasattr(self, 'filters'):
+            del self.filters
+
+    def _load_dtypes(self, kwargs):
+        """ precision of the parameters and of the filter matrix """
+        self.dtype = np.dtype(kwargs.get('dtype', self.dtype))
+        self.filter_dtype = np.dtype(kwargs.get('filter_dtype', np.float32))
+
+
+class IncrementalFilter(object):
+    """
+    Filters consecutive images by updating the previous output with
+    the contribution of the pixels that changed,
+    i.e. output += filters[changed].T @ delta.
+
+    Only filter weights above weight_tolerance times the maximum weight
+    of each filter are kept in the per-pixel index used for the updates,
+    the full product is computed for the first image, when more than
+    threshold of the pixels change, and every refresh_interval images
+    so that truncation errors do not accumulate.
+
+    Parameters
+    ----------
+    rfs: RF
+        receptive fields with computed filters.
+    threshold: float
+        fraction of changed pixels above which the full product is used.
+    weight_tolerance: float
+        relative weight below which a pixel is not indexed for a filter.
+    refresh_interval: int
+        number of images after which the full product is recomputed.
+    """
+    def __init__(self, rfs, threshold = 0.1, weight_tolerance = 1e-6,
+                 refresh_interval = 1000):
+        from scipy.sparse import csr_matrix
+
+        self.rfs = rfs
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+
+        filters = rfs.filters
+        keep = np.abs(filters) > \
+            weight_tolerance * np.abs(filters).max(axis = 0)
+        # row i lists the filters with non-negligible weight on pixel i
+        # sparse matrices are not available in half precision
+        self.pixel_index = csr_matrix(np.where(keep, filters, 0).astype(
+            np.promote_types(filters.dtype, np.float32)))
+
+        self.previous_image = None
+        self.previous_output = None
+        self.since_refresh = 0
+        self.num_full = 0
+        self.num_incremental = 0
+
+    def filter_image(self, image_input):
+        """
+        image_input: array with rfs.size elements
+
+        Returns
+        -------
+        output: array of shape (1, num_neurons)
+        """
+        image = np.asarray(image_input, self.rfs.dtype).reshape(-1)
+        assert image.size == self.rfs.size
+
+        changed = None
+        if (self.previous_image is not None
+                and self.since_refresh < self.refresh_interval):
+            delta = image - self.previous_image
+            changed = np.flatnonzero(delta)
+            if changed.size > self.threshold * image.size:
+                changed = None
+
+        if changed is None:
+            output = self.rfs.filter_image(
+                image.reshape((1, -1)).copy()).reshape(-1)
+            self.since_refresh = 0
+            self.num_full += 1
+        else:
+            output = self.previous_output + \
+                self.pixel_index[changed].T.dot(delta[changed])
+            self.since_refresh += 1
+            self.num_incremental += 1
+
+        self.previous_image = image
+        self.previous_output = output
+        return output.reshape((1, -1))
+
 
 class Sphere_Gaussian_RF(RF):
     ONE_OVER_TWO_PI = 0.159154943091895
@@ -114,6 +225,7 @@ class Sphere_Gaussian_RF(RF):
         return self.refazim
 
     def load_parameters(self, **kwargs):
+        self._load_dtypes(kwargs)
         self.refelev = kwargs.get('refa').astype(self.dtype)
         self.refazim = kwargs.get('refb').astype(self.dtype)
         self.acceptance_angle = kwargs.get('acceptance_angle')
@@ -135,24 +247,51 @@ class Sphere_Gaussian_RF(RF):
         self.kappa = np.log(
             2) / (1 - np.cos(self.acceptance_angle * np.pi / 180 / 2 / M))
 
-        self.dxy = np.diff(self.grid[0][0, :2]) * \
-            np.diff(self.grid[1][:2, 0])[0]
-        self.compute_filters()
+        self.dxy = self._grid_area()
+        if kwargs.get('compute_filters', True):
+            self.compute_filters()
 
         self.parameter_set = True
 
+    def _grid_area(self):
+        """ area of a grid cell in elevation-azimuth coordinates """
+        return np.diff(self.grid[0][0, :2]) * \
+            np.diff(self.grid[1][:2, 0])[0]
+
+    def _point_area(self, elevs):
+        """ area of the sphere represented by points at elevation elevs,
+            the area element of the sphere is cos(elevation)
+        """
+        return self.dxy * np.cos(elevs)
+
     def _generate_filter(self, i):
-        refelev = self.refelev[i]
-        refazim = self.refazim[i]
+        return self._weight(self.refelev[i], self.refazim[i],
+                            self.grid0, self.grid1)
 
-        elevs = self.grid0
-        azims = self.grid1
+    def _weight(self, refelev, refazim, elevs, azims):
+        """ weight of screen points (elevs, azims) in the filter
+            centered at (refelev, refazim), arguments are broadcast
+        """
         npelevs = np.cos(elevs)
         innerM1 = npelevs * np.cos(refelev) * np.cos(refazim - azims) \
             + np.sin(elevs) * np.sin(refelev) - 1
 
         return self.kappa * self.ONE_OVER_TWO_PI / (1 - np.exp(-2 * self.kappa)) * \
-            np.exp(self.kappa * innerM1) * self.dxy * np.cos(azims)
+            np.exp(self.kappa * innerM1) * self._point_area(elevs)
+
+
+class EqualArea_Sphere_Gaussian_RF(Sphere_Gaussian_RF):
+    """
+    Sphere_Gaussian_RF on the scattered points of an
+    EqualAreaSphereScreen, every point represents the same area.
+    """
+    def _grid_area(self):
+        # half sphere if all azimuths are in [0, pi]
+        half = self.grid1.max() <= np.pi + 1e-9
+        return (2 * np.pi if half else 4 * np.pi) / self.size
+
+    def _point_area(self, elevs):
+        return self.dxy
 
 
 class Cylinder_Gaussian_RF(RF):
@@ -170,6 +309,7 @@ class Cylinder_Gaussian_RF(RF):
         return self.reftheta
 
     def load_parameters(self, **kwargs):
+        self._load_dtypes(kwargs)
         self.refz = kwargs.get('refa').astype(self.dtype)
         self.reftheta = kwargs.get('refb').astype(self.dtype)
         self.acceptance_angle = kwargs.get('acceptance_angle')  # degrees
@@ -199,40 +339,101 @@ class Cylinder_Gaussian_RF(RF):
 
         self.dxy = np.diff(self.grid[0][0, :2]) * \
             np.diff(self.grid[1][:2, 0])[0] * self.radius
-        self.compute_filters()
+        if kwargs.get('compute_filters', True):
+            self.compute_filters()
 
         self.parameter_set = True
 
     def _generate_filter(self, i):
+        return self._weight(self.refz[i], self.reftheta[i],
+                            self.grid0, self.grid1)
+
+    def _weight(self, refz, reftheta, zs, thetas):
+        """ weight of screen points (zs, thetas) in the filter
+            centered at (refz, reftheta), arguments are broadcast
+        """
         radius = self.radius
 
-        #
-        reftheta = self.reftheta[i]
-        refz = self.refz[i]
+        # inner product of the unit vectors from the center of the
+        # cylinder to the reference and to the screen points
+        inv_ref_len = 1 / np.sqrt(radius * radius + refz * refz)
+        inv_len = 1 / np.sqrt(radius * radius + zs * zs)
+        inp = (radius * radius * np.cos(thetas - reftheta) + zs * refz) \
+            * inv_len * inv_ref_len
 
-        refx = math.sin(reftheta) * radius
-        refy = math.cos(reftheta) * radius
+        return self.kappa * self.ONE_OVER_TWO_PI / (1 - np.exp(-2 * self.kappa)) * \
+            np.exp(self.kappa * (inp - 1)) * radius * (inv_len * inv_len * inv_len) * \
+            self.dxy
 
-        inv_ref_len = 1 / math.sqrt(radius * radius + refz * refz)
-        refx *= inv_ref_len
-        refy *= inv_ref_len
-        refz *= inv_ref_len
 
-        #
-        thetas = self.grid[1].reshape(-1)
-        zs = self.grid[0].reshape(-1)
+class Stacked_RF(RF):
+    """
+    Filters of several RF objects on the same screen, e.g. of the left
+    and the right eye, stacked into one filter matrix so that a frame is
+    filtered for all of them with a single product.
 
-        xs = np.sin(thetas) * radius
-        ys = np.cos(thetas) * radius
+    The filters of rfs[i] are the columns offsets[i]:offsets[i + 1] of
+    the stacked matrix, the filters of each RF object are replaced by a
+    view of those columns.
+    """
+    def __init__(self, grid):
+        super(Stacked_RF, self).__init__(grid)
 
-        inv_len = 1 / math.sqrt(radius * radius + zs * zs)
-        xs *= inv_len
-        ys *= inv_len
-        zs *= inv_len
+    @property
+    def refa(self):
+        return np.concatenate([rfs.refa for rfs in self.rfs])
 
-        #
-        inp = xs * refx + ys * refy + zs * refz
+    @property
+    def refb(self):
+        return np.concatenate([rfs.refb for rfs in self.rfs])
 
-        return self.kappa * self.ONE_OVER_TWO_PI / (1 - np.exp(-2 * self.kappa)) * \
-            np.exp(self.kappa * (inp - 1)) * radius * (inv_len * inv_len * inv_len) * \
-            self.dxy
+    def load_parameters(self, **kwargs):
+        self.rfs = list(kwargs.get('rfs'))
+        for rfs in self.rfs:
+            assert rfs.size == self.size
+        self.dtype = self.rfs[0].dtype
+        self.filter_dtype = self.rfs[0].filter_dtype
+
+        self.offsets = np.cumsum([0] + [rfs.num_neurons for rfs in self.rfs])
+        self.num_neurons = int(self.offsets[-1])
+        if kwargs.get('compute_filters', True):
+            self.compute_filters()
+
+        self.parameter_set = True
+
+    def compute_filters(self):
+        for rfs in self.rfs:
+            if not hasattr(rfs, 'filters'):
+                rfs.compute_filters()
+        self.filters = np.concatenate([rfs.filters for rfs in self.rfs],
+                                      axis = 1)
+        for rfs, start, stop in zip(self.rfs, self.offsets[:-1],
+                                    self.offsets[1:]):
+            rfs.filters = self.filters[:, start:stop]
+
+    def release_filters(self):
+        super(Stacked_RF, self).release_filters()
+        for rfs in self.rfs:
+            rfs.release_filters()
+
+    def _generate_filter(self, i):
+        return self.filters[:, i]
+
+    def filter(self, video_input):
+        """
+        Performs RF filtering on input video with one product
+        for all the frames and rfs
+
+        Returns
+        -------
+        output: array of shape (num_frames, num_neurons)
+        """
+        video = np.asarray(video_input, self.dtype).reshape((-1, self.size))
+        if self.filters.dtype == np.float16:
+            return self._dot_half(video)
+        return np.dot(video, self.filters)
+
+    def split(self, outputs):
+        """ views of the columns of outputs of each RF object """
+        return [outputs[..., start:stop]
+                for start, stop in zip(self.offsets[:-1], self.offsets[1:])]
@@ -9,12 +9,14 @@ from neurokernel.LPU.utils.simpleio import *
 
 from neurokernel.LPU.NDComponents.MembraneModels.BaseMembraneModel import BaseMembraneModel
 
+from .recording import AsyncRecorder
+
 class PhotoreceptorModel(BaseMembraneModel):
     accesses = ['photon', 'I']
     updates = ['V']
 
     def __init__(self, params_dict, access_buffers, dt, LPU_id=None,
-                 debug=False, cuda_verbose = False):
+                 debug=False, cuda_verbose = False, record_decimation = 1):
         self.num_microvilli = params_dict['num_microvilli'].get().astype(np.int32)
         self.num_neurons = self.num_microvilli.size
 
@@ -24,6 +26,8 @@ class PhotoreceptorModel(BaseMembraneModel):
         # assert(self.multiple * self.run_dt == self.dt)
 
         self.record_neuron = debug
+        # one step out of every record_decimation steps is recorded
+        self.record_decimation = record_decimation
         self.debug = debug
         self.LPU_id = LPU_id
         self.dtype = np.double
@@ -80,10 +84,51 @@ class PhotoreceptorModel(BaseMembraneModel):
     def _setup_output(self):
         outputfile = self.LPU_id + '_out'
         if self.record_neuron:
-            self.outputfile_I = h5py.File(outputfile+'I.h5', 'w')
-            self.outputfile_I.create_dataset(
-                '/array', (0, self.num_neurons), dtype = self.dtype,
-                maxshape = (None, self.num_neurons))
+            # photon inputs, currents and voltages are written
+            # in chunks by a background thread
+            self.recorder = AsyncRecorder(
+                outputfile + 'I.h5',
+                {'photon': self.num_neurons, 'I': self.num_neurons,
+                 'V': self.num_neurons},
+                dtype = self.dtype, dt = self.dt,
+                decimation = self.record_decimation)
+            # a recorded step is copied asynchronously into page-locked
+            # buffers and handed to the recorder at the next step
+            self.record_host = {
+                name: cuda.pagelocked_empty(self.num_neurons, self.dtype)
+                for name in self.recorder.variables}
+            self.record_stream = cuda.Stream()
+            self.record_event = cuda.Event()
+            self.record_pending = False
+
+    def post_run(self):
+        if self.record_neuron:
+            self._flush_record()
+            self.recorder.close()
+
+    def _record_step(self, V, st):
+        """ starts the copies of the variables of this step """
+        self._flush_record()
+        if not self.recorder.records_next:
+            self.recorder.record()
+            return
+        # the copies follow the kernels of the step in their stream
+        stream = self.record_stream if st is None else st
+        cuda.memcpy_dtoh_async(self.record_host['photon'],
+                               self.photons.gpudata, stream)
+        cuda.memcpy_dtoh_async(self.record_host['I'], self.I.gpudata, stream)
+        cuda.memcpy_dtoh_async(self.record_host['V'], V, stream)
+        self.record_event.record(stream)
+        self.record_pending = True
+
+    def _flush_record(self):
+        """ hands the copied variables of the previous step
+            to the recorder
+        """
+        if self.record_pending:
+            self.record_event.synchronize()
+            self.recorder.record(**self.record_host)
+            self.record_pending = False
 
     def _setup_transduction(self, seed = 0):
         self.photons = garray.zeros(self.num_neurons, self.dtype)
@@ -225,6 +270,9 @@ class PhotoreceptorModel(BaseMembraneModel):
                 ( (self.num_neurons - 1) // 128 + 1, 1), (128, 1, 1), st,
                 self.ns.gpudata, self.num_neurons, update_pointers['V'], self.internal_dt)
 
+        if self.record_neuron:
+            self._record_step(update_pointers['V'], st)
+
 
 
 def get_update_ns_func(dtype, compile_options):
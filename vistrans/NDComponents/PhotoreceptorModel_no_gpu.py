@@ -0,0 +1,679 @@
+import time
+
+import numpy as np
+
+
+# Reactions of the transduction cascade in the order they are tested
+# when a reaction is picked (same order as the GPU kernel).
+# Codes follow the numbering used in PhotoreceptorModel:
+# 13: photon absorption, 11/12: calcium uptake/release by calmodulin,
+# 10: TRP/TRPL closing, 8: Dstar degradation, 7: PLCstar deactivation,
+# 1: Mstar deactivation, 6: Dstar production, 4: Gstar deactivation by PLC,
+# 3: PLC activation, 5: G-protein reformation, 2: G-protein activation,
+# 9: TRP/TRPL opening.
+REACTION_ORDER = np.asarray([13, 11, 12, 10, 8, 7, 1, 6, 4, 3, 5, 2, 9],
+                            np.int32)
+
+# state variables are indexed as
+# 0: Mstar, 1: G, 2: Gstar, 3: PLCstar, 4: Dstar, 5: Cstar, 6: Tstar
+CHANGE_IND1 = np.asarray([1, 1, 2, 3, 3, 2, 5, 4, 5, 5, 7, 6, 6, 1],
+                         np.int32) - 1
+CHANGE_IND2 = np.asarray([1, 1, 3, 4, 1, 1, 1, 1, 1, 7, 1, 1, 1, 1],
+                         np.int32) - 1
+CHANGE1 = np.asarray([0, -1, -1, -1, -1, 1, 1, -1, -1, -2, -1, 1, -1, 1],
+                     np.int32)
+CHANGE2 = np.asarray([0, 0, 1, 1, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0],
+                     np.int32)
+
+LA = 0.5
+
+# as in the kernel, a reaction is picked once the remaining threshold
+# falls to REACTION_CUTOFF, and a threshold below it picks no reaction
+REACTION_CUTOFF = 2e-5
+# reaction of each count of cumulative rates below the threshold,
+# a threshold past the total rate picks no reaction (0)
+_SELECTED_REACTION = np.append(REACTION_ORDER, np.int32(0))
+
+
+class PhotoreceptorModel(object):
+    """
+    CPU implementation of vistrans.NDComponents.PhotoreceptorModel.
+
+    The transduction cascade of every microvillus is simulated with the
+    same stochastic algorithm as the GPU kernel, vectorized over the
+    microvilli that still have reactions pending in the current step.
+    The model is not tied to neurokernel, inputs are given directly
+    to `run_step`.
+
+    Parameters
+    ----------
+    num_microvilli: array of ints
+        number of microvilli of each photoreceptor.
+    dt: float
+        time step of the simulation in seconds.
+    seed: int
+        seed of the random number generator.
+    initV: float or array
+        initial membrane voltage in mV.
+    debug: bool
+        check inputs at each step.
+    chunk_size: int
+        number of microvilli processed at once, limits the memory used
+        for temporary arrays.
+    gating_resolution: float or None
+        if given, the gating functions of the membrane are evaluated from
+        a GatingTable with this voltage resolution (mV),
+        otherwise they are computed exactly.
+    gating_interpolation: str
+        interpolation of the GatingTable, 'linear' or 'nearest'.
+    adaptive: bool
+        if True, dt is subdivided into internal steps of variable length
+        chosen by an AdaptiveStepController instead of fixed steps of
+        maximum_dt_allowed.
+    recorder: AsyncRecorder or None
+        if given, the photon inputs, currents and voltages are recorded
+        after every step, with the variable names 'photon', 'I', 'V'.
+    adaptive_kwargs:
+        arguments of AdaptiveStepController.
+    """
+    def __init__(self, num_microvilli, dt, seed = 0, initV = -82.,
+                 debug = False, chunk_size = 1 << 18,
+                 gating_resolution = None, gating_interpolation = 'linear',
+                 adaptive = False, recorder = None, **adaptive_kwargs):
+        self.num_microvilli = np.asarray(num_microvilli,
+                                         np.int32).reshape(-1)
+        self.num_neurons = self.num_microvilli.size
+
+        self.dt = dt
+        self.debug = debug
+        self.dtype = np.double
+        self.chunk_size = int(chunk_size)
+        self.randState = np.random.default_rng(seed)
+        if gating_resolution is None:
+            self.gating_table = None
+        else:
+            self.gating_table = GatingTable(
+                gating_resolution, interpolation = gating_interpolation)
+
+        self.V = np.empty(self.num_neurons, self.dtype)
+        self.V[:] = initV
+
+        if adaptive:
+            self.step_controller = AdaptiveStepController(
+                self.maximum_dt_allowed, **adaptive_kwargs)
+        else:
+            self.step_controller = None
+        self.internal_step_count = 0
+        self.recorder = recorder
+
+        self._setup_transduction()
+        self._setup_hh()
+
+    @property
+    def maximum_dt_allowed(self):
+        return 1e-4
+
+    @property
+    def internal_steps(self):
+        if self.dt > self.maximum_dt_allowed:
+            div = self.dt/self.maximum_dt_allowed
+            if np.abs(div - np.round(div)) < 1e-5:
+                return int(np.round(div))
+            else:
+                return int(np.ceil(div))
+        else:
+            return 1
+
+    @property
+    def internal_dt(self):
+        return self.dt/self.internal_steps
+
+    def _setup_transduction(self):
+        self.photons = np.zeros(self.num_neurons, self.dtype)
+
+        # using microvilli as single unit in the transduction,
+        # therefore, we need to figure out which neuron each microvillus
+        # belongs to, and from where to where we should sum up the current.
+        self.cum_microvilli = np.hstack((0, np.cumsum(self.num_microvilli)))
+        self.total_microvilli = int(self.cum_microvilli[-1])
+        self._has_microvilli = self.num_microvilli > 0
+        self._segment_start = self.cum_microvilli[:-1][self._has_microvilli]
+
+        # state is packed as in the GPU model
+        self.X = []
+        tmp = np.zeros((self.total_microvilli, 2), np.uint16)
+        tmp[:, 0] = 50
+        # variables G, Gstar
+        self.X.append(tmp)
+        # variables PLCstar, Dstar
+        self.X.append(np.zeros((self.total_microvilli, 2), np.uint16))
+        # variables Cstar, Tstar
+        self.X.append(np.zeros((self.total_microvilli, 2), np.uint16))
+        # variables Mstar
+        self.X.append(np.zeros(self.total_microvilli, np.uint16))
+
+        self.ns = np.ones(self.num_neurons, self.dtype)
+
+    def _setup_hh(self):
+        self.I = np.zeros(self.num_neurons, self.dtype)
+        self.I_fb = np.zeros(self.num_neurons, self.dtype)
+
+        # variables sa, si, dra, dri, nov
+        self.hhx = np.empty((5, self.num_neurons), self.dtype)
+        self.hhx[0].fill(0.2184)
+        self.hhx[1].fill(0.9653)
+        self.hhx[2].fill(0.0117)
+        self.hhx[3].fill(0.9998)
+        self.hhx[4].fill(0.0017)
+
+    def run_step(self, photons, I_fb = None):
+        """
+        Advance the model by dt.
+
+        Parameters
+        ----------
+        photons: array
+            number of photons/s received by each photoreceptor.
+        I_fb: array or None
+            feedback current to each photoreceptor.
+
+        Returns
+        -------
+        V: array
+            membrane voltage in mV after the step, this is the internal
+            buffer of the model and is overwritten by the next step.
+        """
+        if self.step_controller is not None:
+            self.step_controller.input_changed(self.photons, photons)
+        self.photons[:] = photons
+        if I_fb is None:
+            self.I_fb.fill(0)
+        else:
+            self.I_fb[:] = I_fb
+
+        if self.debug:
+            minimum = self.photons.min()
+            if (minimum < 0):
+                raise ValueError('Inputs to photoreceptor should not '
+                                 'be negative, minimum value detected: {}'
+                                 .format(minimum))
+
+        if self.step_controller is None:
+            for _ in range(self.internal_steps):
+                self.internal_step(self.internal_dt, 10)
+        else:
+            t = 0.
+            while t < self.dt:
+                h = self.step_controller.next_step(self.dt - t)
+                V_prev = self.V.copy()
+                self.internal_step(h, int(np.ceil(
+                    h/self.maximum_dt_allowed*10 - 1e-6)))
+                self.step_controller.update(
+                    np.abs(self.V - V_prev).max(),
+                    self.reaction_count/max(self.total_microvilli, 1))
+                t += h
+
+        if self.recorder is not None:
+            self.recorder.record(photon = self.photons, I = self.I,
+                                 V = self.V)
+        return self.V
+
+    def internal_step(self, dt, multiple):
+        """
+        Advance the model by one internal step dt,
+        the membrane is integrated with `multiple` sub-steps.
+        """
+        self.internal_step_count += 1
+        # X, V, ns, photons -> X
+        self.transduction(dt)
+        # X, V, I_fb -> I
+        self.sum_current()
+        # hhX, I -> hhX, V
+        self.hh(dt/multiple, multiple)
+        self.update_ns(dt)
+
+    def transduction(self, dt):
+        self.reaction_count = 0
+        for start in range(0, self.total_microvilli, self.chunk_size):
+            self._transduction_chunk(
+                start, min(start + self.chunk_size, self.total_microvilli), dt)
+
+    def _load_state(self, start, stop):
+        """
+        Unpack the state of microvilli start to stop into an array of
+        shape (7, stop-start), rows are
+        Mstar, G, Gstar, PLCstar, Dstar, Cstar, Tstar.
+        """
+        X = np.empty((7, stop - start), np.int32)
+        X[0] = self.X[3][start:stop]
+        X[1:3] = self.X[0][start:stop].T
+        X[3:5] = self.X[1][start:stop].T
+        X[5:7] = self.X[2][start:stop].T
+        return X
+
+    def _store_state(self, start, stop, X):
+        self.X[3][start:stop] = X[0]
+        self.X[0][start:stop] = X[1:3].T
+        self.X[1][start:stop] = X[3:5].T
+        self.X[2][start:stop] = X[5:7].T
+
+    def _transduction_chunk(self, start, stop, dt):
+        rng = self.randState
+        X = self._load_state(start, stop)
+        # photoreceptor index of each microvillus
+        ind = np.searchsorted(self.cum_microvilli,
+                              np.arange(start, stop), side = 'right') - 1
+        mid = np.arange(stop - start)
+
+        rates = self._compute_rates(X, ind)
+        sumrate = rates.sum(axis = 0)
+        dt_advanced = -np.log(rng.random(mid.size))/(LA + sumrate)
+
+        # If the reaction time is smaller than dt,
+        # pick the reaction and update,
+        # then compute the total rate and next reaction time again
+        # until all dt_advanced is larger than dt.
+        # The exponential distribution is memoryless so the last
+        # reaction time that exceeds dt is not carried over.
+        pending = dt_advanced <= dt
+        mid = mid[pending]
+        rates = rates[:, pending]
+        sumrate = sumrate[pending]
+        dt_advanced = dt_advanced[pending]
+
+        while mid.size:
+            self.reaction_count += mid.size
+            threshold = rng.random(mid.size) * sumrate
+            selected = (np.cumsum(rates, axis = 0) <
+                        threshold - REACTION_CUTOFF).sum(axis = 0)
+            # reaction 0 leaves the state unchanged
+            reaction_ind = np.where(threshold > REACTION_CUTOFF,
+                                    _SELECTED_REACTION[selected], 0)
+
+            # only up to two state variables are needed to be updated
+            X[CHANGE_IND1[reaction_ind], mid] += CHANGE1[reaction_ind]
+            X[CHANGE_IND2[reaction_ind], mid] += CHANGE2[reaction_ind]
+
+            rates = self._compute_rates(X[:, mid], ind[mid])
+            sumrate = rates.sum(axis = 0)
+            dt_advanced -= np.log(rng.random(mid.size))/(LA + sumrate)
+
+            pending = dt_advanced <= dt
+            mid = mid[pending]
+            rates = rates[:, pending]
+            sumrate = sumrate[pending]
+            dt_advanced = dt_advanced[pending]
+
+        self._store_state(start, stop, X)
+
+    def _compute_rates(self, X, ind):
+        """
+        Rates of all reactions of microvilli with unpacked state X
+        belonging to photoreceptors ind,
+        rows are ordered as in REACTION_ORDER.
+        """
+        M, G, Gstar, PLCstar, Dstar, Cstar, Tstar = X.astype(self.dtype)
+
+        Vm = self.V[ind]*1e-3
+        lam = self.photons[ind]/self.num_microvilli[ind]
+
+        Ca = compute_ca(Tstar, Cstar*5.5353e-4, Vm)
+        fn = compute_fn(Cstar*5.5353e-4, self.ns[ind])
+        fp = compute_fp(Ca)
+
+        rates = np.empty((13, ind.size), self.dtype)
+        rates[0] = lam  # 13
+        rates[1] = 54198*Ca*(0.5 - Cstar*5.5353e-4)  # 11
+        rates[2] = 5.5*Cstar  # 12
+        rates[3] = 25*(1 + 10*fn)*Tstar  # 10
+        rates[4] = 4*(1 + 37.8*fn)*Dstar  # 8
+        rates[5] = 144*(1 + 11.1*fn)*PLCstar  # 7
+        rates[6] = 3.7*(1 + 40*fn)*M  # 1
+        rates[7] = 1300*PLCstar  # 6
+        rates[8] = 3.0*Gstar*PLCstar  # 4
+        rates[9] = 15.6*Gstar*(100 - PLCstar)  # 3
+        rates[10] = 3.5*(50 - Gstar - G - PLCstar)  # 5
+        rates[11] = 7.05*G*M  # 2
+        rates[12] = 0.015*(1 + 11.5*fp)*Dstar*(Dstar - 1) \
+            *(25 - Tstar)*0.5  # 9
+        return rates
+
+    def sum_current(self):
+        # segmented reduction of Tstar over the microvilli of each neuron
+        total_open_channel = np.zeros(self.num_neurons, np.uint32)
+        if self._segment_start.size:
+            total_open_channel[self._has_microvilli] = np.add.reduceat(
+                self.X[2][:, 1], self._segment_start, dtype = np.uint32)
+        # TRP reversal potential is 0 mV
+        Vm = self.V*0.001
+        I_in = total_open_channel*8*np.maximum(-Vm, 0)
+        # convert pA into \muA/cm^2
+        np.add(self.I_fb, I_in/15.7, out = self.I)
+
+    def hh(self, ddt, multiple):
+        I = self.I
+        V = self.V
+        hhx = self.hhx
+        dt = 1000*ddt
+
+        if self.gating_table is None:
+            gating = gating_functions
+        else:
+            gating = self.gating_table
+
+        for _ in range(multiple):
+            x_inf, inv_tau = gating(V)
+            dx = x_inf - hhx
+            dx *= inv_tau
+            dx *= dt
+            hhx += dx
+            V += dt*compute_dV(I, V, *hhx)
+
+    def update_ns(self, dt):
+        V = self.V
+        n_inf = np.where(V >= -53, 8.5652*(V + 53) + 5,
+                         np.maximum(1.0, 0.2354*(V + 70) + 1))
+        self.ns += (n_inf - self.ns)*dt
+
+
+def compute_ca(Tstar, Cstar_cc, Vm):
+    """ calcium concentration, Vm in V """
+    I_in = Tstar*8*np.maximum(-Vm, 0)
+    denom = 1060 - 120*Cstar_cc + 179.0952*np.exp(-39.60793*Vm)
+    numer = I_in*690.9537 + 0.0795979 + 22*Cstar_cc
+    return np.maximum(1.6e-4, numer/denom)
+
+
+def compute_fp(Ca_cc):
+    """ Hill constant (=2) for positive calcium feedback """
+    tmp = Ca_cc*3.3333333333
+    tmp *= tmp
+    return tmp/(1 + tmp)
+
+
+def compute_fn(Cstar_cc, ns):
+    """ Hill constant (=3) for negative calmodulin feedback """
+    tmp = Cstar_cc*5.55555555
+    tmp = tmp*tmp*tmp
+    return ns*tmp/(1 + tmp)
+
+
+class AdaptiveStepController(object):
+    """
+    Chooses the length of internal steps of PhotoreceptorModel.
+
+    Steps are lengthened when the voltage change and the number of
+    reactions per microvillus in the last step are below their tolerances,
+    shortened when they exceed them, and reset to the minimum step
+    after the input intensity changes.
+
+    Parameters
+    ----------
+    default_dt: float
+        step used in the fixed step mode, used as initial step.
+    min_dt, max_dt: float
+        range of the internal steps.
+    dV_tol: float
+        tolerance of the maximum voltage change (mV) in a step.
+    reaction_tol: float
+        tolerance of the average number of reactions per microvillus
+        in a step.
+    input_tol: float
+        relative change of photon input that resets the step to min_dt.
+    """
+    def __init__(self, default_dt, min_dt = None, max_dt = None,
+                 dV_tol = 0.2, reaction_tol = 2.0, input_tol = 0.01):
+        self.min_dt = default_dt/4 if min_dt is None else min_dt
+        self.max_dt = default_dt*20 if max_dt is None else max_dt
+        self.dV_tol = dV_tol
+        self.reaction_tol = reaction_tol
+        self.input_tol = input_tol
+        self.h = default_dt
+
+    def input_changed(self, old, new):
+        if np.any(np.abs(np.asarray(new) - old) > self.input_tol*old + 1e-9):
+            self.h = self.min_dt
+
+    def next_step(self, remaining):
+        """ length of the next step, given the time left in dt """
+        h = min(self.h, remaining)
+        # avoid leaving a tiny step at the end of dt
+        if remaining - h < self.min_dt/2:
+            h = remaining
+        return h
+
+    def update(self, dV, reactions):
+        ratio = max(dV/self.dV_tol, reactions/self.reaction_tol)
+        if ratio > 0:
+            factor = min(2., max(0.25, 0.9/ratio))
+        else:
+            factor = 2.
+        self.h = min(self.max_dt, max(self.min_dt, self.h*factor))
+
+
+def gating_functions(V):
+    """
+    Steady states and inverse time constants (1/ms) of the gating variables
+    sa, si, dra, dri, nov at membrane voltage V (mV).
+
+    Returns
+    -------
+    x_inf: array of shape (5,) + V.shape
+    inv_tau: array of shape (5,) + V.shape
+    """
+    V = np.asarray(V, np.double)
+    x_inf = np.empty((5,) + V.shape)
+    tau = np.empty((5,) + V.shape)
+    # The precision of power constant affects the result
+    x_inf[0] = np.cbrt(1/(1 + np.exp((-23.7 - V)/12.8)))
+    tau[0] = 0.13 + 3.39*np.exp(-(-73 - V)*(-73 - V)/400)
+
+    x_inf[1] = 0.9/(1 + np.exp((-55 - V)/-3.9)) \
+        + 0.1/(1 + np.exp((-74.8 - V)/-10.7))
+    tau[1] = 113*np.exp(-(-71 - V)*(-71 - V)/841)
+
+    x_inf[2] = np.sqrt(1/(1 + np.exp((-1 - V)/9.1)))
+    tau[2] = 0.5 + 5.75*np.exp(-(-25 - V)*(-25 - V)/1024)
+
+    x_inf[3] = 1/(1 + np.exp((-25.7 - V)/-6.4))
+    tau[3] = 890
+
+    x_inf[4] = 1/(1 + np.exp((-12 - V)/11))
+    tau[4] = 3 + 166*np.exp(-(-20 - V)*(-20 - V)/484)
+    return x_inf, 1/tau
+
+
+class GatingTable(object):
+    """
+    Gating functions of the membrane tabulated on a uniform voltage grid
+    and evaluated by linear interpolation.
+
+    Voltages outside of [vmin, vmax] are clamped to the range.
+
+    Parameters
+    ----------
+    resolution: float
+        spacing of the voltage grid in mV.
+    vmin, vmax: float
+        range of the voltage grid in mV.
+    interpolation: str
+        'linear' or 'nearest', nearest is about twice as fast but
+        needs a finer grid for the same error.
+
+    Attributes
+    ----------
+    error: float
+        maximum absolute interpolation error of the steady states and
+        maximum relative error of the inverse time constants,
+        measured between the nodes of the table.
+    """
+    def __init__(self, resolution = 0.01, vmin = -120., vmax = 60.,
+                 interpolation = 'linear'):
+        if interpolation not in ['linear', 'nearest']:
+            raise ValueError('Invalid interpolation {}, expected '
+                             '"linear" or "nearest"'.format(interpolation))
+        self.interpolation = interpolation
+        self.resolution = float(resolution)
+        self.vmin = float(vmin)
+        num = int(np.ceil((vmax - vmin)/self.resolution)) + 1
+        self.vmax = self.vmin + (num - 1)*self.resolution
+
+        x_inf, inv_tau = gating_functions(
+            self.vmin + self.resolution*np.arange(num))
+        # rows 0-4 are x_inf, 5-9 inv_tau, extra column avoids
+        # special casing V == vmax.
+        self.table = np.empty((10, num + 1))
+        self.table[:5, :num] = x_inf
+        self.table[5:, :num] = inv_tau
+        self.table[:, num] = self.table[:, num - 1]
+        self.slope = np.diff(self.table, axis = 1)
+        self._values = None
+        self._measure_error()
+
+    def __call__(self, V):
+        """
+        Returns x_inf and inv_tau as gating_functions, the arrays are
+        internal buffers that are overwritten by the next call.
+        """
+        pos = np.clip(V, self.vmin, self.vmax)
+        pos -= self.vmin
+        pos /= self.resolution
+        if self.interpolation == 'nearest':
+            pos += 0.5
+        ind = pos.astype(np.intp)
+
+        shape = (10,) + ind.shape
+        if self._values is None or self._values.shape != shape:
+            self._values = np.empty(shape)
+            self._slope_values = np.empty(shape)
+        values = self._values
+        # take with preallocated output is much faster than fancy indexing
+        self.table.take(ind, axis = 1, out = values, mode = 'clip')
+        if self.interpolation == 'linear':
+            pos -= ind
+            self.slope.take(ind, axis = 1, out = self._slope_values,
+                            mode = 'clip')
+            self._slope_values *= pos
+            values += self._slope_values
+        return values[:5], values[5:]
+
+    def _measure_error(self):
+        # the largest error is within a cell for linear interpolation
+        # and at the edge of a cell for nearest neighbor
+        if self.interpolation == 'linear':
+            offsets = np.arange(1, 16)/16.
+        else:
+            offsets = np.asarray([0.499, 0.501])
+        nodes = self.vmin + self.resolution*np.arange(self.table.shape[1] - 2)
+
+        self.error_x_inf = np.zeros(5)
+        self.error_inv_tau = np.zeros(5)
+        for start in range(0, nodes.size, 65536):
+            V = (nodes[start:start + 65536, None]
+                 + self.resolution*offsets).reshape(-1)
+            x_inf, inv_tau = gating_functions(V)
+            x_inf_table, inv_tau_table = self(V)
+            self.error_x_inf = np.maximum(
+                self.error_x_inf, np.abs(x_inf_table - x_inf).max(axis = 1))
+            self.error_inv_tau = np.maximum(
+                self.error_inv_tau,
+                (np.abs(inv_tau_table - inv_tau)/inv_tau).max(axis = 1))
+        self.error = max(self.error_x_inf.max(), self.error_inv_tau.max())
+        self._values = None
+
+
+def compute_dV(I, V, sa, si, dra, dri, nov):
+    """ derivative of the membrane voltage (mV/ms) """
+    E_K = -85
+    E_Cl = -30
+    G_s = 1.6
+    G_dr = 3.5
+    G_Cl = 0.006
+    G_K = 0.082
+    G_nov = 3.0
+    C = 4
+    return (I - G_K*(V - E_K) - G_Cl*(V - E_Cl)
+            - G_s*sa*sa*sa*si*(V - E_K)
+            - G_dr*dra*dra*dri*(V - E_K)
+            - G_nov*nov*(V - E_K))/C
+
+
+def benchmark_gating():
+    num_neurons = 100000
+    steps = 20
+
+    V = np.linspace(-85, -20, num_neurons)
+    configs = [(None, None), (0.1, 'linear'), (0.01, 'linear'),
+               (0.001, 'nearest'), (0.0001, 'nearest')]
+    for resolution, interpolation in configs:
+        model = PhotoreceptorModel(np.zeros(num_neurons, np.int32), 1e-4,
+                                   initV = V, gating_resolution = resolution,
+                                   gating_interpolation = interpolation)
+        model.I.fill(10)
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.hh(model.internal_dt/10, 10)
+        elapsed = (time.perf_counter() - start)/steps
+        if resolution is None:
+            print('exact gating: {:.5f} s/step'.format(elapsed))
+        else:
+            print('{} table, resolution {} mV: {:.5f} s/step, '
+                  'error bound {:.2e}'.format(
+                      interpolation, resolution, elapsed,
+                      model.gating_table.error))
+
+
+def benchmark_adaptive(image_file = None):
+    """
+    Compare fixed and adaptive internal steps with photon inputs taken
+    from a few pixels of FlickerStep and Natural stimuli.
+    """
+    from ..config import InputFlickerStepConfigure, InputNaturalConfigure
+    from ..screen.input.image2d import FlickerStep, Natural
+
+    dt = 1e-3
+    steps = 500
+    num_neurons = 8
+    num_microvilli = np.full(num_neurons, 3000, np.int32)
+    pixels = np.random.default_rng(0).integers(0, 64, (num_neurons, 2))
+
+    stimuli = {'FlickerStep': FlickerStep(
+        InputFlickerStepConfigure(shape = (128, 128), frequency = 2.0), dt)}
+    if image_file is None:
+        print('Natural stimulus skipped, no image file given')
+    else:
+        stimuli['Natural'] = Natural(
+            InputNaturalConfigure(image_file = image_file), dt)
+
+    for name, stimulus in stimuli.items():
+        images = stimulus.generate_2dimage(steps)
+        photons = images[:, pixels[:, 0], pixels[:, 1]]
+        V = {}
+        # a second fixed step run with another seed gives the difference
+        # that is due to the stochasticity of the model alone
+        for mode, adaptive, seed in [('fixed', False, 0),
+                                     ('fixed, seed 1', False, 1),
+                                     ('adaptive', True, 0)]:
+            model = PhotoreceptorModel(num_microvilli, dt, seed = seed,
+                                       adaptive = adaptive)
+            V[mode] = np.empty(photons.shape)
+            start = time.perf_counter()
+            for i in range(steps):
+                V[mode][i] = model.run_step(photons[i])
+            elapsed = time.perf_counter() - start
+            print('{} {}: {:.2f} s, {} internal steps'.format(
+                name, mode, elapsed, model.internal_step_count))
+        for mode in ['fixed, seed 1', 'adaptive']:
+            print('{}: mean |V({}) - V(fixed)| = {:.3f} mV'.format(
+                name, mode, np.abs(V[mode] - V['fixed']).mean()))
+
+
+def main():
+    import sys
+
+    benchmark_gating()
+    benchmark_adaptive(sys.argv[1] if len(sys.argv) > 1 else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import numpy as np
+
+from .PhotoreceptorModel_no_gpu import PhotoreceptorModel
+from .parallel import ShardedPhotoreceptorRunner
+
+
+class CalibrationTable(object):
+    """
+    Steady-state and adaptation properties of photoreceptors as a function
+    of light intensity and number of microvilli.
+
+    Parameters
+    ----------
+    intensities: array of shape (I,)
+        photon rates (photons/s) in ascending order.
+    num_microvilli: array of shape (M,)
+        numbers of microvilli in ascending order.
+    mean_V: array of shape (M, I)
+        steady-state membrane voltage (mV).
+    var_V: array of shape (M, I)
+        steady-state variance of the membrane voltage (mV^2).
+    tau: array of shape (M, I)
+        time constant (s) of the approach to steady state after a step
+        from darkness to the intensity.
+    peak_V: array of shape (M, I)
+        extremum of the voltage after the step (mV).
+    """
+    fields = ['intensities', 'num_microvilli', 'mean_V', 'var_V', 'tau',
+              'peak_V']
+
+    def __init__(self, intensities, num_microvilli, mean_V, var_V, tau,
+                 peak_V):
+        self.intensities = np.asarray(intensities, np.double)
+        self.num_microvilli = np.asarray(num_microvilli, np.double)
+        self.mean_V = np.asarray(mean_V, np.double)
+        self.var_V = np.asarray(var_V, np.double)
+        self.tau = np.asarray(tau, np.double)
+        self.peak_V = np.asarray(peak_V, np.double)
+
+        shape = (self.num_microvilli.size, self.intensities.size)
+        for name in ['mean_V', 'var_V', 'tau', 'peak_V']:
+            if getattr(self, name).shape != shape:
+                raise ValueError('{} should have shape {}'
+                                 .format(name, shape))
+
+    def save(self, filename):
+        np.savez(filename, **{name: getattr(self, name)
+                              for name in self.fields})
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(**{name: data[name] for name in cls.fields})
+
+    def lookup(self, intensity, num_microvilli):
+        """
+        Interpolate the table, linearly in log intensity and in the number
+        of microvilli. Values outside of the table are clamped.
+
+        Returns
+        -------
+        mean_V, var_V, tau: arrays with the broadcast shape of the inputs
+        """
+        intensity, num_microvilli = np.broadcast_arrays(
+            np.asarray(intensity, np.double),
+            np.asarray(num_microvilli, np.double))
+        x = _interp_index(np.log10(intensity + 1),
+                          np.log10(self.intensities + 1))
+        y = _interp_index(num_microvilli, self.num_microvilli)
+        return tuple(_bilinear(getattr(self, name), y, x)
+                     for name in ['mean_V', 'var_V', 'tau'])
+
+
+def _interp_index(values, nodes):
+    """ fractional index of values in the ascending array nodes """
+    if nodes.size == 1:
+        return np.zeros(values.shape)
+    return np.interp(values, nodes, np.arange(nodes.size))
+
+
+def _bilinear(table, y, x):
+    y0 = np.minimum(y.astype(np.intp), table.shape[0] - 1)
+    x0 = np.minimum(x.astype(np.intp), table.shape[1] - 1)
+    y1 = np.minimum(y0 + 1, table.shape[0] - 1)
+    x1 = np.minimum(x0 + 1, table.shape[1] - 1)
+    fy = y - y0
+    fx = x - x0
+    return ((table[y0, x0]*(1 - fx) + table[y0, x1]*fx)*(1 - fy)
+            + (table[y1, x0]*(1 - fx) + table[y1, x1]*fx)*fy)
+
+
+def build_calibration(intensities, num_microvilli = (30000,), dt = 1e-4,
+                      duration = 0.5, dark_duration = 0.1, trials = 4,
+                      num_workers = 1, seed = 0, **model_kwargs):
+    """
+    Sweep photon rates through the CPU photoreceptor model and measure the
+    response to a step from darkness to each intensity.
+
+    Parameters
+    ----------
+    intensities: array
+        photon rates (photons/s).
+    num_microvilli: array of ints
+        numbers of microvilli to calibrate.
+    dt: float
+        time step of the simulation.
+    duration: float
+        duration of the light step in seconds, the second half is used to
+        estimate the steady state.
+    dark_duration: float
+        duration of darkness before the step.
+    trials: int
+        number of photoreceptors simulated for each entry of the table.
+    num_workers: int
+        if larger than 1, the sweep runs on a ShardedPhotoreceptorRunner.
+    model_kwargs:
+        extra arguments of the CPU PhotoreceptorModel.
+
+    Returns
+    -------
+    CalibrationTable
+    """
+    intensities = np.sort(np.asarray(intensities, np.double))
+    num_microvilli = np.sort(np.asarray(num_microvilli, np.int32))
+    dark_steps = int(round(dark_duration/dt))
+    steps = int(round(duration/dt))
+
+    shape = (num_microvilli.size, intensities.size)
+    mean_V = np.empty(shape)
+    var_V = np.empty(shape)
+    tau = np.empty(shape)
+    peak_V = np.empty(shape)
+
+    photons = np.repeat(intensities, trials)
+    for i, n in enumerate(num_microvilli):
+        microvilli = np.full(photons.size, n, np.int32)
+        if num_workers > 1:
+            model = ShardedPhotoreceptorRunner(
+                microvilli, dt, num_workers = num_workers,
+                seed = seed + i, **model_kwargs)
+        else:
+            model = PhotoreceptorModel(microvilli, dt, seed = seed + i,
+                                       **model_kwargs)
+        try:
+            dark = np.zeros(photons.size)
+            for _ in range(dark_steps):
+                model.run_step(dark)
+            V = np.empty((steps, photons.size))
+            for j in range(steps):
+                V[j] = model.run_step(photons)
+        finally:
+            if num_workers > 1:
+                model.close()
+
+        V = V.reshape(steps, intensities.size, trials)
+        steady = V[steps//2:]
+        mean_V[i] = steady.mean(axis = (0, 2))
+        var_V[i] = steady.var(axis = 0).mean(axis = 1)
+        tau[i], peak_V[i] = _step_response_time_constant(
+            V.mean(axis = 2), mean_V[i], dt)
+
+    return CalibrationTable(intensities, num_microvilli, mean_V, var_V, tau,
+                            peak_V)
+
+
+def _step_response_time_constant(V, mean_V, dt, window = 10):
+    """
+    Time for the deviation from steady state to decay by a factor of e
+    after its extremum, V has shape (steps, intensities).
+    """
+    kernel = np.ones(window)/window
+    tau = np.empty(V.shape[1])
+    peak_V = np.empty(V.shape[1])
+    for k in range(V.shape[1]):
+        trace = np.convolve(V[:, k], kernel, mode = 'valid')
+        deviation = np.abs(trace - mean_V[k])
+        # the extremum is searched before the steady-state window
+        peak = np.argmax(deviation[:trace.size//2])
+        peak_V[k] = trace[peak]
+        below = np.nonzero(deviation[peak:] < deviation[peak]/np.e)[0]
+        if below.size:
+            tau[k] = max(below[0], 1)*dt
+        else:
+            tau[k] = (trace.size - peak)*dt
+    return tau, peak_V
+
+
+class CalibratedPhotoreceptorModel(object):
+    """
+    Fast input-output approximation of the photoreceptor model using a
+    CalibrationTable instead of the transduction cascade.
+
+    The voltage relaxes towards the calibrated steady state of the current
+    intensity with the calibrated time constant, with optional noise of the
+    calibrated variance (an Ornstein-Uhlenbeck process).
+    It has the same interface as the CPU PhotoreceptorModel.
+
+    Parameters
+    ----------
+    table: CalibrationTable or str
+        table or file saved by CalibrationTable.save.
+    num_microvilli: array of ints
+        number of microvilli of each photoreceptor.
+    dt: float
+        time step of the simulation in seconds.
+    noise: bool
+        add voltage noise with the calibrated variance.
+    seed: int
+        seed of the random number generator.
+    initV: float or array
+        initial membrane voltage in mV.
+    """
+    def __init__(self, table, num_microvilli, dt, noise = True, seed = 0,
+                 initV = -82.):
+        if not isinstance(table, CalibrationTable):
+            table = CalibrationTable.load(table)
+        self.table = table
+        self.num_microvilli = np.asarray(num_microvilli,
+                                         np.int32).reshape(-1)
+        self.num_neurons = self.num_microvilli.size
+        self.dt = dt
+        self.noise = noise
+        self.dtype = np.double
+        self.randState = np.random.default_rng(seed)
+
+        self.V = np.empty(self.num_neurons, self.dtype)
+        self.V[:] = initV
+
+    def run_step(self, photons, I_fb = None):
+        mean_V, var_V, tau = self.table.lookup(photons, self.num_microvilli)
+        decay = np.exp(-self.dt/tau)
+        self.V *= decay
+        self.V += (1 - decay)*mean_V
+        if self.noise:
+            self.V += np.sqrt(var_V*(1 - decay*decay)) \
+                * self.randState.standard_normal(self.num_neurons)
+        return self.V
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description = 'Build a photoreceptor intensity-response calibration')
+    parser.add_argument('output', help = 'output .npz file')
+    parser.add_argument('--intensities', type = float, nargs = '+',
+                        default = list(np.logspace(2, 6, 9)))
+    parser.add_argument('--microvilli', type = int, nargs = '+',
+                        default = [30000])
+    parser.add_argument('--dt', type = float, default = 1e-4)
+    parser.add_argument('--duration', type = float, default = 0.5)
+    parser.add_argument('--trials', type = int, default = 4)
+    parser.add_argument('--workers', type = int, default = 1)
+    args = parser.parse_args()
+
+    table = build_calibration(args.intensities, args.microvilli,
+                              dt = args.dt, duration = args.duration,
+                              trials = args.trials,
+                              num_workers = args.workers)
+    table.save(args.output)
+    for i, n in enumerate(table.num_microvilli):
+        print('num_microvilli = {:d}'.format(int(n)))
+        print('{:>12} {:>10} {:>10} {:>10}'.format(
+            'photons/s', 'V (mV)', 'var', 'tau (ms)'))
+        for j, intensity in enumerate(table.intensities):
+            print('{:>12.4g} {:>10.2f} {:>10.3f} {:>10.2f}'.format(
+                intensity, table.mean_V[i, j], table.var_V[i, j],
+                table.tau[i, j]*1e3))
+
+
+if __name__ == "__main__":
+    main()
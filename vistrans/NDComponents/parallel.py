@@ -0,0 +1,294 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from .PhotoreceptorModel_no_gpu import PhotoreceptorModel
+
+
+def partition_neurons(num_microvilli, num_shards):
+    """
+    Split neurons into contiguous shards with a similar number of microvilli,
+    since the cost of transduction is proportional to it.
+
+    Returns
+    -------
+    bounds: array of ints
+        shard i contains neurons bounds[i] to bounds[i+1].
+    """
+    num_microvilli = np.asarray(num_microvilli).reshape(-1)
+    num_shards = max(1, min(int(num_shards), num_microvilli.size))
+    cum_microvilli = np.hstack((0, np.cumsum(num_microvilli)))
+    bounds = np.searchsorted(
+        cum_microvilli, np.linspace(0, cum_microvilli[-1], num_shards + 1))
+    bounds[0] = 0
+    bounds[-1] = num_microvilli.size
+    return np.maximum.accumulate(bounds)
+
+
+def _shard_worker(rank, start, stop, num_microvilli, dt, seed, model_kwargs,
+                  shm_names, num_neurons, barrier, errors):
+    buffers = [shared_memory.SharedMemory(name = name) for name in shm_names]
+    try:
+        photons = np.ndarray((num_neurons,), np.double, buffer = buffers[0].buf)
+        V = np.ndarray((num_neurons,), np.double, buffer = buffers[1].buf)
+        stop_flag = np.ndarray((1,), np.int32, buffer = buffers[2].buf)
+
+        model = PhotoreceptorModel(num_microvilli[start:stop], dt,
+                                   seed = seed + rank, **model_kwargs)
+        V[start:stop] = model.V
+        barrier.wait()
+
+        while True:
+            # wait for the next photon frame
+            barrier.wait()
+            if stop_flag[0]:
+                break
+            V[start:stop] = model.run_step(photons[start:stop])
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    except Exception:
+        errors.put((rank, traceback.format_exc()))
+        barrier.abort()
+    finally:
+        for shm in buffers:
+            shm.close()
+
+
+class ShardedPhotoreceptorRunner(object):
+    """
+    Runs the CPU photoreceptor model with the neurons partitioned across
+    a pool of processes.
+
+    Photon inputs of each step are written once into shared memory and
+    read by all workers, each worker writes the voltages of its own shard
+    into a shared output array.
+
+    Parameters
+    ----------
+    num_microvilli: array of ints
+        number of microvilli of each photoreceptor.
+    dt: float
+        time step of the simulation in seconds.
+    num_workers: int or None
+        number of processes, defaults to the number of CPUs.
+    seed: int
+        seed of the random number generator, worker i uses seed + i.
+        Each worker draws the random numbers of its whole shard, so the
+        voltages depend on the number of shards, and are reproducible
+        for a given seed and num_workers.
+    timeout: float or None
+        seconds a step may take before the runner gives up on the
+        workers. A worker that exits is detected within a second.
+    model_kwargs:
+        extra arguments of
+        vistrans.NDComponents.PhotoreceptorModel_no_gpu.PhotoreceptorModel.
+    """
+    def __init__(self, num_microvilli, dt, num_workers = None, seed = 0,
+                 timeout = 600., **model_kwargs):
+        self.num_microvilli = np.asarray(num_microvilli,
+                                         np.int32).reshape(-1)
+        self.num_neurons = self.num_microvilli.size
+        self.dt = dt
+        self.seed = seed
+        self.timeout = timeout
+        self.model_kwargs = model_kwargs
+
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        self.bounds = partition_neurons(self.num_microvilli, num_workers)
+        self.num_workers = self.bounds.size - 1
+
+        self._workers = []
+        self._buffers = []
+        self.started = False
+
+    @classmethod
+    def from_retina(cls, retina, dt, **kwargs):
+        """
+        retina: vistrans.retina.Retina
+        """
+        return cls(np.full(retina.num_neurons, retina.num_microvilli,
+                           np.int32), dt, **kwargs)
+
+    def start(self):
+        if self.started:
+            return
+        ctx = mp.get_context()
+        nbytes = self.num_neurons * np.dtype(np.double).itemsize
+        self._buffers = [shared_memory.SharedMemory(create = True,
+                                                    size = nbytes),
+                         shared_memory.SharedMemory(create = True,
+                                                    size = nbytes),
+                         shared_memory.SharedMemory(create = True, size = 4)]
+        self.photons = np.ndarray((self.num_neurons,), np.double,
+                                  buffer = self._buffers[0].buf)
+        self.V = np.ndarray((self.num_neurons,), np.double,
+                            buffer = self._buffers[1].buf)
+        self._stop_flag = np.ndarray((1,), np.int32,
+                                     buffer = self._buffers[2].buf)
+        self.photons.fill(0)
+        self._stop_flag[0] = 0
+
+        self._barrier = ctx.Barrier(self.num_workers + 1)
+        self._errors = ctx.Queue()
+        shm_names = [shm.name for shm in self._buffers]
+        for rank in range(self.num_workers):
+            p = ctx.Process(
+                target = _shard_worker,
+                args = (rank, self.bounds[rank], self.bounds[rank+1],
+                        self.num_microvilli, self.dt, self.seed,
+                        self.model_kwargs, shm_names, self.num_neurons,
+                        self._barrier, self._errors),
+                daemon = True)
+            p.start()
+            self._workers.append(p)
+        self.started = True
+        # a worker that exits without reaching the barrier, e.g. killed
+        # by a signal, would leave the others waiting
+        self._watch_stop = threading.Event()
+        self._watcher = threading.Thread(target = self._watch, daemon = True)
+        self._watcher.start()
+        # wait for all models to be initialized
+        self._wait()
+
+    def _watch(self):
+        while not self._watch_stop.wait(0.5):
+            if any(not p.is_alive() for p in self._workers):
+                self._barrier.abort()
+                return
+
+    def _wait(self):
+        try:
+            self._barrier.wait(timeout = self.timeout)
+        except threading.BrokenBarrierError:
+            message = self._failure()
+            self.close()
+            raise RuntimeError(message)
+
+    def _failure(self):
+        """ description of the failure of the workers """
+        try:
+            rank, tb = self._errors.get(timeout = 1)
+            return 'Photoreceptor worker {} failed:\n{}'.format(rank, tb)
+        except queue.Empty:
+            pass
+        # the other workers leave the aborted barrier with exit code 0
+        for p in self._workers:
+            p.join(timeout = 1)
+        exited = [(rank, p.exitcode) for rank, p in enumerate(self._workers)
+                  if p.exitcode]
+        if exited:
+            return ('Photoreceptor worker {} exited with code {}'
+                    .format(*exited[0]))
+        return ('Photoreceptor workers did not complete the step '
+                'within {} s'.format(self.timeout))
+
+    def run_step(self, photons):
+        """
+        Advance all photoreceptors by dt.
+
+        Parameters
+        ----------
+        photons: array
+            number of photons/s received by each photoreceptor.
+
+        Returns
+        -------
+        V: array
+            membrane voltage in mV, this is the shared output buffer
+            and is overwritten by the next step.
+        """
+        if not self.started:
+            self.start()
+        self.photons[:] = photons
+        # release workers and wait for their outputs
+        self._wait()
+        self._wait()
+        return self.V
+
+    def run(self, photons):
+        """
+        photons: array of shape (steps, num_neurons)
+
+        Returns
+        -------
+        V: array of shape (steps, num_neurons)
+        """
+        photons = np.asarray(photons)
+        V = np.empty(photons.shape, np.double)
+        for i in range(photons.shape[0]):
+            V[i] = self.run_step(photons[i])
+        return V
+
+    def close(self):
+        if not self.started:
+            return
+        self.started = False
+        self._watch_stop.set()
+        self._watcher.join()
+        self._stop_flag[0] = 1
+        try:
+            self._barrier.wait(timeout = 10)
+        except threading.BrokenBarrierError:
+            pass
+        for p in self._workers:
+            p.join(timeout = 10)
+            if p.is_alive():
+                p.terminate()
+        self._workers = []
+        del self.photons, self.V, self._stop_flag
+        for shm in self._buffers:
+            shm.close()
+            shm.unlink()
+        self._buffers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description = 'Scaling benchmark of the sharded photoreceptor model')
+    parser.add_argument('--neurons', type = int, default = 256)
+    parser.add_argument('--microvilli', type = int, default = 3000)
+    parser.add_argument('--steps', type = int, default = 100)
+    parser.add_argument('--workers', type = int, default = mp.cpu_count())
+    parser.add_argument('--intensity', type = float, default = 3e4)
+    args = parser.parse_args()
+
+    dt = 1e-4
+    num_microvilli = np.full(args.neurons, args.microvilli, np.int32)
+    photons = np.full((args.steps, args.neurons), args.intensity)
+
+    print('{:>8} {:>12} {:>10} {:>12}'.format(
+        'workers', 'time/step(s)', 'speedup', 'efficiency'))
+    base = None
+    for num_workers in range(1, args.workers + 1):
+        with ShardedPhotoreceptorRunner(num_microvilli, dt,
+                                        num_workers = num_workers) as runner:
+            # first step includes the initial transient of the cascade
+            runner.run_step(photons[0])
+            start = time.perf_counter()
+            runner.run(photons)
+            elapsed = (time.perf_counter() - start)/args.steps
+        if base is None:
+            base = elapsed
+        print('{:>8d} {:>12.5f} {:>10.2f} {:>12.2f}'.format(
+            num_workers, elapsed, base/elapsed,
+            base/elapsed/num_workers))
+
+
+if __name__ == "__main__":
+    main()
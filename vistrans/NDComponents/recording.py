@@ -0,0 +1,242 @@
+import atexit
+import queue
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from ..utils.imports import optional_import
+
+
+class AsyncRecorder(object):
+    """
+    Records variables of a model, e.g. photon inputs, currents and
+    voltages of photoreceptors, to an HDF5 file without stalling the
+    simulation.
+
+    Steps are copied into in-memory buffers of buffer_steps rows. A full
+    buffer is handed to a background thread that compresses it with zlib,
+    which releases the GIL, and writes it as one chunk of the dataset
+    with write_direct_chunk, so the datasets are chunked exactly along
+    the buffers. record only blocks when max_pending buffers are waiting
+    for the writer.
+
+    Each variable is a dataset of shape (recorded steps, size) named
+    after the variable, with the attributes decimation and dt.
+
+    Parameters
+    ----------
+    filename: str
+        HDF5 file, overwritten.
+    variables: dict
+        number of values per step of each variable.
+    dtype: numpy dtype
+        dtype of the datasets.
+    buffer_steps: int
+        number of recorded steps per buffer and per chunk.
+    decimation: int
+        one step out of every decimation steps is recorded.
+    compression: int or None
+        zlib compression level (gzip filter of HDF5),
+        None stores the chunks uncompressed.
+    max_pending: int
+        number of full buffers waiting for the writer
+        before record blocks.
+    dt: float or None
+        time step of the model, stored as an attribute.
+    """
+    def __init__(self, filename, variables, dtype = np.double,
+                 buffer_steps = 1000, decimation = 1, compression = 4,
+                 max_pending = 2, dt = None):
+        h5py = optional_import('h5py', 'AsyncRecorder')
+
+        self.filename = filename
+        self.variables = dict(variables)
+        self.dtype = np.dtype(dtype)
+        self.buffer_steps = int(buffer_steps)
+        self.decimation = int(decimation)
+        self.compression = compression
+
+        self.h5file = h5py.File(filename, 'w')
+        self.datasets = {}
+        for name, size in self.variables.items():
+            dataset = self.h5file.create_dataset(
+                name, (0, size), dtype = self.dtype,
+                maxshape = (None, size), chunks = (self.buffer_steps, size),
+                compression = None if compression is None else 'gzip',
+                compression_opts = compression)
+            dataset.attrs['decimation'] = self.decimation
+            if dt is not None:
+                dataset.attrs['dt'] = dt
+            self.datasets[name] = dataset
+
+        # buffers cycle between the recorder and the writer
+        self._free = queue.Queue()
+        for _ in range(max_pending + 1):
+            self._free.put(self._new_buffers())
+        self._pending = queue.Queue()
+        self._buffers = self._free.get()
+        self._row = 0
+        self._chunk = 0
+        self.num_steps = 0
+        self.num_recorded = 0
+        self.blocked_time = 0.
+        self._error = None
+        self.closed = False
+
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _new_buffers(self):
+        return {name: np.zeros((self.buffer_steps, size), self.dtype)
+                for name, size in self.variables.items()}
+
+    @property
+    def records_next(self):
+        """ True if the values of the next step are kept,
+            record can be called without values otherwise
+        """
+        return self.num_steps % self.decimation == 0
+
+    def record(self, **values):
+        """ records the values of the variables at the current step """
+        if self._error is not None:
+            raise self._error
+        step = self.num_steps
+        self.num_steps += 1
+        if step % self.decimation:
+            return
+        for name, buffer in self._buffers.items():
+            buffer[self._row] = values[name]
+        self._row += 1
+        self.num_recorded += 1
+        if self._row == self.buffer_steps:
+            self._submit()
+
+    def _submit(self):
+        self._pending.put((self._chunk, self._row, self._buffers))
+        self._chunk += 1
+        self._row = 0
+        start = time.perf_counter()
+        self._buffers = self._free.get()
+        self.blocked_time += time.perf_counter() - start
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            chunk, rows, buffers = item
+            if self._error is None:
+                try:
+                    self._write(chunk, rows, buffers)
+                except Exception as e:
+                    self._error = e
+            self._free.put(buffers)
+
+    def _write(self, chunk, rows, buffers):
+        start = chunk * self.buffer_steps
+        for name, buffer in buffers.items():
+            # a chunk is always written whole, the rows past the
+            # extent of the dataset are not part of it
+            buffer[rows:] = 0
+            data = buffer.tobytes()
+            if self.compression is not None:
+                data = zlib.compress(data, self.compression)
+            dataset = self.datasets[name]
+            dataset.resize(start + rows, axis = 0)
+            dataset.id.write_direct_chunk((start, 0), data)
+
+    def close(self):
+        """ writes the remaining steps and closes the file """
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        if self._row:
+            self._pending.put((self._chunk, self._row, self._buffers))
+        self._pending.put(None)
+        self._thread.join()
+        self.h5file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark(num_neurons = 256, num_microvilli = 30, steps = 2000,
+              filename = 'recording_benchmark.h5'):
+    """
+    Time spent recording the photon inputs, currents and voltages of the
+    CPU PhotoreceptorModel, relative to the time of the model steps, with
+    synchronous h5py writes of every step and with an AsyncRecorder at
+    several decimation factors.
+    """
+    import os
+
+    import h5py
+
+    from .PhotoreceptorModel_no_gpu import PhotoreceptorModel
+
+    photons = np.full(num_neurons, 3e4)
+    variables = {'photon': num_neurons, 'I': num_neurons,
+                 'V': num_neurons}
+
+    def run(record, close = None):
+        model = PhotoreceptorModel(np.full(num_neurons, num_microvilli),
+                                   1e-4, seed = 0)
+        model_time = 0.
+        record_time = 0.
+        for _ in range(steps):
+            start = time.perf_counter()
+            model.run_step(photons)
+            model_time += time.perf_counter() - start
+            start = time.perf_counter()
+            record(photon = model.photons, I = model.I, V = model.V)
+            record_time += time.perf_counter() - start
+        if close is not None:
+            start = time.perf_counter()
+            close()
+            record_time += time.perf_counter() - start
+        return model_time, record_time
+
+    print('{:>24} {:>14} {:>10}'.format(
+        'recording', 'ms per step', 'overhead'))
+
+    with h5py.File(filename, 'w') as h5file:
+        datasets = {name: h5file.create_dataset(
+            name, (0, size), dtype = np.double, maxshape = (None, size),
+            compression = 'gzip')
+            for name, size in variables.items()}
+
+        def record(**values):
+            for name, dataset in datasets.items():
+                dataset.resize(dataset.shape[0] + 1, axis = 0)
+                dataset[-1] = values[name]
+        model_time, record_time = run(record)
+    print('{:>24} {:>14.4f} {:>9.2f}%'.format(
+        'synchronous h5py', record_time / steps * 1e3,
+        record_time / model_time * 100))
+
+    for decimation in [1, 10, 100]:
+        recorder = AsyncRecorder(filename, variables,
+                                 decimation = decimation, dt = 1e-4)
+        model_time, record_time = run(recorder.record, recorder.close)
+        print('{:>24} {:>14.4f} {:>9.2f}%'.format(
+            'async, decimation {}'.format(decimation),
+            record_time / steps * 1e3, record_time / model_time * 100))
+    os.remove(filename)
+
+
+def main():
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
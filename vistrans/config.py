@@ -84,6 +84,7 @@ class PointMaps(Enum):
 class ScreenType(Enum):
     CylinderScreen = 1
     SphereScreen = 2
+    EqualAreaSphereScreen = 3
 
 @dataclass
 class CylinderScreen:
@@ -94,6 +95,11 @@ class CylinderScreen:
     # (suggested: at least twice the radius)
     height: float = 20.0     # cylinder height
     image_map: PointMaps = PointMaps.CylinderToImageMap
+    # if True, columns and parallels are replaced by the coarsest
+    # resolution at which the quadrature error of the receptive fields
+    # is below quadrature_error
+    auto_resolution: bool = False
+    quadrature_error: float = 1e-3
 
 
 @dataclass
@@ -104,6 +110,29 @@ class SphereScreen:
     radius: float = 10.0       # cylinder radius
     half: bool = True
     image_map: PointMaps = PointMaps.AlbersProjectionMap
+    # if True, parallels and meridians are replaced by the coarsest
+    # resolution at which the quadrature error of the receptive fields
+    # is below quadrature_error
+    auto_resolution: bool = False
+    quadrature_error: float = 1e-3
+
+
+@dataclass
+class EqualAreaSphereScreen:
+    """ Class for configuration of a Sphere screen with points
+        of equal area (Fibonacci lattice), the points are scattered
+        so only the 'cpu', 'incremental' and 'lowrank' filtermethods
+        of the input processors can filter it
+    """
+    num_points: int = 4000   # number of points on sphere
+    radius: float = 10.0       # sphere radius
+    half: bool = True
+    image_map: PointMaps = PointMaps.AlbersProjectionMap
+    # if True, num_points is replaced by the smallest number of points
+    # at which the quadrature error of the receptive fields
+    # is below quadrature_error
+    auto_resolution: bool = False
+    quadrature_error: float = 1e-3
 
 
 class InputType(Enum):
@@ -126,7 +155,8 @@ class InputConfigure:
 @dataclass
 class InputBallConfigure(InputConfigure):
     center: str = 'center'
-    levels: IntensityLevels = IntensityLevels(min = 3e3, max = 3e5)
+    levels: IntensityLevels = field(
+        default_factory = lambda: IntensityLevels(min = 3e3, max = 3e5))
     speed: float = 1000.0
     white_back: bool = False
 
@@ -136,7 +166,8 @@ class InputBarConfigure(InputConfigure):
     bar_width: int = 16
     # direction v vertical, h horizontal
     direction: str = 'v' #option('v', 'h', default='v')
-    levels: IntensityLevels = IntensityLevels(min = 3e3, max = 3e5)
+    levels: IntensityLevels = field(
+        default_factory = lambda: IntensityLevels(min = 3e3, max = 3e5))
     speed: float = 1000.0
     double: bool = False #double bars
 
@@ -148,7 +179,8 @@ class InputFlickerStepConfigure(InputConfigure):
     # frequency of changing intensity levels
     frequency: float = 20.0
     # intensity levels (can be as many as one wants)
-    levels: IntensityLevels = IntensityLevels(min = 3e3, max = 3e5)
+    levels: IntensityLevels = field(
+        default_factory = lambda: IntensityLevels(min = 3e3, max = 3e5))
 
 @dataclass
 class InputNaturalConfigure(InputConfigure):
@@ -167,14 +199,29 @@ class InputGratingsConfigure(InputConfigure):
     x_speed: float = 500.0
     y_speed: float = 0.0
     sinusoidal: bool = False
-    levels: IntensityLevels = IntensityLevels(min = 3e1, max = 3e4)
+    levels: IntensityLevels = field(
+        default_factory = lambda: IntensityLevels(min = 3e1, max = 3e4))
 
 @dataclass
 class Input:
     screentype: ScreenType = ScreenType.SphereScreen
     inputtype: InputType = InputType.Bar
-    screenconfig: Union[CylinderScreen, SphereScreen] = SphereScreen()
-    inputconfig: InputConfigure = InputBarConfigure()
+    screenconfig: Union[CylinderScreen, SphereScreen,
+                        EqualAreaSphereScreen] = field(
+        default_factory = SphereScreen)
+    inputconfig: InputConfigure = field(default_factory = InputBarConfigure)
+    # precision of stimuli, screen intensities, filtering and photon
+    # inputs, 'float64' or 'float32'. With 'float32' the cpu filtering is
+    # about twice as fast and photon inputs differ from 'float64' by
+    # about 4e-5 of their maximum, from the single precision sums over
+    # the screen. Gratings phases are still computed in double precision
+    dtype: str = 'float64'
+    # storage of the filter matrix of the cpu filters, 'float32' or
+    # 'float16'. 'float16' halves the memory of the filters, they are
+    # converted to float32 by blocks when filtering, which is slower,
+    # and photon inputs differ from 'float64' by about 1e-4 of their
+    # maximum. The gpu filters are stored in dtype
+    filter_dtype: str = 'float32'
 
     def to_dict(self):
         d = to_dict(self)
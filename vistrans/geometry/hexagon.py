@@ -279,7 +279,7 @@ class HexagonArray(object):
             for icol, icol_n in zip(col, col_n):
                 self.elements[icol].neighbors.append(self.elements[icol_n])
             # iterate over indices that are *not* in col (invert:True)
-            for i in allind[np.in1d(allind, col, assume_unique=True,
+            for i in allind[np.isin(allind, col, assume_unique=True,
                                     invert=True)]:
                 self.elements[i].neighbors.append(self.dummy)
 
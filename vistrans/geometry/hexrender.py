@@ -0,0 +1,191 @@
+import time
+
+import numpy as np
+
+from ..utils.video import FFmpegWriter, IndexRaster
+
+
+class HexagonRenderer(object):
+    """
+    Renders values of the elements of a HexagonArray, e.g. the outputs
+    of the photoreceptors of each ommatidium, as images of the hexagonal
+    lattice in the hex_loc plane.
+
+    The element shown at each pixel, the nearest element within a cell
+    of the lattice, is found once, so each frame is a single gather of
+    the colors of the elements into the image.
+
+    Parameters
+    ----------
+    hex_array: HexagonArray
+    rng: (vmin, vmax)
+        range of values mapped to the colormap.
+    width: int
+        width of the images in pixels, the height follows from
+        the extent of the array.
+    cmap: colormap or name of a colormap
+    background: RGB triple
+        color of the pixels outside the array.
+    """
+    def __init__(self, hex_array, rng, width = 400, cmap = 'gray',
+                 background = (255, 255, 255)):
+        from scipy.spatial import cKDTree
+
+        loc = hex_array.hex_loc
+        self.num_elements = hex_array.num_elements
+        # distance from the center to the corners of a cell
+        cell = hex_array.get_distance_between_element() / np.sqrt(3)
+
+        low = loc.min(axis = 0) - cell
+        high = loc.max(axis = 0) + cell
+        scale = width / (high[0] - low[0])
+        self.width = int(width)
+        self.height = int(np.ceil((high[1] - low[1]) * scale))
+
+        # pixel centers, y upwards
+        x = low[0] + (np.arange(self.width) + 0.5) / scale
+        y = high[1] - (np.arange(self.height) + 0.5) / scale
+        pixels = np.stack(np.meshgrid(x, y), axis = -1).reshape((-1, 2))
+        distance, index = cKDTree(loc).query(
+            pixels, distance_upper_bound = cell)
+        index[np.isinf(distance)] = -1
+        self.raster = IndexRaster(index.reshape((self.height, self.width)),
+                                  rng, cmap = cmap, background = background)
+
+    def __call__(self, values):
+        """
+        values: array with a value per element
+
+        Returns
+        -------
+        image: array of shape (height, width, 3) of uint8
+        """
+        return self.raster(values)
+
+    def render_frames(self, values):
+        """
+        values: array of shape (num_frames, number of elements)
+
+        Returns
+        -------
+        images: array of shape (num_frames, height, width, 3) of uint8
+        """
+        return self.raster.render_frames(values)
+
+    def iter_frames(self, values, step = 1, chunk_size = 100):
+        """
+        Generator of the images of every step-th row of values,
+        rendered by chunks of chunk_size frames.
+
+        values: array of shape (num_steps, number of elements),
+                e.g. a memory-mapped or an HDF5 dataset
+        """
+        for start in range(0, values.shape[0], step * chunk_size):
+            chunk = values[start:start + step * chunk_size:step]
+            for image in self.render_frames(chunk):
+                yield image
+
+    def stack(self, values, step = 1, chunk_size = 100):
+        """
+        images of every step-th row of values as an array of shape
+        (num_frames, height, width, 3) of uint8
+        """
+        num_frames = -(-values.shape[0] // step)
+        images = np.empty((num_frames, self.height, self.width, 3),
+                          np.uint8)
+        for start in range(0, num_frames, chunk_size):
+            stop = min(start + chunk_size, num_frames)
+            images[start:stop] = self.render_frames(
+                values[start * step:stop * step:step])
+        return images
+
+    def save_video(self, values, videofile, step = 1, fps = 25,
+                   chunk_size = 100, ffmpeg = 'ffmpeg'):
+        """
+        Streams the images of every step-th row of values to
+        an ffmpeg process writing videofile.
+        """
+        with FFmpegWriter(videofile, self.width, self.height, fps = fps,
+                          ffmpeg = ffmpeg) as writer:
+            for start in range(0, values.shape[0], step * chunk_size):
+                writer.write(self.render_frames(
+                    values[start:start + step * chunk_size:step]))
+
+
+def element_values(values, gids, num_elements, default = 0.):
+    """
+    Mean of the values of the neurons of each element, e.g. of the
+    photoreceptors of each ommatidium.
+
+    values: array of shape (num_steps, num_neurons)
+    gids: gid of the element of each neuron,
+          e.g. photoreceptor.ommatidium.gid
+    num_elements: number of elements of the array
+
+    Returns
+    -------
+    array of shape (num_steps, num_elements), default for elements
+    without neurons
+    """
+    from scipy.sparse import csr_matrix
+
+    gids = np.asarray(gids)
+    counts = np.bincount(gids, minlength = num_elements)
+    weights = 1. / np.maximum(counts, 1)
+    mean = csr_matrix((weights[gids], (np.arange(gids.size), gids)),
+                      shape = (gids.size, num_elements))
+    result = np.asarray((mean.T @ np.asarray(values).T).T)
+    result[:, counts == 0] = default
+    return result
+
+
+def benchmark(num_rings = 14, width = 400, steps = 1000):
+    """
+    Time per frame of the HexagonRenderer and of a matplotlib scatter
+    of the elements.
+    """
+    from .hexagon import HexagonArray
+
+    hex_array = HexagonArray(num_rings = num_rings)
+    values = np.random.RandomState(0).rand(steps, hex_array.num_elements)
+
+    start = time.perf_counter()
+    renderer = HexagonRenderer(hex_array, (0, 1), width = width)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    renderer.stack(values)
+    render = time.perf_counter() - start
+    print('{} elements, {}x{} images'.format(
+        hex_array.num_elements, renderer.width, renderer.height))
+    print('HexagonRenderer: setup {:.1f} ms, {:.3f} ms per frame'.format(
+        setup * 1e3, render / steps * 1e3))
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return
+    fig, ax = plt.subplots(figsize = (renderer.width / 100.,
+                                      renderer.height / 100.), dpi = 100)
+    loc = hex_array.hex_loc
+    scatter_steps = min(steps, 50)
+    start = time.perf_counter()
+    for i in range(scatter_steps):
+        ax.clear()
+        ax.scatter(loc[:, 0], loc[:, 1], c = values[i], cmap = 'gray',
+                   vmin = 0, vmax = 1)
+        fig.canvas.draw()
+        np.asarray(fig.canvas.buffer_rgba())
+    scatter = time.perf_counter() - start
+    plt.close(fig)
+    print('matplotlib scatter: {:.3f} ms per frame'.format(
+        scatter / scatter_steps * 1e3))
+
+
+def main():
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -218,6 +218,7 @@ class Retina(object):
 
 
         self.neuropil_name = retina_config.neuropil_name
+        self._num_microvilli = retina_config.num_microvilli
         self._ommatidia = [Ommatidium(self, el)
                            for el in self.hex_array.elements]
         for omma in self._ommatidia:
@@ -308,6 +309,10 @@ class Retina(object):
     def num_neurons(self):
         return sum([n.num_neurons for n in self._ommatidia])
     
+    @property
+    def num_microvilli(self):
+        return self._num_microvilli
+
     @property
     def num_ommatidia(self):
         return self.hex_array.num_elements
@@ -3,12 +3,14 @@ import os
 from abc import ABCMeta, abstractmethod
 from future.utils import with_metaclass
 import numpy as np
-from neurokernel.LPU.utils.simpleio import *
 
 
 class Image2D(with_metaclass(ABCMeta, object)):
     # __metaclass__ = ABCMeta
 
+    # True if frames can be identified by keys, see KeyedFrames
+    has_frame_keys = False
+
     def __init__(self, config, dt, retina_index = 0):
         self.dt = dt
         self.dtype = np.double
@@ -17,8 +19,11 @@ class Image2D(with_metaclass(ABCMeta, object)):
         self.retina_index = retina_index
 
     def get_grid(self, xmin, xmax, ymin, ymax):
-        return [np.linspace(xmin, xmax, self.shape[0]),
-                np.linspace(ymin, ymax, self.shape[1])]
+        """ coordinates of the columns (x) and of the rows (y)
+            of the images
+        """
+        return [np.linspace(xmin, xmax, self.shape[1]),
+                np.linspace(ymin, ymax, self.shape[0])]
 
     def generate_2dimage(self, num_steps):
         im_v = np.empty((num_steps,) + self.shape, dtype=self.dtype)
@@ -28,6 +33,15 @@ class Image2D(with_metaclass(ABCMeta, object)):
 
         return im_v
 
+    def iter_2dimage(self, num_steps, chunk_size = 100):
+        """ the next num_steps images one at a time,
+            generated chunk_size at a time
+        """
+        for start in range(0, num_steps, chunk_size):
+            for image in self.generate_2dimage(
+                    min(chunk_size, num_steps - start)):
+                yield image
+
     # only resets internal step for now
     def reset(self):
         self._internal_step = 0
@@ -49,6 +63,42 @@ class BaseImage():
         self.levels = (config.levels.min, config.levels.max)
 
 
+class KeyedFrames(with_metaclass(ABCMeta, object)):
+    """
+    Mixin of Image2D classes whose frames can be identified by hashable
+    keys, i.e. stimuli with a finite set of distinct frames, must be
+    listed before Image2D in the bases.
+    """
+
+    has_frame_keys = True
+
+    def generate_frame_keys(self, num_steps):
+        """ advance the stimulus like generate_2dimage but return
+            hashable keys instead of images,
+            frames with equal keys are identical and can be
+            rendered with render_frame
+        """
+        keys = []
+        for i in range(num_steps):
+            keys.append(self._frame_key(self._internal_step))
+            self._internal_step += 1
+        return keys
+
+    @abstractmethod
+    def _frame_key(self, step):
+        pass
+
+    @abstractmethod
+    def render_frame(self, key):
+        pass
+
+    def uniform_level(self, key):
+        """ intensity of the frame with the given key if it is uniform,
+            None otherwise
+        """
+        return None
+
+
 # Classes in alphabetic order
 class Ball(Image2D, BaseImage):
 
@@ -89,7 +139,7 @@ class Ball(Image2D, BaseImage):
         return im * ((levels[1] - levels[0]) / 2) + (levels[1] + levels[0]) / 2
 
 
-class Bar(Image2D, BaseImage):
+class Bar(KeyedFrames, Image2D, BaseImage):
 
     def __init__(self, config, dt, retina_index = 0):
         Image2D.__init__(self, config, dt, retina_index = retina_index)
@@ -105,11 +155,24 @@ class Bar(Image2D, BaseImage):
         self.reset()
 
     def _generate_2dimage_step(self, step):
+        return self.render_frame(self._frame_key(step))
+
+    def _frame_key(self, step):
+        # start of the bar, the bar positions repeat periodically
+        if self.dir == 'v':  # vertical movement
+            return int(np.mod(step * self.speed * self.dt, self.shape[0]))
+        elif self.dir == 'h':  # horizontal movement
+            return int(np.mod(step * self.speed * self.dt, self.shape[1]))
+        else:
+            raise ValueError('Invalid value for direction {}'
+                             .format(self.dir))
+
+    def render_frame(self, key):
         shape = self.shape
+        st1 = key
 
         im = np.ones(shape, dtype=self.dtype) * self.levels[0]
         if self.dir == 'v':  # vertical movement
-            st1 = int(np.mod(step * self.speed * self.dt, shape[0]))
             en1 = min(int(st1 + self.bar_width), shape[0])
             im[st1:en1, :] = self.levels[1]
             if self.double:
@@ -117,7 +180,6 @@ class Bar(Image2D, BaseImage):
                 en2 = min(int(st2 + self.bar_width), shape[0])
                 im[st2:en2, :] = self.levels[1]
         elif self.dir == 'h':  # horizontal movement
-            st1 = int(np.mod(step * self.speed * self.dt, shape[1]))
             en1 = min(int(st1 + self.bar_width), shape[1])
             im[:, st1:en1] = self.levels[1]
             if self.double:
@@ -130,7 +192,7 @@ class Bar(Image2D, BaseImage):
         return im
 
 
-class FlickerStep(Image2D):
+class FlickerStep(KeyedFrames, Image2D):
 
     def __init__(self, config, dt, retina_index = 0):
         super(FlickerStep, self).__init__(config, dt, retina_index = retina_index)
@@ -145,14 +207,21 @@ class FlickerStep(Image2D):
         self.reset()
 
     def _generate_2dimage_step(self, step):
-        shape = self.shape
+        return self.render_frame(self._frame_key(step))
 
-        im = np.ones(shape, dtype=self.dtype) * self.levels[self.count]
+    def _frame_key(self, step):
+        # index of the current level
+        key = self.count
         if step >= int(1. / self.frequency / 2 / self.dt):
             self.reset()
             self.count = (self.count + 1) % len(self.levels)
+        return key
 
-        return im
+    def render_frame(self, key):
+        return np.ones(self.shape, dtype=self.dtype) * self.levels[key]
+
+    def uniform_level(self, key):
+        return self.levels[key]
 
 
 class Gratings(Image2D):
@@ -195,6 +264,32 @@ class Gratings(Image2D):
         return sinfunc(x_freq * 2 * np.pi * (x - x_speed * step * dt) +
                        y_freq * 2 * np.pi * (y - y_speed * step * dt))
 
+    def quadrature_components(self):
+        """ decomposition of a sinusoidal grating,
+            the image at step k is
+            offset + amplitude * (sin_image * cos(omega * k * dt)
+                                  - cos_image * sin(omega * k * dt))
+
+            Returns
+            -------
+            offset, amplitude: floats
+            sin_image, cos_image: arrays of the image shape
+            omega: angular frequency of the drift in rad/s
+        """
+        if not self.sinusoidal:
+            raise ValueError('Only sinusoidal gratings have a closed form')
+        levels = self.levels
+        shape = self.shape
+
+        x, y = np.meshgrid(np.arange(float(shape[1])),
+                           np.arange(float(shape[0])))
+        phase = 2 * np.pi * (self.x_freq * x + self.y_freq * y)
+        omega = 2 * np.pi * (self.x_freq * self.x_speed +
+                             self.y_freq * self.y_speed)
+        amplitude = (levels[1] - levels[0]) / 2
+        return (levels[0] + amplitude, amplitude,
+                np.sin(phase), np.cos(phase), omega)
+
     def get_config(self):
         return self.get_config_from_params(['x_freq', 'y_freq', 'x_speed',
                                             'y_speed', 'sinusoidal', 'levels'])
@@ -226,8 +321,8 @@ class Natural(Image2D):
         # start from the middle of the image
         self.imagex = self.image.shape[0] / 2
         self.imagey = self.image.shape[1] / 2
-        self.vx = np.random.randn(1) * self.speed
-        self.vy = np.random.randn(1) * self.speed
+        self.vx = np.random.randn() * self.speed
+        self.vy = np.random.randn() * self.speed
         self.margin = 10
         self.file_open = False
 
@@ -298,10 +393,10 @@ class Natural(Image2D):
 
             # change speed/direction every about 1/dt steps
             if np.random.rand() < dt:
-                vx = np.random.randn(1) * self.speed
+                vx = np.random.randn() * self.speed
 
             if np.random.rand() < dt:
-                vy = np.random.randn(1) * self.speed
+                vy = np.random.randn() * self.speed
 
         self.imagex = imagex
         self.imagey = imagey
@@ -345,42 +440,51 @@ def savefig(values, ylabel, imagefile):
     pylab.savefig(imagefile)
 
 
-def savemp4(images, videofile, step=10):
+def savemp4(images, videofile, step=10, fps=5, rng=None, cmap='gray',
+            chunk_size=100, ffmpeg='ffmpeg'):
     '''
         Generates a frame every 10(default) images and saves all
         of them to a video file
 
         parameters:
             images: a numpy array where each row corresponds to an image
+                    or an iterable of images, e.g. from
+                    Image2D.iter_2dimage, that is read chunk_size frames
+                    at a time so long stimuli are not held in memory
             videofile: file to store video
             step: every that number of images will be stored in the file
                   the rest will be ignored (e.g if step is 10
                   and images are 50, only images 1,11,21,31,41 will be stored)
+            rng: (vmin, vmax) mapped to the colormap, if None the
+                 minimum and maximum of the frames read so far are used
+            cmap: colormap or its name
+            ffmpeg: ffmpeg executable, frames are piped to it as raw RGB
     '''
-    from matplotlib import cm
-    from matplotlib.animation import FFMpegFileWriter, AVConvFileWriter
-    import matplotlib.pyplot as plt
+    from itertools import islice
 
-    fig = plt.figure(figsize=plt.figaspect(1.0))
+    from ...utils.video import FFmpegWriter, colormap_lut, to_uint8
 
-    writer = FFMpegFileWriter(fps=5, codec='mpeg4')
-    writer.setup(
-        fig, videofile, dpi=80,
-        frame_prefix=os.path.splitext(videofile)[0] + '_')
-    writer.frame_format = 'png'
+    lut = colormap_lut(cmap)
+    frames = islice(iter(images), 0, None, step)
+    vmin, vmax = (np.inf, -np.inf) if rng is None else rng
 
-    plt.hold(False)
-
-    ax = fig.add_subplot(111)
-
-    plt.subplots_adjust(left=0, right=1.0)
-    for i in range(0, len(images), step):
-        ax.imshow(images[i], cmap=cm.Greys_r,
-                  vmin=images.min(), vmax=images.max())
-        fig.canvas.draw()
-        writer.grab_frame()
-
-    writer.finish()
+    writer = None
+    try:
+        while True:
+            chunk = list(islice(frames, chunk_size))
+            if not chunk:
+                break
+            chunk = np.stack(chunk)
+            if writer is None:
+                writer = FFmpegWriter(videofile, chunk.shape[2],
+                                      chunk.shape[1], fps=fps, ffmpeg=ffmpeg)
+            if rng is None:
+                vmin = min(vmin, chunk.min())
+                vmax = max(vmax, chunk.max())
+            writer.write(lut[to_uint8(chunk, vmin, vmax)])
+    finally:
+        if writer is not None:
+            writer.close()
 
 
 def main():
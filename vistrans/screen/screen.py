@@ -1,11 +1,9 @@
 
-import os
 from abc import ABCMeta, abstractmethod, abstractproperty
 import contextlib
 
 from future.utils import with_metaclass
 import numpy as np
-from neurokernel.LPU.utils.simpleio import *
 
 from .input.image2d import image2Dfactory
 
@@ -19,7 +17,7 @@ class Screen(with_metaclass(ABCMeta, object)):
     # __metaclass__ = ABCMeta
 
     def __init__(self, input_config, dt, retina_index = 0):
-        self._dtype = np.double
+        self._dtype = np.dtype(input_config.dtype)
         self.retina_index = retina_index
 
         # config attributes
@@ -40,9 +38,27 @@ class Screen(with_metaclass(ABCMeta, object)):
                  [x1, x2, x3]],
                 [[y1, y1, y1],
                  [y2, y2, y2]]
+            regular grids return read-only broadcast views of the axes
         """
         pass
 
+    @property
+    def axes(self):
+        """ :return: the 1D axes (x, y) of a regular grid,
+                     None if the screen points are scattered
+        """
+        return getattr(self, '_axes', None)
+
+    @property
+    def flat_grid(self):
+        """ :return: flattened coordinates of the grid, computed once """
+        try:
+            return self._flat_grid
+        except AttributeError:
+            self._flat_grid = [np.ascontiguousarray(g).reshape(-1)
+                               for g in self.grid]
+            return self._flat_grid
+
     def _setup_screen(self, config):
         """ setup up screen generation or retrieval
 
@@ -57,10 +73,13 @@ class Screen(with_metaclass(ABCMeta, object)):
 
         self._image2d = image2Dfactory(self._input_type)(config, self._dt,
                                                          self.retina_index)
+        self._image2d.dtype = self._dtype
 
         # find the mappings of screen points to image
-        imagx, imagy = self.screen_to_image_map.map(self.grid[0],
-                                                    self.grid[1])
+        imagx, imagy = self.screen_to_image_map.map(self.flat_grid[0],
+                                                    self.flat_grid[1])
+        imagx = imagx.reshape(self.grid[0].shape)
+        imagy = imagy.reshape(self.grid[0].shape)
 
         # given the values on points of a rectangular grid, interpolator
         # can find the values on any point of the plane by approximation
@@ -69,13 +88,46 @@ class Screen(with_metaclass(ABCMeta, object)):
         self._interpolator = ImageTransform(
             self._image2d.get_grid(xmin, xmax, ymin, ymax), [imagx, imagy])
 
+    def generate_video(self, data, coordinates, rng, videofile, step = 10,
+                       fps = 5, shape = (240, 480), cmap = 'gray',
+                       workers = None):
+        """
+            data: values to be visualized
+            coordinates: coordinates of values on screen
+                         a tuple of arrays
+            rng:         range of values
+            videofile:   the file where output will be written
+            step:        every step-th frame of data is written
+            shape:       (rows, columns) of the video, an unwrapped
+                         map of the screen
+            workers:     if > 1, frames are rasterized by a pool
+                         of processes
+
+            Each pixel shows the nearest screen point, the index is
+            computed once and the frames are piped as raw RGB to ffmpeg.
+        """
+        from ..utils.video import NearestRaster, FFmpegWriter, imap_frames
+
+        display = self._display_mesh(coordinates, shape)
+        raster = NearestRaster(self._cartesian(*coordinates),
+                               self._cartesian(*display).reshape(
+                                   tuple(shape) + (3,)),
+                               rng, cmap = cmap)
+        frames = (data[i] for i in range(0, len(data), step))
+        with FFmpegWriter(videofile, shape[1], shape[0], fps = fps) as writer:
+            for image in imap_frames(raster, frames, workers = workers):
+                writer.write(image)
+
+    @property
+    def image2d(self):
+        """ the Image2D object that generates the stimulus """
+        return self._image2d
+
     def get_screen_intensity_steps(self, num_steps):
         """ generate or read the next num_steps of inputs """
         try:
             images = self._image2d.generate_2dimage(num_steps)
-            images = images[:, ::-1, ::-1]
-            # values on screen
-            screens = self._interpolator.interpolate(images)
+            screens = self.images_to_screens(images)
 
         except AttributeError:
             print('Function for file setup probably not called')
@@ -83,6 +135,13 @@ class Screen(with_metaclass(ABCMeta, object)):
 
         return screens
 
+    def images_to_screens(self, images):
+        """ map 2d images of shape (num_steps,) + image shape
+            to values on screen
+        """
+        images = images[:, ::-1, ::-1].astype(self._dtype, copy = False)
+        return self._interpolator.interpolate(images)
+
     @abstractmethod
     def get_image2d_dim(self):
         """ screen is supposed to map values from
@@ -93,13 +152,16 @@ class Screen(with_metaclass(ABCMeta, object)):
         pass
 
     @abstractmethod
-    def generate_video(self, data, coordinates, rng, videofile):
+    def _cartesian(self, a, b):
+        """ points of the screen with coordinates (a, b) in 3D,
+            an array of shape (num_points, 3)
         """
-            data: values to be visualized
-            coordinates: coordinates of values on screen
-                         a tuple of arrays
-            rng:         range of values
-            videofile:   the file where output will be written
+        pass
+
+    @abstractmethod
+    def _display_mesh(self, coordinates, shape):
+        """ coordinates (a, b) of the pixels of a video frame of the
+            given shape, an unwrapped map of the screen
         """
         pass
 
@@ -125,14 +187,23 @@ class SphereScreen(Screen):
     def _generate_grid(self):
         # retina should turn from its default location using
         # euler angles
-        # width: parallels
-        # height: meridians
-
-        elevation_range = np.linspace(-np.pi / 2, np.pi / 2, self._width),
-        azimuth_range = np.linspace(0, np.pi, self._height) if self._half else \
-            np.linspace(0, 2 * np.pi * (self._height - 2) / self._height,
-                        self._height)
-        self._grid = np.meshgrid(elevation_range, azimuth_range)
+        self._axes = self.make_axes(self._width, self._height, self._half)
+        self._grid = _broadcast_grid(self._axes)
+
+    @staticmethod
+    def make_axes(parallels, meridians, half = True):
+        """ elevation and azimuth axes of a sphere screen """
+        elevation_range = np.linspace(-np.pi / 2, np.pi / 2, parallels)
+        azimuth_range = np.linspace(0, np.pi, meridians) if half else \
+            np.linspace(0, 2 * np.pi * (meridians - 2) / meridians,
+                        meridians)
+        return elevation_range, azimuth_range
+
+    @staticmethod
+    def make_grid(parallels, meridians, half = True):
+        """ elevation, azimuth meshgrid of a sphere screen """
+        return _broadcast_grid(
+            SphereScreen.make_axes(parallels, meridians, half))
 
     def get_image2d_dim(self):
         return (self._radius * 2, self._radius * 2)
@@ -149,80 +220,57 @@ class SphereScreen(Screen):
     def screen_to_image_map(self):
         return self._screen_to_image_map
 
-    def generate_video(self, data, coordinates, rng, videofile):
-        from scipy.interpolate import griddata
-        from mpl_toolkits.mplot3d import Axes3D
-        import matplotlib
-        matplotlib.use('Agg')
-        from matplotlib import cm
-        import matplotlib.pyplot as plt
-        from matplotlib.animation import FFMpegFileWriter, AVConvFileWriter
-        from matplotlib.colors import Normalize
-
-        # Could have multiplied all coordinates with self._radius
-        # but the result would not change visually
-
-        # unpacking coordinates of data
-        elevpositions, azimpositions = coordinates
-
-        # conversion to cartesian
-        x = (-np.cos(azimpositions) * np.cos(elevpositions)).flatten()
-        y = (-np.sin(azimpositions) * np.cos(elevpositions)).flatten()
-        z = (np.sin(elevpositions)).flatten()
-
-        # constructing screen grid
-        U, V = np.mgrid[0:np.pi / 2:complex(0, 60),
-                        0:2 * np.pi:complex(0, 60)]
-        # conversion to cartesian
-        X = np.cos(V) * np.sin(U)
-        Y = np.sin(V) * np.sin(U)
-        Z = np.cos(U)
-        X_flat = X.flatten()
-        Y_flat = Y.flatten()
-        Z_flat = Z.flatten()
-
-        # initialization
-        fig = plt.figure(figsize=plt.figaspect(0.8), dpi=80)
-        writer = AVConvFileWriter(fps=5, codec='mpeg4')
-        writer.setup(
-            fig, videofile, dpi=80,
-            frame_prefix=os.path.splitext(videofile)[0] + '_')
-        writer.frame_format = 'png'
-
-        step = 10
-        plt.hold(False)
-
-        ax = fig.add_subplot('111', projection='3d')
-        ax.set_title('Input')
-
-        ax.xaxis.set_ticks([])
-        ax.yaxis.set_ticks([])
-        ax.zaxis.set_ticks([])
-
-        norm = Normalize(vmin=rng[0], vmax=rng[1], clip=True)
-
-        for i in range(0, len(data), step):
-            data_flat = data[i].flatten()
-            colors = griddata((x, y, z), data_flat,
-                              (X_flat, Y_flat, Z_flat),
-                              'nearest').reshape(X.shape)
-            # normalize values
-            colors = norm(colors).data
-            # convert to RGB (equal values of R,G,B = greyscale)
-            colors = np.tile(np.reshape(colors, [X.shape[0], X.shape[1], 1]),
-                             [1, 1, 4])
-            colors[:, :, 3] = 1.0
-
-            ax.clear()
-            ax.xaxis.set_ticks([])
-            ax.yaxis.set_ticks([])
-            ax.zaxis.set_ticks([])
-            ax.plot_surface(X, Y, Z, rstride=1, cstride=1,
-                            facecolors=colors, antialiased=False,
-                            shade=False)
-            fig.canvas.draw()
-            writer.grab_frame()
-        writer.finish()
+    def _cartesian(self, elevations, azimuths):
+        elevations = np.asarray(elevations).reshape(-1)
+        azimuths = np.asarray(azimuths).reshape(-1)
+        return np.stack([-np.cos(azimuths) * np.cos(elevations),
+                         -np.sin(azimuths) * np.cos(elevations),
+                         np.sin(elevations)], axis = -1)
+
+    def _display_mesh(self, coordinates, shape):
+        """ elevation decreases down the rows and azimuth increases
+            along the columns, over the range of the coordinates
+        """
+        elevations, azimuths = coordinates
+        return np.meshgrid(
+            np.linspace(np.max(elevations), np.min(elevations), shape[0]),
+            np.linspace(np.min(azimuths), np.max(azimuths), shape[1]),
+            indexing = 'ij')
+
+
+class EqualAreaSphereScreen(SphereScreen):
+    """ Sphere screen with points of equal area on a Fibonacci lattice
+        instead of an elevation, azimuth grid that oversamples the poles.
+
+        The grid is a pair of arrays of shape (num_points, 1).
+    """
+
+    def __init__(self, input_config, dt, retina_index = 0):
+        config_screen = input_config.screenconfig
+
+        self._num_points = config_screen.num_points
+        self._radius = config_screen.radius
+        self._half = config_screen.half
+
+        self._screen_to_image_map = pointmapfactory(
+            config_screen.image_map.name)(self._radius)
+        self._generate_grid()
+        Screen.__init__(self, input_config, dt, retina_index = retina_index)
+
+    def _generate_grid(self):
+        self._grid = self.make_grid(self._num_points, self._half)
+
+    @staticmethod
+    def make_grid(num_points, half = True):
+        """ elevations and azimuths of a Fibonacci lattice,
+            sin(elevation) and azimuth are uniformly distributed
+            so every point represents the same area
+        """
+        golden = (np.sqrt(5) - 1) / 2
+        i = np.arange(num_points)
+        elevation = np.arcsin(1 - (2 * i + 1) / num_points)
+        azimuth = np.mod(i * golden, 1) * (np.pi if half else 2 * np.pi)
+        return [elevation.reshape((-1, 1)), azimuth.reshape((-1, 1))]
 
 
 class CylinderScreen(Screen):
@@ -241,17 +289,27 @@ class CylinderScreen(Screen):
         # parameter corresponds to the length of the image
         # TODO allow to be specified
         self._screen_to_image_map = pointmapfactory(
-            config_screen.image_map)(self._length)
+            config_screen.image_map.name)(self._length)
         self._generate_grid()
         super(CylinderScreen, self).__init__(input_config, dt, retina_index = retina_index)
 
     def _generate_grid(self):
-        C = self._height  # number of columns
-        P = self._width   # number of parallels
-        H = self._length  # length (or height) of cylinder -> this is y
-        self._grid = np.meshgrid(
-            np.linspace(-H / 2, H / 2, P),
-            np.linspace(0, np.pi, C))
+        self._axes = self.make_axes(self._height, self._width, self._length)
+        self._grid = _broadcast_grid(self._axes)
+
+    @staticmethod
+    def make_axes(columns, parallels, length):
+        """ z and theta axes of a cylinder screen """
+        C = columns     # number of columns
+        P = parallels   # number of parallels
+        H = length      # length (or height) of cylinder -> this is y
+        return np.linspace(-H / 2, H / 2, P), np.linspace(0, np.pi, C)
+
+    @staticmethod
+    def make_grid(columns, parallels, length):
+        """ z, theta meshgrid of a cylinder screen """
+        return _broadcast_grid(
+            CylinderScreen.make_axes(columns, parallels, length))
 
     def get_image2d_dim(self):
         # the first parameter must be the same as
@@ -276,78 +334,29 @@ class CylinderScreen(Screen):
     def height(self):
         return self._length
 
-    def generate_video(self, data, coordinates, rng, videofile):
-        from scipy.interpolate import griddata
-        from mpl_toolkits.mplot3d import Axes3D
-        import matplotlib
-        matplotlib.use('Agg')
-        from matplotlib import cm
-        import matplotlib.pyplot as plt
-        from matplotlib.animation import FFMpegFileWriter, AVConvFileWriter
-        from matplotlib.colors import Normalize
-
-        radius = self._radius
-
-        # unpacking coordinates of data
-        zpositions, thetapositions = coordinates
-        # conversion to cartesian
-        x = radius * np.cos(thetapositions).flatten()
-        y = radius * np.sin(thetapositions).flatten()
-        z = zpositions.flatten()
-
-        # constructing screen grid
-        Z, Theta = np.mgrid[z.min():z.max():complex(0, 60),
-                            0:2 * np.pi:complex(0, 60)]
-
-        # conversion to cartesian
-        X = radius * np.cos(Theta)
-        Y = radius * np.sin(Theta)
-        X_flat = X.flatten()
-        Y_flat = Y.flatten()
-        Z_flat = Z.flatten()
-
-        # initialization
-        fig = plt.figure(figsize=plt.figaspect(0.8), dpi=80)
-        writer = AVConvFileWriter(fps=5, codec='mpeg4')
-        writer.setup(
-            fig, videofile, dpi=80,
-            frame_prefix=os.path.splitext(videofile)[0] + '_')
-        writer.frame_format = 'png'
-
-        step = 100
-        plt.hold(False)
-
-        ax = fig.add_subplot('111', projection='3d')
-        ax.set_title('Input')
-
-        ax.xaxis.set_ticks([])
-        ax.yaxis.set_ticks([])
-        ax.zaxis.set_ticks([])
-
-        norm = Normalize(vmin=rng[0], vmax=rng[1], clip=True)
-
-        for i in range(0, len(data), step):
-            data_flat = data[i].flatten()
-            colors = griddata((x, y, z), data_flat,
-                              (X_flat, Y_flat, Z_flat),
-                              'nearest').reshape(X.shape)
-            # normalize values
-            colors = norm(colors).data
-            # convert to RGB (equal values of R,G,B = greyscale)
-            colors = np.tile(np.reshape(colors, [X.shape[0], X.shape[1], 1]),
-                             [1, 1, 4])
-            colors[:, :, 3] = 1.0
-
-            ax.clear()
-            ax.xaxis.set_ticks([])
-            ax.yaxis.set_ticks([])
-            ax.zaxis.set_ticks([])
-            ax.plot_surface(X, Y, Z, rstride=1, cstride=1,
-                            facecolors=colors, antialiased=False,
-                            shade=False)
-            fig.canvas.draw()
-            writer.grab_frame()
-        writer.finish()
+    def _cartesian(self, zs, thetas):
+        zs = np.asarray(zs).reshape(-1)
+        thetas = np.asarray(thetas).reshape(-1)
+        return np.stack([self._radius * np.cos(thetas),
+                         self._radius * np.sin(thetas), zs], axis = -1)
+
+    def _display_mesh(self, coordinates, shape):
+        """ z decreases down the rows and theta increases
+            along the columns, over the range of the coordinates
+        """
+        zs, thetas = coordinates
+        return np.meshgrid(
+            np.linspace(np.max(zs), np.min(zs), shape[0]),
+            np.linspace(np.min(thetas), np.max(thetas), shape[1]),
+            indexing = 'ij')
+
+
+def _broadcast_grid(axes):
+    """ read-only views with the layout of np.meshgrid(x, y)
+        that do not allocate the full grid
+    """
+    x, y = axes
+    return list(np.broadcast_arrays(x[None, :], y[:, None]))
 
 
 def screenfactory(screen_type):
@@ -1,11 +1,19 @@
-
 import numpy as np
 
-from scipy.interpolate import RectBivariateSpline
-
 from .signaltransform import SignalTransform
 
 
+def _linear_weights(nodes, points):
+    """ index of the left node and weight of the right node
+        for linear interpolation, points outside the nodes are clamped
+    """
+    index = np.clip(np.searchsorted(nodes, points, side = 'right') - 1,
+                    0, nodes.size - 2)
+    weight = np.clip((points - nodes[index]) /
+                     (nodes[index + 1] - nodes[index]), 0, 1)
+    return index, weight
+
+
 class ImageTransform(SignalTransform):
 
     def __init__(self, original_grid, new_grid):
@@ -16,18 +24,44 @@ class ImageTransform(SignalTransform):
         """
         self.ogrid = original_grid
         self.ngrid = new_grid
+        self.shape = np.broadcast(*new_grid).shape
+
+        # bilinear interpolation, the same as a RectBivariateSpline
+        # of degree 1, with indices and weights computed once
+        # for the flattened new coordinates.
+        # images have shape (len(ogridy), len(ogridx)), as the grid
+        # of Image2D.get_grid, i.e. rows along y and columns along x
+        ogridx, ogridy = self.ogrid
+        ngridx, ngridy = np.broadcast_arrays(*self.ngrid)
+        iy, wy = _linear_weights(np.asarray(ogridy), ngridy.reshape(-1))
+        ix, wx = _linear_weights(np.asarray(ogridx), ngridx.reshape(-1))
+        ncols = len(ogridx)
+        self._index = np.stack([iy * ncols + ix, iy * ncols + ix + 1,
+                                (iy + 1) * ncols + ix,
+                                (iy + 1) * ncols + ix + 1])
+        self._weights = np.stack([(1 - wy) * (1 - wx), (1 - wy) * wx,
+                                  wy * (1 - wx), wy * wx])
+        self._image_shape = (len(ogridy), len(ogridx))
+        self._image_size = len(ogridx) * len(ogridy)
+        # weights in the precision of the images, to avoid upcasting
+        self._typed_weights = {}
 
     def interpolate(self, images):
-        new_images = np.empty(
-            (images.shape[0],) + self.ngrid[0].shape, images.dtype)
-        for i, image in enumerate(images):
-            new_images[i] = self.interpolate_individual(image)
-        return new_images
+        images = np.asarray(images)
+        assert images.shape[1:] == self._image_shape, \
+            'images of shape {} do not match the grid {}'.format(
+                images.shape[1:], self._image_shape)
+        flat = images.reshape((images.shape[0], self._image_size))
+        new_images = np.zeros((images.shape[0], self._index.shape[1]),
+                              images.dtype)
+        try:
+            typed_weights = self._typed_weights[images.dtype]
+        except KeyError:
+            typed_weights = self._weights.astype(images.dtype)
+            self._typed_weights[images.dtype] = typed_weights
+        for index, weights in zip(self._index, typed_weights):
+            new_images += flat[:, index] * weights
+        return new_images.reshape((images.shape[0],) + self.shape)
 
     def interpolate_individual(self, image):
-        # unpacking
-        ogridx, ogridy = self.ogrid
-        ngridx, ngridy = self.ngrid
-
-        f = RectBivariateSpline(ogridy, ogridx, image, kx=1, ky=1)
-        return f.ev(ngridy.flatten(), ngridx.flatten()).reshape(ngridx.shape)
+        return self.interpolate(np.asarray(image)[None])[0]
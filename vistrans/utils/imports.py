@@ -0,0 +1,136 @@
+import importlib
+import subprocess
+import sys
+
+
+def optional_import(module, feature, package = None):
+    """
+    Imports module, a dependency that only feature needs, e.g. pycuda
+    for the GPU receptive fields. The ImportError raised when it cannot
+    be imported names the feature.
+    """
+    try:
+        return importlib.import_module(module, package)
+    except ImportError as e:
+        raise ImportError('{} requires {}, which cannot be imported: {}'
+                          .format(feature, e.name or module, e)) from e
+
+
+class LazyRegistry(object):
+    """
+    Classes keyed by name, e.g. by screen type, given as the names of
+    their module and class. A module is imported the first time one of
+    its classes is requested, so the registry can list backends whose
+    dependencies, e.g. pycuda, are not installed.
+
+    Parameters
+    ----------
+    kind: str
+        what the classes are, used in error messages.
+    classes: dict
+        (module, class name) of each key, relative modules are
+        relative to package.
+    package: str
+    """
+    def __init__(self, kind, classes, package = None):
+        self.kind = kind
+        self._classes = dict(classes)
+        self._package = package
+        self._loaded = {}
+
+    def keys(self):
+        return self._classes.keys()
+
+    def __contains__(self, key):
+        return key in self._classes
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+        try:
+            module, name = self._classes[key]
+        except KeyError:
+            raise ValueError('Value {} not in {} types: {}'.format(
+                key, self.kind, list(self._classes.keys())))
+        cls = getattr(optional_import(module, '{} {}'.format(
+            self.kind, key), self._package), name)
+        self._loaded[key] = cls
+        return cls
+
+
+# modules that must not be imported by the CPU-only modules of vistrans
+HEAVY_MODULES = ['pycuda', 'skcuda', 'neurokernel', 'scipy', 'matplotlib',
+                 'h5py']
+
+CPU_MODULES = ['vistrans.config',
+               'vistrans.retina',
+               'vistrans.screen.screen',
+               'vistrans.screen.input.image2d',
+               'vistrans.InputProcessors.classmapper',
+               'vistrans.InputProcessors.vrf.vrf_no_gpu',
+               'vistrans.NDComponents.PhotoreceptorModel_no_gpu']
+
+
+_PROBE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(sorted(
+    name for name in {heavy!r}
+    if name in sys.modules)))
+'''
+
+
+def import_time(module, heavy = HEAVY_MODULES, repeats = 3):
+    """
+    Import time of module in a fresh interpreter, the fastest of
+    repeats runs, and the heavy modules it imported.
+
+    Returns
+    -------
+    seconds: float, or None if the import failed
+    imported: list of str, or the error message if the import failed
+    """
+    best = None
+    for _ in range(repeats):
+        process = subprocess.run(
+            [sys.executable, '-c',
+             _PROBE.format(module = module, heavy = list(heavy))],
+            stdout = subprocess.PIPE, stderr = subprocess.PIPE,
+            universal_newlines = True)
+        if process.returncode:
+            return None, process.stderr.strip().splitlines()[-1]
+        fields = process.stdout.strip().split(' ', 1)
+        seconds = float(fields[0])
+        imported = fields[1].split(',') if len(fields) > 1 else []
+        if best is None or seconds < best[0]:
+            best = (seconds, imported)
+    return best
+
+
+def main():
+    """
+    python -m vistrans.utils.imports [module ...]
+
+    import time of the CPU-only modules of vistrans, or of the given
+    modules, and the heavy dependencies each of them imports
+    """
+    modules = sys.argv[1:] or CPU_MODULES
+    failed = False
+    print('{:<48} {:>8}  {}'.format('module', 'ms', 'heavy imports'))
+    for module in modules:
+        seconds, imported = import_time(module)
+        if seconds is None:
+            failed = True
+            print('{:<48} {:>8}  {}'.format(module, 'failed', imported))
+        else:
+            print('{:<48} {:>8.1f}  {}'.format(
+                module, seconds * 1e3, ', '.join(imported) or '-'))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
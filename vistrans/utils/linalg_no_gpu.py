@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# linalg for the PitchArrays of parray_no_gpu, the products are
+# numpy.dot, i.e. BLAS gemm/gemv, written into the memory of C.
+
+import time
+
+import numpy as np
+
+from . import parray_no_gpu as parray
+
+
+class cublashandle(object):
+    """ Placeholder for the cublas handle of linalg,
+        the host products need no handle
+    """
+    def __init__(self):
+        self.handle = None
+
+    def create(self):
+        pass
+
+    def destroy(self):
+        pass
+
+
+def _op(A, op):
+    if op in ['n', 'N']:
+        return A.gpudata
+    elif op in ['t', 'T']:
+        return A.gpudata.T
+    elif op in ['c', 'C']:
+        return A.gpudata.T.conj()
+    raise ValueError("unknown value assigned to op")
+
+
+def dot(A, B, opa = 'n', opb = 'n',
+        C = None, Cstart = None,
+        scale = 1.0, Cscale = 0.0, handle = None):
+    """
+    Multiplication of two matrices A and B in PitchArray format
+    if C is specified, use the memory in C.
+    Specified C must have the same leading dimension as that of the result and
+    the other dimension must be bigger or equal to that of the result.
+
+    Parameters: see linalg.dot, handle is ignored
+
+    result will be C[Cstart:Cstart+m] = C*Cscale + scale*op(A)*op(B)
+    """
+    if A.dtype != B.dtype:
+        raise TypeError("matrix multiplication must have same dtype")
+
+    if (len(A.shape) != 2) | (len(B.shape) != 2):
+        raise TypeError("A, B must both be matrices")
+
+    a = _op(A, opa)
+    b = _op(B, opb)
+    m, n = a.shape
+    k, l = b.shape
+
+    if (k != n) | (0 in [m, n, l]):
+        raise ValueError("matrix dimension mismatch, "
+                         "(%d,%d) with (%d,%d)" % (m, n, k, l))
+
+    dtype = A.dtype
+    if C is None:
+        C = parray.empty((m, l), dtype)
+        Cstart = 0
+        Cscale = 0
+    else:
+        if Cstart is None:
+            Cstart = 0
+        if C.shape[1] != l or C.shape[0] < m + Cstart:
+            raise AttributeError("shape of the provided result array "
+                                 + C.shape.__str__()
+                                 + " does not match intended result "
+                                 + (m, l).__str__())
+        if C.dtype != dtype:
+            raise TypeError("Result array C provided must have "
+                            "the same dtype as inputs")
+
+    c = C.gpudata[Cstart:Cstart + m]
+    if Cscale == 0:
+        np.dot(a, b, out = c)
+        if scale != 1:
+            c *= dtype.type(scale)
+    else:
+        product = np.dot(a, b)
+        c *= dtype.type(Cscale)
+        if scale != 1:
+            product *= dtype.type(scale)
+        c += product
+    return C
+
+
+def norm(A, handle = None):
+    """
+    computes the l2 norm of a vector A
+
+    Parameters
+    ----------
+    A : parray_no_gpu.PitchArray
+        a one dimensional vector
+    handle : ignored
+    """
+    return np.linalg.norm(A.gpudata.reshape(-1))
+
+
+def benchmark(num_neurons = 8000, size = 64 * 128, num_steps = 100,
+              repeats = 5):
+    """
+    Time of dot for the products of the receptive field filtering,
+    filters of shape (num_neurons, size) by an image and by a chunk of
+    num_steps frames, compared to numpy.dot of the same arrays.
+    """
+    random = np.random.RandomState(0)
+    filters = parray.to_gpu(random.rand(num_neurons, size))
+
+    print('{:>24} {:>12} {:>12}'.format('product', 'dot ms', 'numpy ms'))
+    for name, rows in [('image', 1), ('chunk', num_steps)]:
+        video = parray.to_gpu(random.rand(rows, size))
+        output = parray.empty((num_neurons, rows), np.double)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            dot(filters, video, opb = 't', C = output)
+            times.append(time.perf_counter() - start)
+        numpy_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            expected = np.dot(filters.gpudata, video.gpudata.T)
+            numpy_times.append(time.perf_counter() - start)
+        assert np.allclose(output.get(), expected)
+        print('{:>24} {:>12.2f} {:>12.2f}'.format(
+            '{} x {}'.format(filters.shape, video.shape),
+            min(times) * 1e3, min(numpy_times) * 1e3))
+
+
+def main():
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
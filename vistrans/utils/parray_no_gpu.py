@@ -0,0 +1,784 @@
+#!/usr/bin/env python
+
+# PitchArray in host memory, on top of numpy, with the API of
+# parray.PitchArray, so that code written for PitchArrays, e.g. the
+# receptive fields of vrf, runs and can be tested without CUDA.
+# The data of a PitchArray is the ndarray gpudata, rows are not
+# padded so ld is the length of a row.
+
+import numpy as np
+
+
+""" utilities"""
+_SCALAR_TYPES = (float, int, complex, np.integer, np.floating,
+                 np.complexfloating)
+
+
+def _get_common_dtype(obj1, obj2):
+    """Return the 'least common multiple' of dtype of obj1 and obj2."""
+    return (obj1.dtype.type(0) + obj2.dtype.type(0)).dtype
+
+
+def _get_inplace_dtype(obj1, obj2):
+    """
+    Returns the dtype of obj1,
+    Raise error if
+    1) obj1 is real and obj2 is complex
+    2) obj1 is integer and obj2 is floating
+    """
+    if isrealobj(obj1):
+        if iscomplexobj(obj2):
+            raise TypeError("Cannot cast complex dtype to real dtype")
+    if issubclass(obj1.dtype.type, np.integer):
+        if issubclass(obj2.dtype.type, (np.floating, np.complexfloating)):
+            raise TypeError("Cannot cast floating to integer")
+    return obj1.dtype
+
+
+def _get_common_dtype_with_scalar(scalar, obj1):
+    """
+    return the common dtype between a native scalar (int, float, complex)
+    and the dtype of an ndarray like array.
+    """
+    if issubclass(type(scalar), (int, float, np.integer, np.floating)):
+        return obj1.dtype
+    elif issubclass(type(scalar), (complex, np.complexfloating)):
+        if isrealobj(obj1):
+            return floattocomplex(obj1.dtype)
+        else:
+            return obj1.dtype
+    else:
+        raise TypeError("scalar type is not supported")
+
+
+def _get_inplace_dtype_with_scalar(scalar, obj1):
+    """
+    Returns the dtype of obj1,
+    Raise error if
+    1) obj1 is real and scalar is complex
+    2) obj1 is integer and scalar is floating
+    """
+    if isrealobj(obj1):
+        if issubclass(type(scalar), (complex, np.complexfloating)):
+            raise TypeError("Cannot cast complex dtype to real dtype")
+    if issubclass(obj1.dtype.type, np.integer):
+        if issubclass(
+                type(scalar),
+                (float, complex, np.floating, np.complexfloating)):
+            raise TypeError("Cannot cast floating to integer")
+    return obj1.dtype
+
+
+def _pd(shape):
+    """ Returns the product of all element of shape except shape[0]. """
+    s = 1
+    for dim in shape[1:]:
+        s *= dim
+    return s
+
+"""end of utilities"""
+
+
+class PitchArray(object):
+    def __init__(self, shape, dtype, gpudata = None, pitch = None,
+                 base = None):
+        """
+        Create a PitchArray in host memory
+
+        Parameters
+        ----------
+        shape: tuple of ints
+            shape of the array
+        dtype: np.dtype
+            dtype of the array
+        gpudata: numpy.ndarray
+            memory of the array, e.g. a view of the memory of base,
+            reshaped to shape
+        pitch: int
+            ignored, rows are not padded
+        base: PitchArray
+            base PitchArray
+
+        Attributes: see parray.PitchArray, gpudata is an
+        numpy.ndarray of shape .shape
+
+        Note:
+        -----
+        1. any 1-dim shape will result in a row vector with
+        new shape as (1, shape) operations of PitchArray
+        is elementwise operation
+
+        2. only support array of dimension up to 3.
+        """
+        try:
+            self.shape = tuple(int(dim) for dim in shape)
+            s = int(np.prod(self.shape, dtype = np.int64))
+        except TypeError:
+            s = int(shape)
+            self.shape = (1, s) if s else (0, 0)
+
+        if len(self.shape) == 1:
+            self.shape = (1, self.shape[0])
+
+        self.ndim = len(self.shape)
+
+        if self.ndim > 3:
+            raise ValueError("Only support array of dimension leq 3")
+
+        self.dtype = np.dtype(dtype)
+        self.size = s
+
+        if gpudata is None:
+            self.gpudata = np.empty(self.shape, self.dtype)
+        else:
+            if gpudata.dtype != self.dtype:
+                raise TypeError("memory of dtype {} for an array of "
+                                "dtype {}".format(gpudata.dtype, self.dtype))
+            self.gpudata = gpudata.reshape(self.shape)
+        self.base = base
+
+        if self.size:
+            if _pd(self.shape) == 1 or self.shape[0] == 1:
+                self.M = 1
+            else:
+                self.M = self.shape[0]
+            self.N = self.size if self.M == 1 else _pd(self.shape)
+            self.ld = _pd(self.shape)
+        else:
+            self.M = 0
+            self.N = 0
+            self.ld = 0
+        self.mem_size = self.size
+        self.nbytes = self.dtype.itemsize * self.mem_size
+
+    def set(self, ary, stream = None):
+        """
+        Set PitchArray with an numpy.ndarray of the same size,
+        stream is ignored
+        """
+        ary = np.asarray(ary)
+        assert ary.ndim <= 3
+        assert ary.size == self.size
+        self.gpudata[...] = ary.reshape(self.shape)
+
+    def get(self, ary = None, stream = None, pagelocked = False):
+        """
+        Get the PitchArray to an ndarray, a new one if ary is None,
+        stream and pagelocked are ignored
+        """
+        if ary is None:
+            return self.gpudata.copy()
+        assert ary.size == self.size
+        np.copyto(ary, self.gpudata.reshape(ary.shape))
+        return ary
+
+    def __str__(self):
+        return str(self.get())
+
+    def __repr__(self):
+        return repr(self.get())
+
+    def __hash__(self):
+        raise TypeError("PitchArrays are not hashable.")
+
+    def _new_like_me(self, dtype = None):
+        if dtype is None:
+            dtype = self.dtype
+        return self.__class__(self.shape, dtype)
+
+    """""""""
+    Operators:
+    operators defined by __op__(self, other) returns new PitchArray
+    operators defined by op(self, other)  perform inplace operation
+        if inplace cannot be done, error raises
+    operators defined by __iop__(self, other) also perform inplace
+        operation if possbile, otherwise returns a new PitchArray
+    """""""""
+
+    def _operate(self, ufunc, other, mode, reflected = False):
+        """
+        ufunc applied elementwise to self and other,
+        other ufunc self if reflected
+
+        mode: 'new', a new PitchArray of the common dtype,
+              'iop', self if it has the common dtype,
+              a new PitchArray otherwise,
+              'inplace', self, error if the dtype of self
+              cannot hold the result
+        """
+        if isinstance(other, PitchArray):
+            if self.shape != other.shape:
+                raise ValueError("array dimension misaligned")
+            if mode == 'inplace':
+                dtype = _get_inplace_dtype(self, other)
+            else:
+                dtype = _get_common_dtype(self, other)
+            operand = other.gpudata
+        elif issubclass(type(other), _SCALAR_TYPES):
+            if mode == 'inplace':
+                dtype = _get_inplace_dtype_with_scalar(other, self)
+            else:
+                dtype = _get_common_dtype_with_scalar(other, self)
+            operand = other
+        else:
+            raise TypeError("type of object is not supported")
+
+        if mode == 'new' or self.dtype != dtype:
+            result = self._new_like_me(dtype)
+        else:
+            result = self
+        operands = (operand, self.gpudata) if reflected else \
+            (self.gpudata, operand)
+        if self.size:
+            ufunc(*operands, out = result.gpudata, casting = 'unsafe')
+        return result
+
+    def __add__(self, other):
+        return self._operate(np.add, other, 'new')
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self._operate(np.subtract, other, 'new')
+
+    def __rsub__(self, other):
+        return self._operate(np.subtract, other, 'new', reflected = True)
+
+    def __mul__(self, other):
+        return self._operate(np.multiply, other, 'new')
+
+    __rmul__ = __mul__
+
+    def __div__(self, other):
+        return self._operate(np.true_divide, other, 'new')
+
+    __truediv__ = __div__
+
+    def __rdiv__(self, other):
+        return self._operate(np.true_divide, other, 'new',
+                             reflected = True)
+
+    __rtruediv__ = __rdiv__
+
+    def __neg__(self):
+        """
+        Take negative value
+        """
+        return 0-self
+
+    def __iadd__(self, other):
+        return self._operate(np.add, other, 'iop')
+
+    def __isub__(self, other):
+        return self._operate(np.subtract, other, 'iop')
+
+    def __imul__(self, other):
+        return self._operate(np.multiply, other, 'iop')
+
+    def __idiv__(self, other):
+        return self._operate(np.true_divide, other, 'iop')
+
+    __itruediv__ = __idiv__
+
+    def __pow__(self, other):
+        return self._operate(np.power, other, 'new')
+
+    def __ipow__(self, other):
+        return self._operate(np.power, other, 'iop')
+
+    def add(self, other):
+        """
+        add other to self
+        inplace
+        """
+        return self._operate(np.add, other, 'inplace')
+
+    def sub(self, other):
+        """
+        substract other from self
+        inplace
+        """
+        return self._operate(np.subtract, other, 'inplace')
+
+    def rsub(self, other):
+        """
+        substract other by self
+        inplace
+        """
+        return self._operate(np.subtract, other, 'inplace',
+                             reflected = True)
+
+    def mul(self, other):
+        """
+        multiply other with self
+        inplace
+        """
+        return self._operate(np.multiply, other, 'inplace')
+
+    def div(self, other):
+        """
+        divide self by other
+        inplace
+        """
+        return self._operate(np.true_divide, other, 'inplace')
+
+    def rdiv(self, other):
+        """
+        divide other by self
+        inplace
+        """
+        return self._operate(np.true_divide, other, 'inplace',
+                             reflected = True)
+
+    def neg(self):
+        """
+        Take the negative of self inplace
+
+        Returns
+        -------
+        self
+        """
+        np.negative(self.gpudata, out = self.gpudata)
+        return self
+
+    def fill(self, value, stream = None):
+        """
+        Fill all entries of self with value
+        """
+        self.gpudata.fill(value)
+
+    def copy(self, result = None):
+        """
+        Returns a duplicated copy of self
+        """
+        if not result:
+            result = self._new_like_me()
+        else:
+            assert(self.dtype == result.dtype)
+            assert(self.mem_size == result.mem_size)
+        result.gpudata[...] = self.gpudata.reshape(result.shape)
+        return result
+
+    def real(self):
+        """
+        Returns the real part of self
+        """
+        if isrealobj(self):
+            return self
+        return to_gpu(np.ascontiguousarray(self.gpudata.real))
+
+    def imag(self):
+        """
+        returns the imaginary part of self
+        """
+        if isrealobj(self):
+            return zeros_like(self)
+        return to_gpu(np.ascontiguousarray(self.gpudata.imag))
+
+    def abs(self):
+        """
+        returns the absolute value of self
+        """
+        return to_gpu(np.abs(self.gpudata))
+
+    def conj(self, inplace = True):
+        """
+        returns the conjuation of self.
+
+        Paramters:
+        ----------
+        inplace: bool (optional)
+            if inplace is True, conjugation will be performed in place
+            (default: True)
+        """
+        if isrealobj(self):
+            return self
+        result = self if inplace else self._new_like_me()
+        np.conjugate(self.gpudata, out = result.gpudata)
+        return result
+
+    def reshape(self, shape, inplace = True):
+        """
+        reshape the shape of self to "shape"
+
+        Paramters:
+        ----------
+        shape : tuple of ints
+            the new shape to be reshaped to
+        inplace : bool (optional)
+            if True, the result shares the memory of self,
+            otherwise it is a new PitchArray.
+            (default:  True)
+        """
+        try:
+            data = self.gpudata.reshape(shape)
+        except ValueError:
+            raise ValueError("total size of new array must be unchanged")
+        if inplace:
+            return PitchArray(shape = data.shape, dtype = self.dtype,
+                              gpudata = data, base = self)
+        return to_gpu(data)
+
+    def astype(self, dtype):
+        """
+        Convert dtype of self to dtype
+
+        Parameters:
+        -----------
+        dtype: np.dtype
+               dtype of the returned array
+        """
+        return to_gpu(self.gpudata.astype(dtype))
+
+    def T(self, stream = None):
+        """
+        Returns the transpose
+        PitchArray must be 2 dimensional
+        """
+        if len(self.shape) > 2:
+            raise ValueError("transpose only apply to 2D matrix")
+        return to_gpu(np.ascontiguousarray(self.gpudata.T))
+
+    def H(self):
+        """
+        Returns the conjugate transpose
+        PitchArray must be 2 dimensional
+        """
+        if len(self.shape) > 2:
+            raise ValueError("transpose only apply to 2D matrix")
+        return to_gpu(np.ascontiguousarray(self.gpudata.T.conj()))
+
+    def copy_rows(self, start, stop, step = 1):
+        """
+        Extract rows of self to form a new array.
+
+        Parameters:
+        -----------
+        start: int
+            first row to be extracted
+        stop: int
+            last row to be extracted
+        step: int (optional, default: 1)
+            extract every step row.
+        """
+        return to_gpu(np.ascontiguousarray(self.gpudata[start:stop:step]))
+
+    def view(self, dtype = None):
+        """
+        New view of array with the same data (similar to numpy.ndarary.view)
+
+        Optional Parameters:
+        --------------------
+        dtype : numpy.dtype
+            Data-type descriptor of the returned view
+        """
+        if dtype is None:
+            dtype = self.dtype
+        old_itemsize = self.dtype.itemsize
+        itemsize = np.dtype(dtype).itemsize
+
+        if self.shape[-1] * old_itemsize % itemsize != 0:
+            raise ValueError("new type not compatible with array")
+
+        data = self.gpudata.view(dtype)
+        return PitchArray(shape = data.shape, dtype = dtype, gpudata = data,
+                          base = self)
+
+    def __getitem__(self, idx):
+        """
+        only support slicing a chunk of consecutive rows, or of
+        consecutive elements of a vector
+        """
+        if isinstance(idx, tuple) and not idx:
+            return self
+
+        if isinstance(idx, tuple):
+            axis = 1
+            for tmp in idx[1:]:
+                if tmp.indices(self.shape[axis]) != (0, self.shape[axis], 1):
+                    if self.M != 1:
+                        raise NotImplementedError(
+                            "slicing only supported on axis = 0")
+                axis += 1
+            if self.M == 1 and len(idx) == 2 and \
+                    idx[0] == slice(None, None, None):
+                idx = idx[1]
+            else:
+                idx = idx[0]
+
+        if isinstance(idx, slice):
+            start, stop, step = idx.start, idx.stop, idx.step
+            if start is None:
+                start = 0
+            if step is None:
+                step = 1
+            if step != 1:
+                raise NotImplementedError("non-consecutive slicing is not "
+                                          "implemented yet")
+        elif isinstance(idx, (int, np.integer)):
+            start = int(idx)
+            stop = start + 1
+        else:
+            raise ValueError("non-slice indexing not supported: %s" % (idx,))
+
+        maxshape = self.size if self.M == 1 else self.shape[0]
+        if stop is None:
+            stop = maxshape
+        if stop > maxshape:
+            stop = maxshape
+            from warnings import warn
+            warn("array slicing larger than array size, "
+                 "reduce to allowed size")
+
+        if self.M == 1:
+            data = self.gpudata.reshape(-1)[start:stop]
+            if self.shape[0] == 1:
+                shape = (1, stop - start)
+            else:
+                shape = (stop - start, 1)
+        else:
+            data = self.gpudata[start:stop]
+            shape = data.shape
+        return PitchArray(shape = shape, dtype = self.dtype, gpudata = data,
+                          base = self)
+
+    def max(self, other):
+        """ elementwise maximum of self and other, inplace """
+        return self._operate(np.maximum, other, 'inplace')
+
+    def min(self, other):
+        """ elementwise minimum of self and other, inplace """
+        return self._operate(np.minimum, other, 'inplace')
+
+
+def to_gpu(ary):
+    """
+    Transfer a numpy ndarray to a PitchArray
+    """
+    ary = np.asarray(ary)
+    result = PitchArray(ary.shape, ary.dtype)
+    result.set(ary)
+    return result
+
+
+def to_gpu_async(ary, stream = None):
+    """
+    Transfer a numpy ndarray to a PitchArray, stream is ignored
+    """
+    return to_gpu(ary)
+
+
+empty = PitchArray
+
+
+def empty_like(other_ary):
+    """
+    Create an empty PitchArray, whose shape
+    and dtype is the same as other_ary
+    """
+    return PitchArray(other_ary.shape, other_ary.dtype)
+
+
+def zeros(shape, dtype):
+    """
+    Create a PitchArray with all entry equal 0
+    """
+    result = PitchArray(shape, dtype)
+    result.fill(0)
+    return result
+
+
+def zeros_like(other_ary):
+    """
+    Create a PitchArray with all entry equal 0, whose shape
+    and dtype is the same as other_ary
+    """
+    return zeros(other_ary.shape, other_ary.dtype)
+
+
+def ones(shape, dtype):
+    """
+    Create a PitchArray with all entry equal 1
+    """
+    result = PitchArray(shape, dtype)
+    result.fill(1)
+    return result
+
+
+def ones_like(other_ary):
+    """
+    Create a PitchArray with all entry equal 1, whose shape
+    and dtype is the same as other_ary
+    """
+    return ones(other_ary.shape, other_ary.dtype)
+
+
+def conj(pary):
+    """
+    Returns the conjugation of 2D PitchArray
+    same as PitchArray.conj(), but create a new copy
+    """
+    return pary.conj(inplace = False)
+
+
+def reshape(pary, shape):
+    """
+    Returns reshaped of 2D PitchArray
+    same as PitchArray.reshape(), but always create a new copy
+    """
+    return pary.reshape(shape, inplace = False)
+
+
+def iscomplexobj(pary):
+    """ Check if the array dtype is complex """
+    return issubclass(pary.dtype.type, np.complexfloating)
+
+
+def isrealobj(pary):
+    """ Check if the array dtype is real """
+    return not iscomplexobj(pary)
+
+
+def issingle(dtype):
+    """ Check if dtype is single floating point """
+    if dtype in [np.float32, np.complex64]:
+        return True
+    elif dtype in [np.float64, np.complex128]:
+        return False
+    else:
+        raise TypeError("input dtype " + str(dtype) +
+                        "not understood")
+
+
+def floattocomplex(dtype):
+    """ Conver dtype from real to corresponding complex dtype """
+    dtype = dtype.type if isinstance(dtype, np.dtype) else dtype
+    if issubclass(dtype, np.complexfloating):
+        outdtype = dtype
+    elif dtype == np.float32:
+        outdtype = np.complex64
+    elif dtype == np.float64:
+        outdtype = np.complex128
+    else:
+        raise TypeError("input dtype " + str(dtype) +
+                        " cannot be translated to complex floating")
+    return np.dtype(outdtype)
+
+
+def complextofloat(dtype):
+    """ convert dtype from complex to corresponding real dtype """
+    dtype = dtype.type if isinstance(dtype, np.dtype) else dtype
+    if not issubclass(dtype, np.complexfloating):
+        outdtype = dtype
+    elif dtype == np.complex64:
+        outdtype = np.float32
+    elif dtype == np.complex128:
+        outdtype = np.float64
+    else:
+        raise TypeError("input dtype " + str(dtype) +
+                        " cannot be translated to floating")
+    return np.dtype(outdtype)
+
+
+def make_complex(real, imag):
+    """
+    Create a complex array using two real arrays of the same shape,
+    PitchArrays or ndarrays
+    """
+    if isinstance(real, np.ndarray):
+        real = to_gpu(real)
+    if isinstance(imag, np.ndarray):
+        imag = to_gpu(imag)
+
+    if real.shape != imag.shape:
+        raise ValueError("real and imaginary parts must have the same shape")
+    if iscomplexobj(real) or iscomplexobj(imag):
+        raise TypeError("real and imaginary parts must be real array")
+    dtype = _get_common_dtype(real, imag)
+    if dtype in [np.int32, np.float32]:
+        dtype = np.dtype(np.complex64)
+    elif dtype in [np.int64, np.float64]:
+        dtype = np.dtype(np.complex128)
+    else:
+        dtype = np.dtype(np.complex64)
+
+    result = empty(real.shape, dtype)
+    result.gpudata.real = real.gpudata
+    result.gpudata.imag = imag.gpudata
+    return result
+
+
+def angle(array):
+    """ Returns the angle of each element in a complex array """
+    dtype = np.float32 if issingle(array.dtype) else np.double
+    if isrealobj(array):
+        return zeros(array.shape, dtype)
+    return to_gpu(np.angle(array.gpudata).astype(dtype, copy = False))
+
+
+def complex_from_amp_phase(amp, phase):
+    """ Returns the complex array of amplitude amp and phase phase """
+    result = empty(amp.shape, dtype = floattocomplex(amp.dtype))
+    result.gpudata[...] = amp.gpudata * np.exp(1j * phase.gpudata)
+    return result
+
+
+_BSXFUN_OPERATORS = {'+': np.add, '-': np.subtract, '*': np.multiply,
+                     '/': np.true_divide}
+
+
+def _bsxfun(array, vector, operator, inplace, order):
+    if vector.shape[0] > vector.shape[1]:
+        if vector.size != array.shape[0]:
+            raise ValueError('vector size' + str(vector.size) + 'does not match \
+                   array dimension' + str(array.shape[0]))
+        # one value per row
+        values = vector.gpudata.reshape((-1, 1))
+    else:
+        if vector.size != array.shape[1]:
+            raise ValueError('vector size' + str(vector.size) + 'does not match \
+                   array dimension' + str(array.shape[1]))
+        # one value per column
+        values = vector.gpudata.reshape((1, -1))
+
+    dtype = _get_common_dtype(array, vector)
+    if inplace:
+        if array.dtype != dtype:
+            raise NotImplementedError('bsxfun cannot be performed in place')
+        else:
+            result = array
+    else:
+        result = empty(array.shape, dtype = dtype)
+
+    if array.M == 1:
+        raise NotImplementedError
+
+    operands = (array.gpudata, values) if order == 'right' else \
+        (values, array.gpudata)
+    _BSXFUN_OPERATORS[operator](*operands, out = result.gpudata,
+                                casting = 'unsafe')
+    return result
+
+
+def bsxfun_right(array, vector, operator = '*', inplace = False):
+    """ array operator vector, with vector expanded along the rows
+        of array if it is a column vector and along its columns if
+        it is a row vector
+    """
+    return _bsxfun(array, vector, operator, inplace, 'right')
+
+
+def bsxfun_left(array, vector, operator = '*', inplace = False):
+    """ vector operator array, see bsxfun_right """
+    return _bsxfun(array, vector, operator, inplace, 'left')
+
+
+def array_operator(array, operator_name, inplace = False):
+    """ numpy function operator_name, e.g. 'exp', applied elementwise """
+    result = array if inplace else empty_like(array)
+    getattr(np, operator_name)(array.gpudata, out = result.gpudata)
+    return result
+
+
+def exp(array, inplace = False):
+    return array_operator(array, 'exp', inplace = inplace)
@@ -925,7 +925,7 @@ def get_array_operator_function(src_type, dest_type, operator_name, pitch = True
     if src_type in [np.complex128, np.complex64]:
         operation = "pycuda::"+operator_name
     else:
-        operation = operaotr_name
+        operation = operator_name
 
     if pitch:
         func = SourceModule(
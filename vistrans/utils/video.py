@@ -0,0 +1,221 @@
+import subprocess
+
+import numpy as np
+
+from .imports import optional_import
+
+
+def colormap_lut(cmap = 'gray'):
+    """
+    RGB lookup table of a colormap, an array of shape (256, 3) of uint8.
+    cmap is a matplotlib colormap or its name, 'gray' does not
+    need matplotlib.
+    """
+    if cmap == 'gray':
+        return np.repeat(np.arange(256, dtype = np.uint8)[:, None], 3,
+                         axis = 1)
+    if isinstance(cmap, str):
+        matplotlib = optional_import('matplotlib',
+                                     'colormap {}'.format(cmap))
+        cmap = matplotlib.colormaps[cmap]
+    return (cmap(np.linspace(0, 1, 256))[:, :3] * 255 + 0.5).astype(np.uint8)
+
+
+def to_uint8(values, vmin, vmax):
+    """ values mapped linearly from [vmin, vmax] to 0..255, clipped """
+    scale = 255. / max(vmax - vmin, np.finfo(np.float32).tiny)
+    return np.clip((np.asarray(values) - vmin) * scale + 0.5,
+                   0, 255).astype(np.uint8)
+
+
+class IndexRaster(object):
+    """
+    Renders a frame of values at a set of points, e.g. screen points or
+    ommatidia, as an RGB image whose pixels take the value of the point
+    given by a precomputed index raster, so each frame is one gather.
+
+    Parameters
+    ----------
+    index: array of ints of the image shape
+        point shown at each pixel, -1 for the background.
+    rng: (vmin, vmax)
+        range of values mapped to the colormap.
+    cmap: colormap or name of a colormap
+    background: RGB triple
+        color of the pixels with index -1.
+    """
+    def __init__(self, index, rng, cmap = 'gray', background = (0, 0, 0)):
+        index = np.asarray(index)
+        self.shape = index.shape
+        self.vmin, self.vmax = rng
+        self.lut = colormap_lut(cmap)
+        self.background = np.asarray(background, np.uint8)
+        # the background is an extra last color
+        self.index = np.where(index < 0, index.max() + 1, index)
+        self.num_points = int(index.max()) + 1
+
+    def __call__(self, values):
+        """
+        values: array with a value per point
+
+        Returns
+        -------
+        image: array of shape index.shape + (3,) of uint8
+        """
+        return self.render_frames(np.asarray(values).reshape((1, -1)))[0]
+
+    def render_frames(self, values):
+        """
+        values: array of shape (num_frames, num_points)
+
+        Returns
+        -------
+        images: array of shape (num_frames,) + index.shape + (3,)
+                of uint8
+        """
+        values = np.asarray(values)
+        colors = np.empty((values.shape[0], self.num_points + 1, 3),
+                          np.uint8)
+        colors[:, :-1] = self.lut[to_uint8(values[:, :self.num_points],
+                                           self.vmin, self.vmax)]
+        colors[:, -1] = self.background
+        return colors[:, self.index]
+
+
+class NearestRaster(IndexRaster):
+    """
+    IndexRaster of points in 3D, each pixel shows the point nearest to
+    its own 3D position, found once with a KD-tree.
+
+    Parameters
+    ----------
+    points: array of shape (num_points, 3)
+    pixels: array of shape shape + (3,), positions of the pixels.
+    rng, cmap, background: see IndexRaster
+    """
+    def __init__(self, points, pixels, rng, cmap = 'gray',
+                 background = (0, 0, 0)):
+        from scipy.spatial import cKDTree
+
+        pixels = np.asarray(pixels)
+        index = cKDTree(points).query(pixels.reshape((-1, 3)))[1]
+        super(NearestRaster, self).__init__(
+            index.reshape(pixels.shape[:-1]), rng, cmap = cmap,
+            background = background)
+
+
+# function of imap_frames in a worker process
+_worker_function = None
+
+
+def _set_worker_function(function):
+    global _worker_function
+    _worker_function = function
+
+
+def _call_worker_function(frame):
+    return _worker_function(frame)
+
+
+def imap_frames(function, frames, workers = None, chunksize = 8):
+    """
+    function applied to each element of the iterable frames, in order.
+    With workers > 1 the calls are made by a pool of processes, frames
+    are submitted in batches so that an iterable of any length is
+    processed in bounded memory; function must then be picklable, it is
+    sent once to each worker, e.g. a NearestRaster with its index.
+    """
+    if workers is None or workers <= 1:
+        for frame in frames:
+            yield function(frame)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import islice
+
+    frames = iter(frames)
+    batch_size = workers * chunksize * 4
+    with ProcessPoolExecutor(workers, initializer = _set_worker_function,
+                             initargs = (function,)) as executor:
+        while True:
+            batch = list(islice(frames, batch_size))
+            if not batch:
+                break
+            for result in executor.map(_call_worker_function, batch,
+                                       chunksize = chunksize):
+                yield result
+
+
+class FFmpegWriter(object):
+    """
+    Writes RGB frames to a video file by piping them as raw video
+    to an ffmpeg process, without intermediate image files.
+
+    Parameters
+    ----------
+    filename: str
+        output video file, overwritten.
+    width, height: ints
+        size of the frames, odd sizes are padded by ffmpeg.
+    fps: float
+        frames per second of the video.
+    codec: str
+        video codec of ffmpeg.
+    ffmpeg: str
+        ffmpeg executable.
+    output_args: list of str
+        extra ffmpeg arguments for the output.
+    """
+    def __init__(self, filename, width, height, fps = 25, codec = 'libx264',
+                 ffmpeg = 'ffmpeg', output_args = ()):
+        self.filename = filename
+        self.width = int(width)
+        self.height = int(height)
+        self.num_frames = 0
+        command = [ffmpeg, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                   '-s', '{}x{}'.format(self.width, self.height),
+                   '-r', str(fps), '-i', '-', '-an',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                   '-vcodec', codec, '-pix_fmt', 'yuv420p'] + \
+            list(output_args) + [filename]
+        self.process = subprocess.Popen(command, stdin = subprocess.PIPE,
+                                        stderr = subprocess.PIPE)
+
+    def write(self, frames):
+        """ frames: array of shape (height, width, 3) or
+                    (num_frames, height, width, 3) of uint8
+        """
+        if self.process.stdin.closed:
+            raise ValueError('write to a closed FFmpegWriter')
+        frames = np.ascontiguousarray(frames, np.uint8)
+        if frames.shape[-3:] != (self.height, self.width, 3):
+            raise ValueError('Frames of shape {} instead of {}'.format(
+                frames.shape[-3:], (self.height, self.width, 3)))
+        try:
+            self.process.stdin.write(frames.data)
+        except BrokenPipeError:
+            # ffmpeg exited, close raises its error message
+            self.close()
+            raise RuntimeError('ffmpeg exited while writing {}'
+                               .format(self.filename))
+        self.num_frames += 1 if frames.ndim == 3 else frames.shape[0]
+
+    def close(self):
+        if self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = self.process.stderr.read()
+        self.process.stderr.close()
+        if self.process.wait():
+            raise RuntimeError('ffmpeg failed writing {}: {}'.format(
+                self.filename, error.decode(errors = 'replace')))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()